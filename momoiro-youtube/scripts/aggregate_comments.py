@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+# プロジェクトルートを追加
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+# src配下のモジュール同士のimportを解決するためsrcも追加
+sys.path.append(os.path.join(project_root, 'src'))
+
+# .envファイルのパスを設定
+env_path = os.path.join(project_root, 'config', '.env')
+load_dotenv(env_path, override=True)
+
+# プロセスプールのワーカーが同じモジュールとしてimportできるようsrc配下のモジュール名で読み込む
+from comment_analytics import aggregate_videos, find_comment_sources, write_summaries
+from output_index import iter_local_files, iter_s3_files
+
+
+def read_video_ids(path):
+    """動画IDファイルを読み込む（youtube_comment_collectorと同じ形式）"""
+    from youtube_comment_collector import read_video_ids as read_ids
+    return read_ids(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='コメントを逐次集計し、動画ごと・日ごとのサマリーを保存します')
+    parser.add_argument('--dir', action='append', help='保存済みのコメント（JSON Lines・CSV）のローカルディレクトリ（複数指定可）')
+    parser.add_argument('--bucket', help='保存済みのコメントのS3バケット（省略時はS3_BUCKET_NAME_GET_COMMENT）')
+    parser.add_argument('--prefix', help='S3のプレフィックス（例: json/yyyy=2024/mm=01/）。--bucket・--prefixのどちらかでS3から読み込む')
+    parser.add_argument('--live', nargs='*', metavar='VIDEO_ID', help='保存せずにYouTube APIから取得して集計する動画ID')
+    parser.add_argument('--ids-file', help='--liveで取得する動画IDを1行に1つずつ記述したファイル')
+    parser.add_argument('--replies', action='store_true', help='--liveで返信も取得')
+    parser.add_argument('--video-id', action='append', help='保存済みのコメントのうち集計する動画ID（複数指定可）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='並列に集計するプロセス数')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='同じ動画の複数回の取得に含まれる同じコメントを1回だけ数える（コメント数に比例してメモリを使用）')
+    parser.add_argument('--output', help='サマリーを保存するローカルディレクトリ')
+    parser.add_argument('--output-bucket', help='サマリーを保存するS3バケット（省略時は入力と同じバケット）')
+    parser.add_argument('--output-prefix', help='サマリーを保存するS3プレフィックス（既定: comment_analytics/yyyy=YYYY/mm=MM/dd=DD）')
+    args = parser.parse_args()
+
+    jobs = {}
+    for directory in args.dir or []:
+        root = os.path.abspath(directory)
+        files = ((key, {'type': 'local', 'path': os.path.join(root, key)}) for key, _, _ in iter_local_files(root))
+        for video_id, sources in find_comment_sources(files).items():
+            jobs.setdefault(video_id, []).extend(sources)
+    bucket = args.bucket or os.environ.get('S3_BUCKET_NAME_GET_COMMENT')
+    if args.bucket or args.prefix is not None:
+        if not bucket:
+            parser.error('--bucketまたはS3_BUCKET_NAME_GET_COMMENTを指定してください')
+        from s3_stream import get_s3_client
+        files = ((key, {'type': 's3', 'bucket': bucket, 'key': key})
+                 for key, _, _ in iter_s3_files(get_s3_client(), bucket, args.prefix or ''))
+        for video_id, sources in find_comment_sources(files).items():
+            jobs.setdefault(video_id, []).extend(sources)
+    if args.video_id:
+        jobs = {video_id: sources for video_id, sources in jobs.items() if video_id in args.video_id}
+    live_ids = list(args.live or [])
+    if args.ids_file:
+        live_ids.extend(read_video_ids(args.ids_file))
+    for video_id in live_ids:
+        jobs.setdefault(video_id, []).append({'type': 'live', 'replies': args.replies})
+    if not jobs:
+        parser.error('集計するコメントがありません（--dir・--bucket・--prefix・--liveを指定してください）')
+
+    print(f"{len(jobs)}本の動画のコメントを{min(args.workers, len(jobs))}プロセスで集計します")
+    started = time.perf_counter()
+    video_summaries, days, overall = aggregate_videos(jobs, max_workers=min(args.workers, len(jobs)),
+                                                      dedupe=args.dedupe)
+    seconds = time.perf_counter() - started
+
+    if args.output:
+        written = write_summaries(video_summaries, days, overall, output_dir=args.output)
+        location = args.output
+    else:
+        output_bucket = args.output_bucket or bucket
+        if not output_bucket:
+            parser.error('--outputまたは--output-bucketを指定してください')
+        current_time = datetime.now()
+        prefix = args.output_prefix or (f"comment_analytics/yyyy={current_time.year}/mm={current_time.month:02d}"
+                                        f"/dd={current_time.day:02d}")
+        from s3_stream import get_s3_client
+        written = write_summaries(video_summaries, days, overall, s3_client=get_s3_client(), bucket=output_bucket,
+                                  prefix=prefix)
+        location = f's3://{output_bucket}/{prefix}'
+
+    print("----------------------------------------")
+    print(f"合計: {len(video_summaries)}本 / {overall.comments}件のコメント（返信{overall.replies}件） / "
+          f"{len(days)}日 / {seconds:.1f}秒（{overall.comments / seconds if seconds else 0:.0f}件/秒）")
+    print(f"{len(written)}個のサマリーを {location} に保存しました")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# プロジェクトルートを追加
+project_root = str(Path(__file__).parent.parent)
+
+# 計測用の合成チャンネル（ももクロ公式チャンネルのIDを使い、既定の出力先と同じキーで保存する）
+BENCHMARK_CHANNEL_ID = 'UC6YNWTm6zuMFsjqd0PO3G-Q'
+
+# 既定の計測規模（動画数・コメント数）
+DEFAULT_VIDEO_SIZES = '100,1000,10000'
+DEFAULT_COMMENT_SIZES = '1000,100000,1000000'
+
+# コメントの計測で1本の動画に持たせるコメント数の上限（超える分は動画を増やして並列に取得する）
+MAX_COMMENTS_PER_VIDEO = 100000
+
+# 比較する指標と表示名
+COMPARED_METRICS = [
+    ('wall_seconds', 'wall s'),
+    ('api_requests', 'requests'),
+    ('quota_units', 'quota'),
+    ('s3_bytes_uploaded', 'S3 bytes'),
+    ('peak_rss_mb', 'RSS MB'),
+]
+
+# 計測プロセスの環境変数（実際のサービス・キャッシュ・レート制限を使わない）
+BENCHMARK_ENV = {
+    'S3_BUCKET_NAME': 'benchmark-bucket',
+    'S3_BUCKET_NAME_GET_COMMENT': 'benchmark-bucket',
+    'YOUTUBE_API_KEY': 'benchmark-key',
+    'YOUTUBE_QUOTA_BUDGET': '',
+    'YOUTUBE_REQUESTS_PER_SECOND': '1000000',
+    'YOUTUBE_CACHE_PATH': '',
+    'CHANNEL_IDS': BENCHMARK_CHANNEL_ID,
+    'ENABLE_SNAPSHOTS': '',
+    'AUTO_CONTINUE': '',
+    'TIME_BUDGET_SECONDS': '',
+}
+
+
+def run_scenario(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """1つのシナリオを現在のプロセスで実行して計測（計測用の子プロセスで呼び出す）"""
+    import contextlib
+    import resource
+    sys.path.append(os.path.join(project_root, 'src'))
+    sys.path.append(os.path.join(project_root, 'scripts'))
+    from benchmark_fakes import FakeS3, FakeYouTube
+    import s3_stream
+    import youtube_api
+    from metrics import metrics
+
+    if scenario['kind'] == 'videos':
+        youtube = FakeYouTube({BENCHMARK_CHANNEL_ID: scenario['size']}, latency_seconds=scenario['latency'],
+                              error_rate=scenario['error_rate'])
+    else:
+        youtube = FakeYouTube({BENCHMARK_CHANNEL_ID: 0}, comments_per_video=scenario['comments_per_video'],
+                              replies_per_thread=scenario.get('replies_per_thread', 0), latency_seconds=scenario['latency'], error_rate=scenario['error_rate'])
+    s3 = FakeS3(keep_multipart=False)
+    youtube_api.set_youtube_client(youtube)
+    s3_stream.set_s3_client(s3)
+    # 注入したエラーのリトライは待たずに行う（待ち時間ではなく処理時間を計測する）
+    youtube_api.BACKOFF_BASE_SECONDS = 0.0
+
+    if scenario['kind'] == 'videos':
+        import lambda_function
+        event = {'mode': scenario['mode'], 'start_year': 2010, 'max_workers': scenario['workers']}
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            result = lambda_function.lambda_handler(event, None)
+        wall_seconds = time.perf_counter() - started
+        body = json.loads(result['body'])
+        if result['statusCode'] != 200:
+            raise RuntimeError(body.get('error'))
+        items = body['total_videos']
+    else:
+        import youtube_comment_collector
+        video_ids = [f'c{index:010d}' for index in range(scenario['videos'])]
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            summaries = youtube_comment_collector.collect_many(video_ids, max_workers=scenario['workers'],
+                                                               replies=bool(scenario.get('replies_per_thread')))
+        wall_seconds = time.perf_counter() - started
+        errors = [summary['error'] for summary in summaries if summary['error']]
+        if errors:
+            raise RuntimeError(errors[0])
+        items = sum(summary['comments'] for summary in summaries)
+
+    run_metrics = metrics.summary()
+    # ru_maxrssはLinuxではKB単位
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'items': items,
+        'wall_seconds': round(wall_seconds, 3),
+        'items_per_second': round(items / wall_seconds, 1) if wall_seconds else None,
+        'api_requests': youtube.total_requests(),
+        'api_requests_by_method': dict(sorted(youtube.requests.items())),
+        'injected_errors': youtube.errors,
+        'api_retries': run_metrics['api_retries'],
+        'quota_units': youtube_api.rate_limiter.quota_used,
+        's3_requests': s3.total_requests(),
+        's3_bytes_uploaded': s3.bytes_uploaded,
+        'peak_rss_mb': round(peak_rss / 1024, 1),
+        'rss_before_run_mb': round(baseline_rss / 1024, 1),
+        'stages': run_metrics['stages'],
+    }
+
+
+def measure_once(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """新しいプロセスでシナリオを1回実行（ピークメモリを他のシナリオと分けて計測する）"""
+    env = {**os.environ, **BENCHMARK_ENV, 'MAX_WORKERS': str(scenario['workers'])}
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--scenario', json.dumps(scenario)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def build_scenarios(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """コマンドライン引数から計測するシナリオの一覧を作成"""
+    common = {'workers': args.workers, 'latency': args.latency_ms / 1000, 'error_rate': args.error_rate}
+    scenarios = []
+    for size in parse_sizes(args.videos):
+        for mode in args.modes.split(','):
+            scenarios.append({'name': f'videos_{mode}_{size}', 'kind': 'videos', 'mode': mode, 'size': size, **common})
+    for size in parse_sizes(args.comments):
+        videos = max(1, -(-size // MAX_COMMENTS_PER_VIDEO))
+        # 返信を展開する場合、sizeはトップレベルのコメント数（itemsは返信を含む）
+        name = f'comments_{size}' + (f'_replies{args.replies_per_thread}' if args.replies_per_thread else '')
+        scenarios.append({'name': name, 'kind': 'comments', 'size': size, 'videos': videos,
+                          'comments_per_video': size // videos, 'replies_per_thread': args.replies_per_thread,
+                          **common})
+    return scenarios
+
+
+def parse_sizes(value: str) -> List[int]:
+    """カンマ区切りの規模の指定を数値のリストに変換（空文字は計測しない）"""
+    return [int(size) for size in value.split(',') if size.strip()]
+
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """複数回の計測結果をまとめる（時間は中央値・最小値、メモリは最大値、件数は最後の計測）"""
+    result = dict(samples[-1])
+    result['wall_seconds'] = round(statistics.median(sample['wall_seconds'] for sample in samples), 3)
+    result['wall_seconds_min'] = round(min(sample['wall_seconds'] for sample in samples), 3)
+    result['items_per_second'] = round(result['items'] / result['wall_seconds'], 1) if result['wall_seconds'] else None
+    result['peak_rss_mb'] = max(sample['peak_rss_mb'] for sample in samples)
+    result['runs'] = len(samples)
+    return result
+
+
+def get_git_commit() -> Optional[str]:
+    """計測したソースのコミット（gitがない場合はNone）"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """前回の結果と比較して表示し、閾値（割合）を超えて悪化したシナリオ・指標を返す"""
+    regressions = []
+    print(f"\n{'scenario':<24} {'metric':<10} {'baseline':>14} {'current':>14} {'change':>9}")
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            print(f"{name:<24} (新しいシナリオ)")
+            continue
+        for metric, label in COMPARED_METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else float('inf'))
+            regressed = change > threshold
+            if regressed:
+                regressions.append(f'{name} {metric}')
+            print(f"{name:<24} {label:<10} {old:>14} {new:>14} {change:>+8.1%}" + ('  !' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='偽のYouTube API・S3を使って動画情報とコメントの収集処理を計測します')
+    parser.add_argument('--videos', default=DEFAULT_VIDEO_SIZES, help='計測する動画数（カンマ区切り、空文字で省略）')
+    parser.add_argument('--comments', default=DEFAULT_COMMENT_SIZES, help='計測するコメント数（カンマ区切り、空文字で省略）')
+    parser.add_argument('--modes', default='search,uploads', help='動画情報の取得方式（カンマ区切り）')
+    parser.add_argument('--workers', type=int, default=4, help='並列実行のワーカー数（MAX_WORKERS・コメントの並列数）')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='APIリクエストごとの遅延（ミリ秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='一時的なエラー（5xx・rateLimitExceeded）を返す割合')
+    parser.add_argument('--replies-per-thread', type=int, default=0,
+                        help='コメントスレッドごとの返信数（1以上で返信を展開して取得）')
+    parser.add_argument('--runs', type=int, default=1, help='シナリオごとの計測回数')
+    parser.add_argument('--output', default='benchmark_results.json', help='結果を保存するJSONファイル')
+    parser.add_argument('--baseline', help='比較する前回の結果のJSONファイル')
+    parser.add_argument('--threshold', type=float, default=0.1, help='悪化とみなす変化の割合')
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        # 計測用の子プロセス（結果のJSONを最後の行に出力する）
+        print(json.dumps(run_scenario(json.loads(args.scenario))))
+        return
+
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': get_git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'workers': args.workers, 'latency_ms': args.latency_ms, 'error_rate': args.error_rate,
+                     'runs': args.runs},
+        'scenarios': {}
+    }
+    for scenario in build_scenarios(args):
+        samples = [measure_once(scenario) for _ in range(args.runs)]
+        result = summarize(samples)
+        results['scenarios'][scenario['name']] = result
+        print(f"{scenario['name']:<24} {result['items']:>9} items {result['wall_seconds']:>9.3f}s "
+              f"{result['api_requests']:>7} requests {result['quota_units']:>8} quota "
+              f"{result['s3_bytes_uploaded']:>12} bytes {result['peak_rss_mb']:>8} MB")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を {args.output} に保存しました")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != results['settings']:
+            print(f"\n注意: 前回の結果と設定が異なります（前回: {baseline.get('settings')}）")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n悪化した指標: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
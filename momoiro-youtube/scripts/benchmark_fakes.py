@@ -0,0 +1,400 @@
+import io
+import json
+import random
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# 合成チャンネルの動画の公開期間（この期間に均等に配置する）
+VIDEO_PERIOD_START = datetime(2010, 1, 1, tzinfo=timezone.utc)
+VIDEO_PERIOD_END = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# コメントの公開日時の基準（最新のコメント）と間隔
+COMMENT_LATEST_AT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+COMMENT_INTERVAL = timedelta(seconds=37)
+
+# 合成コメントの本文（メンバー名やカンマ・改行を含むものを混ぜる）
+COMMENT_TEXTS = [
+    'ライブ最高でした！',
+    '高城れにちゃんの歌声が好き',
+    '百田夏菜子, 玉井詩織, 佐々木彩夏\n全員かわいい',
+    'MVの衣装がすてき',
+    'あーりんの笑顔に元気をもらいました',
+    '何回見ても泣ける',
+    'しおりんのハモリが綺麗',
+    'ももクロ最高！！',
+]
+
+# 注入するエラー（HTTPステータスと理由）
+INJECTED_ERRORS = [
+    (500, 'backendError'),
+    (403, 'rateLimitExceeded'),
+    (503, 'backendError'),
+]
+
+
+def format_rfc3339(value: datetime) -> str:
+    """datetimeをAPIと同じRFC3339形式（UTC、秒まで）の文字列に変換"""
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def make_http_error(status: int, reason: str) -> Exception:
+    """googleapiclientのHttpErrorを作成"""
+    import httplib2
+    from googleapiclient.errors import HttpError
+    content = json.dumps({'error': {'code': status, 'errors': [{'reason': reason}]}}).encode('utf-8')
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+class FakeRequest:
+    """googleapiclientのHttpRequestの代わり（execute時に遅延とエラーを注入する）"""
+
+    def __init__(self, service: 'FakeYouTube', method: str, handler: Callable[..., Dict[str, Any]],
+                 params: Dict[str, Any]):
+        self.service = service
+        self.method = method
+        self.handler = handler
+        self.params = params
+        self.headers = {}
+
+    def execute(self, http: Any = None, num_retries: int = 0) -> Dict[str, Any]:
+        self.service.before_request(self.method)
+        return self.handler(**self.params)
+
+
+class FakeResource:
+    """YouTube APIのリソース（search、videosなど）の代わり"""
+
+    def __init__(self, service: 'FakeYouTube', name: str, handlers: Dict[str, Callable[..., Dict[str, Any]]]):
+        self.service = service
+        self.name = name
+        self.handlers = handlers
+
+    def __getattr__(self, method_name: str) -> Callable[..., FakeRequest]:
+        handler = self.handlers[method_name]
+        return lambda **params: FakeRequest(self.service, f'{self.name}.{method_name}', handler, params)
+
+
+class FakeYouTube:
+    """YouTube Data APIのプロセス内の代わり（合成チャンネル・動画・コメント）
+
+    channelsは{チャンネルID: 動画数}。各チャンネルの動画はVIDEO_PERIOD_STARTからVIDEO_PERIOD_ENDに
+    均等に公開されたものとし、各動画にcomments_per_video件のコメントスレッド
+    （replies_per_thread件ごとの返信付き）を持たせる。
+    latency_secondsはリクエストごとの待ち時間、error_rateは一時的なエラーを返す割合。
+    メソッドごとのリクエスト数と注入したエラー数を記録する。
+    """
+
+    def __init__(self, channels: Dict[str, int], comments_per_video: int = 0, replies_per_thread: int = 0,
+                 latency_seconds: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.comments_per_video = comments_per_video
+        self.replies_per_thread = replies_per_thread
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.requests = {}
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # チャンネルごとの動画（公開日時の昇順）と動画IDからの索引
+        self.channel_videos = {}
+        self.video_index = {}
+        for channel_index, (channel_id, count) in enumerate(channels.items()):
+            step = (VIDEO_PERIOD_END - VIDEO_PERIOD_START) / max(count, 1)
+            videos = []
+            for index in range(count):
+                video = {
+                    'id': f'b{channel_index:02d}{index:08d}',
+                    'channel_id': channel_id,
+                    'published_at': format_rfc3339(VIDEO_PERIOD_START + step * index),
+                    'title': self._title(index)
+                }
+                videos.append(video)
+                self.video_index[video['id']] = video
+            self.channel_videos[channel_id] = videos
+        self.published = {channel_id: [video['published_at'] for video in videos]
+                          for channel_id, videos in self.channel_videos.items()}
+
+    @staticmethod
+    def _title(index: int) -> str:
+        """動画のタイトル（タイトル分類の各カテゴリに当たるように変える）"""
+        kinds = ['【LIVE】ももクロ春の一大事 {}', '【MV】ももいろクローバーZ {}', 'ダイジェスト {}',
+                 'イベント告知 {}', '高城れに 生誕祭 {}', 'ももクロChan {}']
+        return kinds[index % len(kinds)].format(index)
+
+    def before_request(self, method: str) -> None:
+        """リクエスト数を記録し、遅延とエラーを注入"""
+        with self._lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+            inject = self.error_rate and self._random.random() < self.error_rate
+            if inject:
+                self.errors += 1
+                status, reason = self._random.choice(INJECTED_ERRORS)
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if inject:
+            raise make_http_error(status, reason)
+
+    def total_requests(self) -> int:
+        """全メソッドのリクエスト数"""
+        return sum(self.requests.values())
+
+    def _snippet(self, video: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'title': video['title'],
+            'description': '',
+            'publishedAt': video['published_at'],
+            'channelTitle': 'ももいろクローバーZ',
+            'thumbnails': {'high': {'url': f"https://i.ytimg.com/vi/{video['id']}/hqdefault.jpg"}}
+        }
+
+    def _page(self, items: List[Any], page_token: Optional[str], max_results: int) -> Dict[str, Any]:
+        """ページトークン（開始位置）で1ページ分を切り出す"""
+        start = int(page_token or 0)
+        response = {'items': items[start:start + max_results]}
+        if start + max_results < len(items):
+            response['nextPageToken'] = str(start + max_results)
+        return response
+
+    def _search_list(self, channelId: str, publishedAfter: str, publishedBefore: str, maxResults: int = 5,
+                     pageToken: Optional[str] = None, **params: Any) -> Dict[str, Any]:
+        videos = self.channel_videos.get(channelId, [])
+        published = self.published.get(channelId, [])
+        # 新しい順（order=date）
+        matched = videos[bisect_left(published, publishedAfter):bisect_left(published, publishedBefore)][::-1]
+        start = int(pageToken or 0)
+        page = matched[start:start + maxResults]
+        response = {'items': [{'id': {'kind': 'youtube#video', 'videoId': video['id']},
+                               'snippet': self._snippet(video)} for video in page]}
+        if start + maxResults < len(matched):
+            response['nextPageToken'] = str(start + maxResults)
+        return response
+
+    def _videos_list(self, id: str, part: str, **params: Any) -> Dict[str, Any]:
+        items = []
+        for video_id in id.split(','):
+            video = self.video_index.get(video_id)
+            if video is None:
+                continue
+            index = int(video_id[3:])
+            item = {'id': video_id}
+            if 'snippet' in part:
+                item['snippet'] = self._snippet(video)
+            if 'statistics' in part:
+                item['statistics'] = {'viewCount': str(1000 + index * 7), 'likeCount': str(10 + index % 97),
+                                      'commentCount': str(self.comments_per_video)}
+            if 'contentDetails' in part:
+                item['contentDetails'] = {'duration': f'PT{index % 60}M{index % 59}S'}
+            items.append(item)
+        return {'items': items}
+
+    def _channels_list(self, id: str, **params: Any) -> Dict[str, Any]:
+        return {'items': [{'id': id, 'contentDetails': {'relatedPlaylists': {'uploads': 'UU' + id[2:]}}}]}
+
+    def _playlist_items_list(self, playlistId: str, maxResults: int = 5, pageToken: Optional[str] = None,
+                             **params: Any) -> Dict[str, Any]:
+        videos = self.channel_videos.get('UC' + playlistId[2:], [])
+        start = int(pageToken or 0)
+        # 新しい順
+        page = videos[::-1][start:start + maxResults]
+        response = {'items': [{'snippet': {'title': video['title'], 'publishedAt': video['published_at'],
+                                           'resourceId': {'videoId': video['id']}},
+                               'contentDetails': {'videoId': video['id'], 'videoPublishedAt': video['published_at']}}
+                              for video in page]}
+        if start + maxResults < len(videos):
+            response['nextPageToken'] = str(start + maxResults)
+        return response
+
+    def _comment(self, comment_id: str, index: int, parent_id: Optional[str] = None) -> Dict[str, Any]:
+        snippet = {
+            'authorDisplayName': f'@user{index % 997}',
+            'textDisplay': COMMENT_TEXTS[index % len(COMMENT_TEXTS)],
+            'likeCount': index % 50,
+            'publishedAt': format_rfc3339(COMMENT_LATEST_AT - COMMENT_INTERVAL * index)
+        }
+        if parent_id:
+            snippet['parentId'] = parent_id
+        return {'id': comment_id, 'snippet': snippet}
+
+    def _comment_threads_list(self, videoId: str, part: str, maxResults: int = 20, pageToken: Optional[str] = None,
+                              **params: Any) -> Dict[str, Any]:
+        start = int(pageToken or 0)
+        end = min(start + maxResults, self.comments_per_video)
+        items = []
+        for index in range(start, end):
+            thread_id = f'{videoId}.t{index}'
+            item = {'id': thread_id, 'snippet': {'topLevelComment': self._comment(thread_id, index),
+                                                 'totalReplyCount': self.replies_per_thread}}
+            if 'replies' in part and self.replies_per_thread:
+                item['replies'] = {'comments': [self._comment(f'{thread_id}.r{reply}', index + reply, thread_id)
+                                                for reply in range(min(self.replies_per_thread, 5))]}
+            items.append(item)
+        response = {'items': items}
+        if end < self.comments_per_video:
+            response['nextPageToken'] = str(end)
+        return response
+
+    def _comments_list(self, parentId: str, maxResults: int = 20, pageToken: Optional[str] = None,
+                       **params: Any) -> Dict[str, Any]:
+        replies = [self._comment(f'{parentId}.r{reply}', reply, parentId) for reply in range(self.replies_per_thread)]
+        return self._page(replies, pageToken, maxResults)
+
+    def search(self) -> FakeResource:
+        return FakeResource(self, 'search', {'list': self._search_list})
+
+    def videos(self) -> FakeResource:
+        return FakeResource(self, 'videos', {'list': self._videos_list})
+
+    def channels(self) -> FakeResource:
+        return FakeResource(self, 'channels', {'list': self._channels_list})
+
+    def playlistItems(self) -> FakeResource:
+        return FakeResource(self, 'playlistItems', {'list': self._playlist_items_list})
+
+    def commentThreads(self) -> FakeResource:
+        return FakeResource(self, 'commentThreads', {'list': self._comment_threads_list})
+
+    def comments(self) -> FakeResource:
+        return FakeResource(self, 'comments', {'list': self._comments_list})
+
+
+class FakeNoSuchKey(Exception):
+    """S3のNoSuchKeyの代わり"""
+
+
+class FakeBody:
+    """S3オブジェクトのStreamingBodyの代わり"""
+
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+    def iter_chunks(self, chunk_size: int = 1024) -> Iterator[bytes]:
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class FakeS3:
+    """S3クライアントのプロセス内の代わり
+
+    アップロードされたバイト数と操作ごとのリクエスト数を記録する。
+    keep_multipart=Falseの場合はマルチパートアップロードの内容を保持せず
+    （大量のコメントの計測で保存先のメモリ使用量を含めないため）、サイズのみを記録する。
+    """
+
+    class exceptions:
+        NoSuchKey = FakeNoSuchKey
+
+    def __init__(self, keep_multipart: bool = True):
+        self.keep_multipart = keep_multipart
+        self.objects = {}
+        self.sizes = {}
+        self.bytes_uploaded = 0
+        self.requests = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _record(self, operation: str, uploaded: int = 0) -> None:
+        with self._lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+            self.bytes_uploaded += uploaded
+
+    def _store(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self.objects[key] = data
+            self.sizes[key] = len(data)
+
+    def put_object(self, Bucket: str, Key: str, Body: Any, **params: Any) -> Dict[str, Any]:
+        data = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        self._record('put_object', len(data))
+        self._store(Key, data)
+        return {'ETag': f'"{len(data)}"'}
+
+    def get_object(self, Bucket: str, Key: str, **params: Any) -> Dict[str, Any]:
+        self._record('get_object')
+        if Key not in self.objects:
+            raise FakeNoSuchKey(Key)
+        return {'Body': FakeBody(self.objects[Key]), 'ContentLength': self.sizes[Key]}
+
+    def delete_object(self, Bucket: str, Key: str, **params: Any) -> Dict[str, Any]:
+        self._record('delete_object')
+        with self._lock:
+            self.objects.pop(Key, None)
+            self.sizes.pop(Key, None)
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', **params: Any) -> Dict[str, Any]:
+        self._record('list_objects_v2')
+        with self._lock:
+            keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        return {'Contents': [{'Key': key, 'Size': self.sizes[key]} for key in keys]}
+
+    def get_paginator(self, operation: str) -> Any:
+        client = self
+
+        class Paginator:
+            def paginate(self, **params: Any) -> Iterator[Dict[str, Any]]:
+                yield getattr(client, operation)(**params)
+
+        return Paginator()
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **params: Any) -> Dict[str, Any]:
+        self._record('create_multipart_upload')
+        with self._lock:
+            upload_id = str(len(self._uploads) + 1) + '-' + Key
+            self._uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes,
+                    **params: Any) -> Dict[str, Any]:
+        self._record('upload_part', len(Body))
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = bytes(Body) if self.keep_multipart else len(Body)
+        return {'ETag': f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, Any],
+                                  **params: Any) -> Dict[str, Any]:
+        self._record('complete_multipart_upload')
+        with self._lock:
+            parts = self._uploads.pop(UploadId)
+        ordered = [parts[part['PartNumber']] for part in MultipartUpload['Parts']]
+        if self.keep_multipart:
+            self._store(Key, b''.join(ordered))
+        else:
+            with self._lock:
+                self.objects[Key] = b''
+                self.sizes[Key] = sum(ordered)
+        return {}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **params: Any) -> Dict[str, Any]:
+        self._record('abort_multipart_upload')
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, **params: Any) -> None:
+        with open(Filename, 'rb') as f:
+            data = f.read()
+        self._record('upload_file', len(data))
+        self._store(Key, data)
+
+    def download_file(self, Bucket: str, Key: str, Filename: str, **params: Any) -> None:
+        self._record('download_file')
+        if Key not in self.objects:
+            raise FakeNoSuchKey(Key)
+        with open(Filename, 'wb') as f:
+            f.write(self.objects[Key])
+
+    def total_requests(self) -> int:
+        """全操作のリクエスト数"""
+        return sum(self.requests.values())
@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+# プロジェクトルートを追加
+project_root = str(Path(__file__).parent.parent)
+
+# 計測対象のモジュール
+TARGET_MODULES = ['lambda_function', 'youtube_comment_collector']
+
+# import直後に読み込まれていないことを確認する重いモジュール
+HEAVY_MODULES = ['boto3', 'googleapiclient.discovery', 'httplib2', 'dateutil.parser', 'isodate']
+
+# 新しいPythonプロセス内で実行する計測コード（コールドスタートを再現する）
+MEASURE_CODE = """
+import json, sys, time
+module_name, mode, video_id, heavy_modules = sys.argv[1], sys.argv[2], sys.argv[3], json.loads(sys.argv[4])
+started = time.perf_counter()
+__import__(module_name)
+imported = time.perf_counter()
+loaded_heavy_modules = [name for name in heavy_modules if name in sys.modules]
+from youtube_api import get_youtube_client, call
+from s3_stream import get_s3_client
+client = get_youtube_client()
+get_s3_client()
+clients_ready = time.perf_counter()
+result = {
+    'import_ms': (imported - started) * 1000,
+    'clients_ms': (clients_ready - imported) * 1000,
+    'heavy_modules_after_import': loaded_heavy_modules,
+}
+if mode == 'live':
+    call('videos.list', part='statistics', id=video_id)
+    result['first_request_ms'] = (time.perf_counter() - clients_ready) * 1000
+print(json.dumps(result))
+"""
+
+def measure_once(module_name, live, video_id):
+    """新しいプロセスで1回計測"""
+    env = dict(os.environ)
+    env.setdefault('S3_BUCKET_NAME', 'benchmark-bucket')
+    env.setdefault('YOUTUBE_API_KEY', 'benchmark-key')
+    env['PYTHONPATH'] = os.path.join(project_root, 'src')
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE_CODE, module_name, 'live' if live else 'offline', video_id,
+         json.dumps(HEAVY_MODULES)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def summarize(samples, key):
+    """計測値の中央値と最小値"""
+    values = [sample[key] for sample in samples if key in sample]
+    if not values:
+        return None
+    return {'median_ms': round(statistics.median(values), 1), 'min_ms': round(min(values), 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description='コールドスタート（import時間・クライアント作成・初回リクエスト）を計測します')
+    parser.add_argument('--runs', type=int, default=5, help='計測回数')
+    parser.add_argument('--live', action='store_true', help='実際のYouTube APIへの初回リクエストも計測（config/.envのAPIキーを使用）')
+    parser.add_argument('--video-id', default='R-H5R38Jym0', help='初回リクエストで取得する動画ID')
+    parser.add_argument('--output', help='結果を保存するJSONファイル')
+    args = parser.parse_args()
+
+    if args.live:
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(project_root, 'config', '.env'), override=True)
+
+    results = {}
+    for module_name in TARGET_MODULES:
+        samples = [measure_once(module_name, args.live, args.video_id) for _ in range(args.runs)]
+        results[module_name] = {
+            'import': summarize(samples, 'import_ms'),
+            'clients': summarize(samples, 'clients_ms'),
+            'first_request': summarize(samples, 'first_request_ms'),
+            'heavy_modules_after_import': samples[-1]['heavy_modules_after_import'],
+        }
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
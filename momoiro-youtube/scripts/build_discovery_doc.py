@@ -0,0 +1,91 @@
+import os
+import json
+import argparse
+from pathlib import Path
+
+# プロジェクトルートを追加
+project_root = str(Path(__file__).parent.parent)
+
+# 出力先（youtube_api.DISCOVERY_DOCUMENT_PATHと同じ）
+OUTPUT_PATH = os.path.join(project_root, 'src', 'discovery', 'youtube.v3.json')
+
+# 収集処理で使用するAPIメソッド
+USED_METHODS = {
+    'search': ['list'],
+    'videos': ['list'],
+    'channels': ['list'],
+    'playlistItems': ['list'],
+    'commentThreads': ['list'],
+    'comments': ['list'],
+}
+
+def load_source_document(source=None):
+    """元になるディスカバリドキュメントを読み込む（省略時はgoogle-api-python-client同梱のもの）"""
+    if source is None:
+        import googleapiclient.discovery
+        source = os.path.join(os.path.dirname(googleapiclient.discovery.__file__),
+                              'discovery_cache', 'documents', 'youtube.v3.json')
+    with open(source, encoding='utf-8') as f:
+        return json.load(f)
+
+def collect_refs(value, refs):
+    """スキーマ定義から参照している$refを再帰的に集める"""
+    if isinstance(value, dict):
+        if '$ref' in value:
+            refs.add(value['$ref'])
+        for child in value.values():
+            collect_refs(child, refs)
+    elif isinstance(value, list):
+        for child in value:
+            collect_refs(child, refs)
+
+def strip_descriptions(value):
+    """説明文（文字列のdescription）を削除する（プロパティ名としてのdescriptionは残す）"""
+    if isinstance(value, dict):
+        return {key: strip_descriptions(child) for key, child in value.items()
+                if not (key == 'description' and isinstance(child, str))}
+    if isinstance(value, list):
+        return [strip_descriptions(child) for child in value]
+    return value
+
+def trim_document(document):
+    """使用するメソッドとそのレスポンスが参照するスキーマのみを残す"""
+    resources = {}
+    for resource_name, method_names in USED_METHODS.items():
+        methods = document['resources'][resource_name]['methods']
+        resources[resource_name] = {'methods': {name: methods[name] for name in method_names}}
+
+    # レスポンスから参照されるスキーマを辿る
+    pending = set()
+    collect_refs(resources, pending)
+    schemas = {}
+    while pending:
+        name = pending.pop()
+        if name in schemas:
+            continue
+        schemas[name] = document['schemas'][name]
+        refs = set()
+        collect_refs(schemas[name], refs)
+        pending |= refs - set(schemas)
+
+    trimmed = {key: value for key, value in document.items() if key not in ('resources', 'schemas')}
+    trimmed['resources'] = resources
+    trimmed['schemas'] = schemas
+    # 説明文はクライアントの動作に不要なためサイズ削減のため削除
+    return strip_descriptions(trimmed)
+
+def main():
+    parser = argparse.ArgumentParser(description='同梱用のYouTube Data APIディスカバリドキュメントを生成します')
+    parser.add_argument('--source', help='元のディスカバリドキュメントのパス（省略時はgoogle-api-python-client同梱のもの）')
+    args = parser.parse_args()
+
+    document = load_source_document(args.source)
+    trimmed = trim_document(document)
+
+    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
+    with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(trimmed, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    print(f"{OUTPUT_PATH} を生成しました（スキーマ{len(trimmed['schemas'])}件、{os.path.getsize(OUTPUT_PATH)}バイト）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# プロジェクトルートを追加
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+# src配下のモジュール同士のimportを解決するためsrcも追加
+sys.path.append(os.path.join(project_root, 'src'))
+
+# .envファイルのパスを設定
+env_path = os.path.join(project_root, 'config', '.env')
+load_dotenv(env_path, override=True)
+
+from src.output_index import VIDEO_ORDER_COLUMNS, OutputIndex, iter_local_files, iter_s3_files
+from src.video_analysis import TITLE_FLAG_COLUMNS
+
+# インデックスの保存先（OUTPUT_INDEX_PATHで変更可能）
+DEFAULT_INDEX_PATH = os.environ.get('OUTPUT_INDEX_PATH', os.path.join(project_root, '.cache', 'output_index.sqlite'))
+
+# 表形式で表示する列
+VIDEO_COLUMNS = ['video_id', 'snapshot_date', 'published_at', 'view_count', 'daily_avg_views', 'title']
+COMMENT_COLUMNS = ['video_id', 'published_at', 'like_count', 'author', 'text']
+
+# 表形式で表示する文字列の最大長
+MAX_CELL_LENGTH = 60
+
+
+def ingest(index: OutputIndex, args: argparse.Namespace) -> None:
+    """ローカルディレクトリ・S3バケットの収集結果を取り込む（指定がない場合は環境変数のバケット）"""
+    buckets = list(args.bucket or [])
+    if not args.dir and not buckets:
+        buckets = list(dict.fromkeys(filter(None, [os.environ.get('S3_BUCKET_NAME'),
+                                                   os.environ.get('S3_BUCKET_NAME_GET_COMMENT')])))
+        if not buckets:
+            sys.exit('エラー: --dir・--bucketまたはS3_BUCKET_NAMEを指定してください')
+    for directory in args.dir or []:
+        root = os.path.abspath(directory)
+        print_result(root, index.ingest(root, iter_local_files(root), force=args.force))
+    if buckets:
+        from src.s3_stream import get_s3_client
+        for bucket in buckets:
+            result = index.ingest(f's3://{bucket}', iter_s3_files(get_s3_client(), bucket, args.prefix),
+                                  force=args.force)
+            print_result(f's3://{bucket}', result)
+
+
+def print_result(source: str, result: Dict[str, int]) -> None:
+    """取り込み結果を表示"""
+    print(f"{source}: 動画 {result['videos']}件（{result['video_files']}ファイル）、"
+          f"コメント {result['comments']}件（{result['comment_files']}ファイル）、"
+          f"変更なし {result['unchanged_files']}ファイル")
+
+
+def get_month_range(month: str) -> Tuple[str, str]:
+    """YYYY-MM形式の月の初日と翌月の初日"""
+    start = datetime.strptime(month, '%Y-%m').date()
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start.isoformat(), end.isoformat()
+
+
+def get_comment_range(args: argparse.Namespace) -> Tuple[Optional[str], Optional[str]]:
+    """コメントの投稿日時の範囲（--month・--last-month・--days・--since・--until、UTC）"""
+    if args.last_month:
+        first_of_month = date.today().replace(day=1)
+        return get_month_range((first_of_month - timedelta(days=1)).strftime('%Y-%m'))
+    if args.month:
+        return get_month_range(args.month)
+    since = args.since
+    if args.days:
+        since = (datetime.now(timezone.utc) - timedelta(days=args.days)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return since, args.until
+
+
+def print_rows(rows: List[Dict[str, Any]], columns: Optional[List[str]], as_json: bool) -> None:
+    """検索結果を表形式（--jsonの場合は1行に1件のJSON）で表示"""
+    if as_json:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return
+    if not rows:
+        print('該当する結果はありません')
+        return
+    columns = columns or list(rows[0])
+
+    def cell(value: Any) -> str:
+        if isinstance(value, float):
+            value = round(value, 2)
+        text = '' if value is None else str(value).replace('\n', ' ')
+        return text if len(text) <= MAX_CELL_LENGTH else text[:MAX_CELL_LENGTH - 1] + '…'
+
+    table = [[cell(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(values[i]) for values in table)) for i, column in enumerate(columns)]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for values in table:
+        print('  '.join(value.ljust(width) for value, width in zip(values, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='収集結果（年ごとの動画データ・コメント）のローカルのインデックスを作成・検索します')
+    parser.add_argument('--db', default=DEFAULT_INDEX_PATH, help='インデックスのSQLiteファイル')
+    parser.add_argument('--json', action='store_true', help='結果を1行に1件のJSONで出力')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help='収集結果を差分で取り込む')
+    ingest_parser.add_argument('--dir', action='append', help='収集結果を保存したローカルディレクトリ（複数指定可）')
+    ingest_parser.add_argument('--bucket', action='append', help='S3バケット（複数指定可）')
+    ingest_parser.add_argument('--prefix', default='', help='S3のプレフィックス（例: yyyy=2024/）')
+    ingest_parser.add_argument('--force', action='store_true', help='取り込み済みのファイルも読み込み直す')
+
+    top_parser = subparsers.add_parser('top', help='列の値が大きい順の動画')
+    top_parser.add_argument('--by', default='daily_avg_views', choices=VIDEO_ORDER_COLUMNS, help='並べ替える列')
+    top_parser.add_argument('--year', type=int, help='公開年（日本時間）')
+    top_parser.add_argument('--date', help='取得日（YYYY-MM-DD、省略時は動画ごとの最新の取得）')
+    top_parser.add_argument('--flag', action='append', choices=list(TITLE_FLAG_COLUMNS), help='タイトル分類（複数指定可）')
+    top_parser.add_argument('--channel', help='チャンネルID')
+    top_parser.add_argument('--limit', type=int, default=20, help='表示する件数')
+
+    comments_parser = subparsers.add_parser('comments', help='本文に語句を含むコメント')
+    comments_parser.add_argument('text', help='検索する語句')
+    comments_parser.add_argument('--video-id', help='動画ID')
+    comments_parser.add_argument('--since', help='この日時以降の投稿（YYYY-MM-DD、UTC）')
+    comments_parser.add_argument('--until', help='この日時より前の投稿（YYYY-MM-DD、UTC）')
+    comments_parser.add_argument('--days', type=int, help='直近の日数')
+    comments_parser.add_argument('--month', help='投稿月（YYYY-MM）')
+    comments_parser.add_argument('--last-month', action='store_true', help='先月の投稿')
+    comments_parser.add_argument('--limit', type=int, default=50, help='表示する件数')
+
+    sql_parser = subparsers.add_parser('sql', help='任意のSQLを実行（テーブル: videos・comments・ingested_files）')
+    sql_parser.add_argument('query', help='SQL')
+
+    subparsers.add_parser('stats', help='取り込み済みの件数')
+    args = parser.parse_args()
+
+    index = OutputIndex(args.db)
+    started = time.perf_counter()
+    try:
+        if args.command == 'ingest':
+            ingest(index, args)
+        elif args.command == 'top':
+            rows = index.top_videos(args.by, year=args.year, snapshot_date=args.date, flags=args.flag or (),
+                                    channel_id=args.channel, limit=args.limit)
+            columns = VIDEO_COLUMNS if args.by in VIDEO_COLUMNS else VIDEO_COLUMNS[:-1] + [args.by, 'title']
+            print_rows(rows, columns, args.json)
+        elif args.command == 'comments':
+            since, until = get_comment_range(args)
+            rows = index.search_comments(args.text, since=since, until=until, video_id=args.video_id,
+                                         limit=args.limit)
+            print_rows(rows, COMMENT_COLUMNS, args.json)
+        elif args.command == 'sql':
+            print_rows(index.query(args.query), None, args.json)
+        else:
+            print(json.dumps(index.stats(), ensure_ascii=False, indent=2))
+    finally:
+        index.close()
+    if not args.json:
+        print(f"({time.perf_counter() - started:.3f}s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
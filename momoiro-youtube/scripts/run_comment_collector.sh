@@ -6,37 +6,22 @@ export PYTHONPATH=$PYTHONPATH:$(pwd)/src
 # 動画IDファイルのパス
 VIDEO_IDS_FILE="video_ids.txt"
 
+# 並列に処理する動画数
+WORKERS=${COMMENT_WORKERS:-4}
+
 # ファイルが存在するか確認
 if [ ! -f "$VIDEO_IDS_FILE" ]; then
     echo "エラー: $VIDEO_IDS_FILE が見つかりません"
     exit 1
 fi
 
-# 動画IDを読み込んで処理
-while IFS= read -r video_id
-do
-    # 空行をスキップ
-    if [ -z "$video_id" ]; then
-        continue
-    fi
+# 1つのプロセスで全動画を並列に処理（APIクライアントとS3クライアントを共有）
+python src/youtube_comment_collector.py --ids-file "$VIDEO_IDS_FILE" --workers "$WORKERS" "$@"
 
-    echo "動画ID: $video_id のコメントを取得します..."
-    
-    # コメント取得スクリプトを実行
-    python src/youtube_comment_collector.py "$video_id"
-    
-    # エラーが発生した場合はスキップ
-    if [ $? -ne 0 ]; then
-        echo "エラー: 動画ID $video_id の処理中にエラーが発生しました"
-        continue
-    fi
-    
-    echo "動画ID: $video_id の処理が完了しました"
-    echo "----------------------------------------"
-    
-    # 1秒待機（API制限を考慮）
-    sleep 1
-    
-done < "$VIDEO_IDS_FILE"
+# エラーが発生した動画がある場合
+if [ $? -ne 0 ]; then
+    echo "エラー: 一部の動画の処理中にエラーが発生しました"
+    exit 1
+fi
 
-echo "すべての処理が完了しました" 
\ No newline at end of file
+echo "すべての処理が完了しました"
@@ -9,16 +9,21 @@ from dotenv import load_dotenv
 # プロジェクトルートを追加
 project_root = str(Path(__file__).parent.parent)
 sys.path.append(project_root)
+# src配下のモジュール同士のimportを解決するためsrcも追加
+sys.path.append(os.path.join(project_root, 'src'))
 
 # .envファイルのパスを設定
 env_path = os.path.join(project_root, 'config', '.env')
 load_dotenv(env_path, override=True)
 
+# ローカル実行ではAPIレスポンスをキャッシュしてクォータの消費を抑える（空文字で無効化）
+os.environ.setdefault('YOUTUBE_CACHE_PATH', os.path.join(project_root, '.cache', 'youtube_responses.sqlite'))
+
 # Lambda関数をインポート
 from src.lambda_function import lambda_handler
 
-def main():
-    # 引数の処理
+def parse_start_year():
+    """コマンドライン引数から開始年を取得"""
     if len(sys.argv) > 1:
         try:
             start_year = int(sys.argv[1])
@@ -31,14 +36,31 @@ def main():
     else:
         # 引数なしの場合は現在の年をデフォルトとして使用
         start_year = datetime.now(pytz.timezone('Asia/Tokyo')).year
+    return start_year
+
+def main():
+    # 引数の処理
+    if len(sys.argv) > 1 and sys.argv[1] in ('uploads', 'scheduled'):
+        # アップロード再生リストからの差分取得（scheduledは更新時期を迎えた動画のみ更新）
+        event = {
+            'mode': sys.argv[1]
+        }
+    elif len(sys.argv) > 1 and sys.argv[1] == 'compact':
+        # 当日のCSVパートファイルをvideo_stats.csvに結合
+        event = {
+            'action': 'compact_csv'
+        }
+    else:
+        event = {
+            'start_year': parse_start_year()
+        }
     
-    # Lambda関数のイベントデータを作成
-    event = {
-        'start_year': start_year
-    }
-    
-    # Lambda関数を実行
+    # Lambda関数を実行（TIME_BUDGET_SECONDSで時間切れになった場合は続きを順に実行）
     result = lambda_handler(event, None)
+    while result['statusCode'] == 200 and 'continuation' in json.loads(result['body']):
+        continuation_event = json.loads(result['body'])['continuation']
+        print(f"\nContinuing run {continuation_event['run']['run_id']} ({continuation_event['run']['continuation']})")
+        result = lambda_handler(continuation_event, None)
     
     # 結果を表示
     print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -6,6 +6,8 @@ from dotenv import load_dotenv
 # プロジェクトルートを追加
 project_root = str(Path(__file__).parent.parent)
 sys.path.append(project_root)
+# src配下のモジュール同士のimportを解決するためsrcも追加
+sys.path.append(os.path.join(project_root, 'src'))
 
 # .envファイルのパスを設定
 env_path = os.path.join(project_root, 'config', '.env')
@@ -20,7 +22,13 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description='YouTube動画のコメントを取得してS3に保存します')
     parser.add_argument('video_id', help='YouTube動画ID')
+    parser.add_argument('--delta', action='store_true', help='前回の取得以降の新しいコメントのみ取得')
+    parser.add_argument('--checkpoint-dir', help='チェックポイントをS3ではなくローカルのディレクトリに保存')
+    parser.add_argument('--restart', action='store_true', help='中断された取得を再開せず最初から取得')
+    parser.add_argument('--tag-members', action='store_true', help='JSON Linesの各コメントに言及しているメンバーを付与')
+    parser.add_argument('--replies', action='store_true', help='返信も取得（コメントIDと返信先のIDを出力）')
     args = parser.parse_args()
 
     # コメント収集スクリプトを実行
-    main(args.video_id) 
\ No newline at end of file
+    main(args.video_id, delta=args.delta, checkpoint_dir=args.checkpoint_dir, restart=args.restart,
+         tag_members=args.tag_members, replies=args.replies) 
\ No newline at end of file
@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# プロジェクトルートを追加
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+# src配下のモジュール同士のimportを解決するためsrcも追加
+sys.path.append(os.path.join(project_root, 'src'))
+
+# .envファイルのパスを設定
+env_path = os.path.join(project_root, 'config', '.env')
+load_dotenv(env_path, override=True)
+
+# Lambda関数をインポート
+from src.lambda_function import lambda_handler
+# Lambda関数が使用するレート制限（srcを追加したためlambda_functionと同じモジュール）
+from youtube_api import rate_limiter
+
+# キューディレクトリ配下のディレクトリ（未処理・処理中・処理済み）
+QUEUE_DIRS = ('pending', 'claimed', 'done')
+
+# ワーカープロセスに割り当てたクォータと使用済みのクォータ（init_workerで設定する。budgetがNoneは無制限）
+worker_quota = {'budget': None, 'spent': 0}
+
+
+def plan_work_units(event: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """コーディネーターとしてLambda関数を呼び出し、作業単位ごとのイベントと1日の残りのクォータを取得"""
+    result = lambda_handler({**event, 'action': 'fan_out'}, None)
+    body = json.loads(result['body'])
+    if result['statusCode'] != 200:
+        raise RuntimeError(body.get('error'))
+    return body['events'], body.get('quota_remaining')
+
+
+def init_worker(quota_budget: Optional[int], requests_per_second: Optional[float] = None) -> None:
+    """ワーカープロセスを初期化（全ワーカーで分け合うクォータと1秒あたりのリクエスト数のうち、このワーカーの分を設定）"""
+    worker_quota.update(budget=quota_budget, spent=0)
+    if requests_per_second is not None:
+        rate_limiter.set_rate(requests_per_second)
+
+
+def run_work_unit(worker_event: Dict[str, Any]) -> Dict[str, Any]:
+    """1つの作業単位をLambda関数で処理し、結果を返す
+
+    TIME_BUDGET_SECONDSで時間切れになった場合は、レスポンスのcontinuationで続きを順に実行する
+    （scripts/run_local.pyと同じ。クォータの上限による中断は続きを実行せずに結果に含める）。
+    """
+    started = time.time()
+    if worker_quota['budget'] is not None:
+        # ワーカーに割り当てたクォータの残りをこの作業単位（継続実行を含む）に割り当てる
+        quota_budget = max(0, worker_quota['budget'] - worker_quota['spent'])
+        worker_event = {**worker_event, 'run': {**worker_event['run'], 'quota_budget': quota_budget}}
+    result = lambda_handler(worker_event, None)
+    body = json.loads(result['body'])
+    total_videos = body.get('total_videos', 0)
+    quota_used = body.get('quota_used', 0)
+    continuations = 0
+    while result['statusCode'] == 200 and 'continuation' in body:
+        continuations += 1
+        result = lambda_handler(body['continuation'], None)
+        body = json.loads(result['body'])
+        total_videos += body.get('total_videos', 0)
+        quota_used += body.get('quota_used', 0)
+    worker_quota['spent'] += quota_used
+    summary = {
+        'unit_id': worker_event['unit']['unit_id'],
+        'status_code': result['statusCode'],
+        'total_videos': total_videos,
+        'quota_used': quota_used,
+        'continuations': continuations,
+        'error': body.get('error'),
+        'seconds': round(time.time() - started, 1)
+    }
+    if 'continuation' in body:
+        summary['continuation'] = body['continuation']
+    return summary
+
+
+def run_with_pool(events: List[Dict[str, Any]], workers: int, quota_budget: Optional[int] = None,
+                  requests_per_second: Optional[float] = None) -> List[Dict[str, Any]]:
+    """作業単位をプロセスプールで並列に処理（quota_budget・requests_per_secondは各ワーカーの分）"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(quota_budget, requests_per_second)) as pool:
+        return list(pool.map(run_work_unit, events))
+
+
+def enqueue(events: List[Dict[str, Any]], queue_dir: str) -> None:
+    """作業単位のイベントをキューディレクトリに1ファイルずつ書き出す"""
+    for name in QUEUE_DIRS:
+        os.makedirs(os.path.join(queue_dir, name), exist_ok=True)
+    for worker_event in events:
+        path = os.path.join(queue_dir, 'pending', f"{worker_event['unit']['unit_id']}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(worker_event, f, ensure_ascii=False)
+
+
+def queue_worker(queue_dir: str, quota_budget: Optional[int] = None,
+                 requests_per_second: Optional[float] = None) -> None:
+    """キューから作業単位を1つずつ取り出して処理（複数のプロセスで同時に実行できる）
+
+    pendingからclaimedへの移動（rename）で作業単位を確保するため、同じ作業単位を重複して処理しない。
+    quota_budget・requests_per_secondはこのワーカーが処理する全作業単位で使用するクォータと1秒あたりのリクエスト数。
+    """
+    init_worker(quota_budget, requests_per_second)
+    pending_dir = os.path.join(queue_dir, 'pending')
+    while True:
+        names = sorted(os.listdir(pending_dir))
+        if not names:
+            return
+        for name in names:
+            claimed_path = os.path.join(queue_dir, 'claimed', name)
+            try:
+                os.rename(os.path.join(pending_dir, name), claimed_path)
+            except FileNotFoundError:
+                # 他のワーカーが先に確保した
+                continue
+            with open(claimed_path, encoding='utf-8') as f:
+                worker_event = json.load(f)
+            summary = run_work_unit(worker_event)
+            with open(os.path.join(queue_dir, 'done', name), 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False)
+            os.remove(claimed_path)
+            break
+
+
+def run_with_queue(events: List[Dict[str, Any]], workers: int, queue_dir: str, quota_budget: Optional[int] = None,
+                   requests_per_second: Optional[float] = None) -> List[Dict[str, Any]]:
+    """作業単位をキューディレクトリ経由で複数のワーカープロセスに処理させる
+
+    Lambda関数を作業単位ごとに呼び出す構成をローカルで再現する。
+    中断した場合はclaimedに残ったファイルをpendingに戻して再実行できる。
+    """
+    enqueue(events, queue_dir)
+    processes = [multiprocessing.Process(target=queue_worker, args=(queue_dir, quota_budget, requests_per_second))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    done_dir = os.path.join(queue_dir, 'done')
+    summaries = []
+    for worker_event in events:
+        path = os.path.join(done_dir, f"{worker_event['unit']['unit_id']}.json")
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                summaries.append(json.load(f))
+    return summaries
+
+
+def print_summary(summaries: List[Dict[str, Any]], seconds: float) -> None:
+    """作業単位ごとの結果を表示"""
+    print(f"\n{'unit':<40} {'status':>6} {'videos':>7} {'cont':>5} {'seconds':>8}")
+    for summary in summaries:
+        print(f"{summary['unit_id']:<40} {summary['status_code']:>6} {summary['total_videos']:>7} "
+              f"{summary['continuations']:>5} {summary['seconds']:>8}"
+              + (f"  {summary['error']}" if summary['error'] else ''))
+    failed = [summary for summary in summaries if summary['status_code'] != 200]
+    print(f"\n{len(summaries)} units, {sum(s['total_videos'] for s in summaries)} videos, "
+          f"{len(failed)} failed, {seconds:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='チャンネル×年の作業単位に分割して並列に動画情報を取得')
+    parser.add_argument('--channels', help='取得対象のチャンネルID（カンマ区切り、省略時はCHANNEL_IDS）')
+    parser.add_argument('--start-year', type=int, help='開始年（searchモード）')
+    parser.add_argument('--mode', default='search', choices=['search', 'uploads', 'scheduled'], help='取得方式')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='並列に処理するプロセス数')
+    parser.add_argument('--queue-dir', help='指定した場合はキューディレクトリ経由で作業単位を処理')
+    parser.add_argument('--compact', action='store_true', help='処理後に当日のCSVパートファイルを結合')
+    args = parser.parse_args()
+
+    event = {'mode': args.mode}
+    if args.channels:
+        event['channel_ids'] = args.channels
+    if args.start_year:
+        event['start_year'] = args.start_year
+
+    started = time.time()
+    events, quota_remaining = plan_work_units(event)
+    workers = max(1, min(args.workers, len(events)))
+    # 1日の残りのクォータと1秒あたりのリクエスト数（YOUTUBE_REQUESTS_PER_SECOND）はワーカーに等分する
+    # （各ワーカーはクォータの割り当ての残りを順に作業単位に使う）
+    worker_quota_budget = quota_remaining // workers if quota_remaining is not None else None
+    worker_requests_per_second = rate_limiter.requests_per_second / workers
+    print(f"Planned {len(events)} work units, processing with {workers} workers "
+          f"(per worker: quota {worker_quota_budget if worker_quota_budget is not None else 'unlimited'}, "
+          f"{worker_requests_per_second:g} requests/s)")
+    if args.queue_dir:
+        summaries = run_with_queue(events, workers, args.queue_dir, worker_quota_budget, worker_requests_per_second)
+    else:
+        summaries = run_with_pool(events, workers, worker_quota_budget, worker_requests_per_second)
+    print_summary(summaries, time.time() - started)
+
+    if args.compact and events:
+        result = lambda_handler({'action': 'compact_csv', 'date_folder': events[0]['run']['date_folder']}, None)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+import csv
+import hashlib
+import html
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from keyword_engine import normalize_text
+from output_index import COMMENTS_PATTERN, get_comment_key, iter_lines
+from video_analysis import JST, parse_timestamp
+
+# youtube_comment_collector（ライブ取得）・boto3（S3）は使用時にimportする
+
+# 保存済みのコメントのCSV（comments_{動画ID}_{時刻}.csv）。JSON Linesと同じ取得のCSVは読み込まない
+COMMENTS_CSV_PATTERN = re.compile(COMMENTS_PATTERN.pattern[:-len(r'\.jsonl$')] + r'\.csv$')
+
+# n-gramの文字数（日本語は分かち書きしないため文字単位、COMMENT_NGRAM_SIZESでカンマ区切りで指定可能）
+NGRAM_SIZES = tuple(int(size) for size in os.environ.get('COMMENT_NGRAM_SIZES', '2,3').split(',') if size.strip())
+
+# Count-Min Sketchの幅・深さと上位として保持する件数（動画・全体 / 日ごと）
+SKETCH_WIDTH = 4096
+DAY_SKETCH_WIDTH = 512
+SKETCH_DEPTH = 4
+TOP_K = 50
+DAY_TOP_K = 20
+
+# スケッチの表に反映するまでCounterにまとめる項目の種類数
+PENDING_LIMIT = 8192
+
+# 高評価数をそのままの値で数える上限（以上は相対誤差(LIKE_GAMMA-1)/2以内の対数のバケットで数える）
+EXACT_LIKE_LIMIT = 128
+LIKE_GAMMA = 1.05
+
+# 高評価数の分布の区間（下限、最後は上限なし）
+LIKE_DISTRIBUTION_BOUNDS = [0, 1, 5, 10, 100, 1000]
+
+# サマリーに含める高評価数の分位点
+LIKE_QUANTILES = (0.5, 0.9, 0.99)
+
+# n-gramを取り出す文字の並び（数字・記号・空白で区切る）とHTMLタグ（textDisplayに含まれる）
+_WORD_PATTERN = re.compile(r'[^\W\d_]+')
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+@lru_cache(maxsize=200000)
+def stable_hash(item: str) -> Tuple[int, int]:
+    """プロセスをまたいで同じ値になる2つの独立した32ビットのハッシュ（Count-Min Sketchの各行の位置の計算に使用）
+
+    CRC32は線形のため、同じ長さの文字列では種を変えても衝突が全ての行で揃ってしまう。
+    """
+    value = int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little')
+    return value & 0xFFFFFFFF, (value >> 32) | 1
+
+
+def extract_ngrams(text: str) -> Counter:
+    """コメント本文の文字n-gramの出現回数（HTMLタグ・実体参照を除き、NFKC正規化した文字の並びごと）"""
+    counts = Counter()
+    for word in _WORD_PATTERN.findall(normalize_text(html.unescape(_TAG_PATTERN.sub(' ', text or '')))):
+        for size in NGRAM_SIZES:
+            for start in range(len(word) - size + 1):
+                counts[word[start:start + size]] += 1
+    return counts
+
+
+class TopK:
+    """Count-Min Sketchで出現回数を推定し、推定値の大きい項目を候補として保持する
+
+    加算はいったんCounterにまとめ、PENDING_LIMIT種類ごとに表へ反映する（項目ごとの表の更新を減らす）。
+    同じ幅・深さのスケッチは表を足し合わせてマージでき、候補は合算した表から推定し直す。
+    推定値は実際の回数以上（過大評価のみ）になる。
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH, capacity: int = TOP_K):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.table = array('q', [0]) * (width * depth)
+        self.candidates = {}
+        self._threshold = 0
+        self._pending = Counter()
+
+    def _positions(self, item: str) -> List[int]:
+        first, second = stable_hash(item)
+        width = self.width
+        return [row * width + (first + row * second) % width for row in range(self.depth)]
+
+    def add(self, item: str, count: int = 1) -> None:
+        """項目の出現回数を加算"""
+        self._pending[item] += count
+        if len(self._pending) >= PENDING_LIMIT:
+            self.flush()
+
+    def update(self, counts: Dict[str, int]) -> None:
+        """項目ごとの出現回数をまとめて加算"""
+        self._pending.update(counts)
+        if len(self._pending) >= PENDING_LIMIT:
+            self.flush()
+
+    def flush(self) -> None:
+        """まとめた加算を表と候補に反映"""
+        if not self._pending:
+            return
+        table = self.table
+        width = self.width
+        rows = [row * width for row in range(self.depth)]
+        candidates = self.candidates
+        for item, count in self._pending.items():
+            first, second = stable_hash(item)
+            estimate = None
+            for offset in rows:
+                position = offset + first % width
+                first += second
+                value = table[position] + count
+                table[position] = value
+                if estimate is None or value < estimate:
+                    estimate = value
+            if estimate > self._threshold or item in candidates or len(candidates) < self.capacity:
+                candidates[item] = estimate
+                if len(candidates) > self.capacity * 2:
+                    self._prune()
+                    candidates = self.candidates
+        self._pending = Counter()
+
+    def estimate(self, item: str) -> int:
+        """項目の出現回数の推定値"""
+        self.flush()
+        return min(self.table[position] for position in self._positions(item))
+
+    def _prune(self) -> None:
+        """候補を推定値の大きいcapacity件に絞る（同じ推定値はtopと同じく項目の昇順に残す）"""
+        table = self.table
+        kept = sorted(((-min(table[position] for position in self._positions(item)), item)
+                       for item in self.candidates))[:self.capacity]
+        self.candidates = {item: -estimate for estimate, item in kept}
+        self._threshold = -kept[-1][0] if len(kept) >= self.capacity else 0
+
+    def merge(self, other: 'TopK') -> 'TopK':
+        """同じ大きさのスケッチを合算"""
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError('cannot merge sketches of different sizes')
+        self.flush()
+        other.flush()
+        table = self.table
+        for position, count in enumerate(other.table):
+            if count:
+                table[position] += count
+        self.candidates.update(other.candidates)
+        self._prune()
+        return self
+
+    def top(self, count: Optional[int] = None) -> List[List[Any]]:
+        """推定値の大きい順の[項目, 推定値]"""
+        self.flush()
+        ranked = sorted(((self.estimate(item), item) for item in self.candidates), key=lambda x: (-x[0], x[1]))
+        return [[item, estimate] for estimate, item in ranked[:count or self.capacity]]
+
+
+class LikeStats:
+    """高評価数の合計・最大値・分布・分位点（小さい値はそのまま、大きい値は対数のバケットで数える）"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = {}
+        self.distribution = [0] * len(LIKE_DISTRIBUTION_BOUNDS)
+
+    @staticmethod
+    def _bucket(value: int) -> int:
+        if value < EXACT_LIKE_LIMIT:
+            return value
+        return EXACT_LIKE_LIMIT + math.ceil(math.log(value / EXACT_LIKE_LIMIT, LIKE_GAMMA))
+
+    @staticmethod
+    def _bucket_value(bucket: int) -> int:
+        """バケットの代表値（対数のバケットは上限と下限の中間）"""
+        if bucket < EXACT_LIKE_LIMIT:
+            return bucket
+        upper = EXACT_LIKE_LIMIT * LIKE_GAMMA ** (bucket - EXACT_LIKE_LIMIT)
+        return round(upper * 2 / (1 + LIKE_GAMMA))
+
+    def add(self, value: int) -> None:
+        """1件の高評価数を加算"""
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        index = len(LIKE_DISTRIBUTION_BOUNDS) - 1
+        while value < LIKE_DISTRIBUTION_BOUNDS[index]:
+            index -= 1
+        self.distribution[index] += 1
+
+    def merge(self, other: 'LikeStats') -> 'LikeStats':
+        """別の集計を合算"""
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.distribution = [a + b for a, b in zip(self.distribution, other.distribution)]
+        return self
+
+    def quantile(self, q: float) -> Optional[int]:
+        """分位点（最大値を超えない）"""
+        if not self.count:
+            return None
+        threshold = q * self.count
+        cumulative = 0
+        for bucket in sorted(self.buckets):
+            cumulative += self.buckets[bucket]
+            if cumulative >= threshold:
+                return min(self._bucket_value(bucket), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        """サマリー用の辞書"""
+        labels = [f'{low}-{high - 1}' if high - 1 > low else str(low)
+                  for low, high in zip(LIKE_DISTRIBUTION_BOUNDS, LIKE_DISTRIBUTION_BOUNDS[1:])]
+        labels.append(f'{LIKE_DISTRIBUTION_BOUNDS[-1]}+')
+        return {
+            'total': self.total,
+            'max': self.max,
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            **{f'p{round(q * 100)}': self.quantile(q) for q in LIKE_QUANTILES},
+            'distribution': dict(zip(labels, self.distribution))
+        }
+
+
+class CommentStats:
+    """コメントの集計（件数・1時間ごとの件数・高評価数・投稿者とn-gramの上位）。同じ大きさの集計はマージできる"""
+
+    def __init__(self, width: int = SKETCH_WIDTH, top_k: int = TOP_K):
+        self.comments = 0
+        self.replies = 0
+        self.first_published_at = None
+        self.last_published_at = None
+        self.hours = Counter()
+        self.videos = Counter()
+        self.likes = LikeStats()
+        self.authors = TopK(width, SKETCH_DEPTH, top_k)
+        self.ngrams = TopK(width, SKETCH_DEPTH, top_k)
+
+    def add(self, comment: 'ParsedComment') -> None:
+        """解析済みのコメント1件を加算"""
+        self.comments += 1
+        if comment.is_reply:
+            self.replies += 1
+        if self.first_published_at is None or comment.published_at < self.first_published_at:
+            self.first_published_at = comment.published_at
+        if self.last_published_at is None or comment.published_at > self.last_published_at:
+            self.last_published_at = comment.published_at
+        self.hours[comment.hour] += 1
+        self.videos[comment.video_id] += 1
+        self.likes.add(comment.likes)
+        if comment.author:
+            self.authors.add(comment.author)
+        self.ngrams.update(comment.ngrams)
+
+    def merge(self, other: 'CommentStats') -> 'CommentStats':
+        """別の集計（別の動画・別のプロセスの部分的な集計）を合算"""
+        self.comments += other.comments
+        self.replies += other.replies
+        self.first_published_at = min(filter(None, [self.first_published_at, other.first_published_at]),
+                                      default=None)
+        self.last_published_at = max(filter(None, [self.last_published_at, other.last_published_at]), default=None)
+        self.hours.update(other.hours)
+        self.videos.update(other.videos)
+        self.likes.merge(other.likes)
+        self.authors.merge(other.authors)
+        self.ngrams.merge(other.ngrams)
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        """サマリー用の辞書（時刻は日本時間）"""
+        hour_of_day = [0] * 24
+        daily = Counter()
+        for hour, count in self.hours.items():
+            hour_of_day[int(hour[-2:])] += count
+            daily[hour[:10]] += count
+        return {
+            'comments': self.comments,
+            'replies': self.replies,
+            'first_published_at': self.first_published_at,
+            'last_published_at': self.last_published_at,
+            'likes': self.likes.summary(),
+            'hour_of_day': hour_of_day,
+            'daily': dict(sorted(daily.items())),
+            'top_authors': self.authors.top(),
+            'top_ngrams': self.ngrams.top()
+        }
+
+
+class ParsedComment:
+    """集計に使用するコメントの値（日本時間の日付・時刻、n-gramの出現回数）"""
+
+    __slots__ = ('video_id', 'published_at', 'day', 'hour', 'likes', 'author', 'is_reply', 'ngrams')
+
+    def __init__(self, video_id: str, comment: Dict[str, Any]):
+        self.video_id = video_id
+        self.published_at = comment['publishedAt']
+        self.hour = parse_timestamp(self.published_at).astimezone(JST).strftime('%Y-%m-%dT%H')
+        self.day = self.hour[:10]
+        self.likes = int(comment.get('likeCount') or 0)
+        self.author = comment.get('author')
+        self.is_reply = bool(comment.get('parentId'))
+        self.ngrams = extract_ngrams(comment.get('text'))
+
+
+class VideoAggregate:
+    """1本の動画のコメントの集計（動画全体と投稿日ごと）
+
+    dedupeの場合は同じコメント（IDまたは投稿者・投稿日時・本文）を1回だけ数える
+    （同じ動画の複数回の取得を読み込む場合）。判定用にコメントごとに8バイトを保持するため、
+    メモリ使用量はコメント数に比例する。
+    """
+
+    def __init__(self, video_id: str, dedupe: bool = False):
+        self.video_id = video_id
+        self.total = CommentStats(SKETCH_WIDTH, TOP_K)
+        self.days = {}
+        self.duplicates = 0
+        self.sources = []
+        self._seen = set() if dedupe else None
+
+    def add(self, comment: Dict[str, Any]) -> None:
+        """コメント1件を加算"""
+        if self._seen is not None:
+            key = hashlib.blake2b(get_comment_key(self.video_id, comment).encode('utf-8'), digest_size=8).digest()
+            if key in self._seen:
+                self.duplicates += 1
+                return
+            self._seen.add(key)
+        parsed = ParsedComment(self.video_id, comment)
+        self.total.add(parsed)
+        day = self.days.get(parsed.day)
+        if day is None:
+            day = self.days[parsed.day] = CommentStats(DAY_SKETCH_WIDTH, DAY_TOP_K)
+        day.add(parsed)
+
+    def finish(self) -> 'VideoAggregate':
+        """重複の判定用の集合を破棄し、スケッチへの加算を反映（プロセス間で受け渡す前に呼び出す）"""
+        self._seen = None
+        for stats in [self.total, *self.days.values()]:
+            stats.authors.flush()
+            stats.ngrams.flush()
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        """動画ごとのサマリー（1時間ごとの件数を含む）"""
+        summary = self.total.summary()
+        del summary['daily']
+        return {
+            'video_id': self.video_id,
+            **summary,
+            'duplicates': self.duplicates,
+            'daily': {day: stats.comments for day, stats in sorted(self.days.items())},
+            'hourly': dict(sorted(self.total.hours.items())),
+            'sources': self.sources
+        }
+
+
+def summarize_day(day: str, stats: CommentStats) -> Dict[str, Any]:
+    """日ごとのサマリー（全動画の合計、1時間ごとの件数と動画ごとの件数を含む）"""
+    summary = stats.summary()
+    del summary['daily']
+    hourly = summary.pop('hour_of_day')
+    return {'date': day, **summary, 'hourly': hourly, 'videos': dict(stats.videos.most_common())}
+
+
+# 入力
+
+def iter_jsonl_comments(chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """保存済みのJSON Linesのコメントを1件ずつ読み込む"""
+    for line in iter_lines(chunks):
+        yield json.loads(line)
+
+
+def iter_csv_comments(chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """保存済みのCSVのコメントを1件ずつ読み込む（本文は最後の列で、カンマは全角に置き換えられている）
+
+    以前のCSVは投稿者名のカンマをエスケープしていないため、列が多い行は先頭の余分な列を投稿者名に戻す。
+    """
+    columns = None
+    for row in csv.reader(line.decode('utf-8') for line in iter_lines(chunks)):
+        if columns is None:
+            columns = row
+            continue
+        extra = len(row) - len(columns)
+        if extra > 0:
+            row = [','.join(row[:extra + 1])] + row[extra + 1:]
+        yield dict(zip(columns, row))
+
+
+def read_local_chunks(path: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """ローカルファイルをチャンクごとに読み込む"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_source_comments(video_id: str, source: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """入力（local・s3: 保存済みのJSON Lines・CSV、live: YouTube APIからの取得）のコメントを1件ずつ読み込む"""
+    if source['type'] == 'live':
+        from youtube_comment_collector import REPLY_WORKERS, iter_comments
+        if not source.get('replies'):
+            yield from iter_comments(video_id)
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=REPLY_WORKERS) as reply_pool:
+            yield from iter_comments(video_id, reply_pool=reply_pool)
+        return
+    if source['type'] == 's3':
+        from s3_stream import get_s3_client, iter_object_chunks
+        chunks = iter_object_chunks(get_s3_client(), source['bucket'], source['key'])
+    else:
+        chunks = read_local_chunks(source['path'])
+    if source['format'] == 'csv':
+        yield from iter_csv_comments(chunks)
+    else:
+        yield from iter_jsonl_comments(chunks)
+
+
+def describe_source(source: Dict[str, Any]) -> str:
+    """入力の表示名"""
+    if source['type'] == 's3':
+        return f"s3://{source['bucket']}/{source['key']}"
+    return source.get('path') or 'live'
+
+
+def find_comment_sources(files: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    """キーと入力の組から動画ごとの保存済みのコメント（JSON Linesを優先し、同じ取得のCSVは除く）を探す"""
+    # (動画ID, comments_{動画ID}_{時刻}) ごとの入力
+    crawls = {}
+    for key, source in files:
+        for file_format, pattern in (('jsonl', COMMENTS_PATTERN), ('csv', COMMENTS_CSV_PATTERN)):
+            match = pattern.search(key)
+            if not match:
+                continue
+            crawl = (match['video_id'], key.rsplit('/', 1)[-1].rsplit('.', 1)[0])
+            if file_format == 'jsonl' or crawl not in crawls:
+                crawls[crawl] = {**source, 'format': file_format}
+            break
+    # 動画ごとに取得時刻の順
+    videos = {}
+    for (video_id, _), source in sorted(crawls.items()):
+        videos.setdefault(video_id, []).append(source)
+    return videos
+
+
+# 集計
+
+def aggregate_video(video_id: str, sources: List[Dict[str, Any]], dedupe: bool = False) -> VideoAggregate:
+    """1本の動画の入力を順に読み込んで集計（プロセスプールのワーカーで実行する）"""
+    aggregate = VideoAggregate(video_id, dedupe=dedupe)
+    for source in sources:
+        aggregate.sources.append(describe_source(source))
+        for comment in iter_source_comments(video_id, source):
+            aggregate.add(comment)
+    return aggregate.finish()
+
+
+def aggregate_videos(jobs: Dict[str, List[Dict[str, Any]]], max_workers: int = 1,
+                     dedupe: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, CommentStats], CommentStats]:
+    """動画ごとの入力をプロセスプールで並列に集計し、部分的な集計をマージ
+
+    動画ごとのサマリー、日ごとの集計（全動画の合計）、全体の集計を返す。
+    max_workersが1の場合は同じプロセスで順に集計する。
+    """
+    video_summaries = []
+    days = {}
+    overall = CommentStats(SKETCH_WIDTH, TOP_K)
+
+    def merge(aggregate: VideoAggregate) -> None:
+        video_summaries.append(aggregate.summary())
+        overall.merge(aggregate.total)
+        for day, stats in aggregate.days.items():
+            if day in days:
+                days[day].merge(stats)
+            else:
+                days[day] = stats
+        print(f"動画ID: {aggregate.video_id} {aggregate.total.comments}件のコメントを集計しました"
+              + (f"（重複{aggregate.duplicates}件）" if aggregate.duplicates else ''))
+
+    if max_workers <= 1:
+        for video_id, sources in jobs.items():
+            merge(aggregate_video(video_id, sources, dedupe))
+    else:
+        import multiprocessing
+        # ワーカーは親プロセスのS3・YouTube APIクライアントを引き継がない（spawn）
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(aggregate_video, video_id, sources, dedupe) for video_id, sources in jobs.items()]
+            for future in as_completed(futures):
+                merge(future.result())
+    video_summaries.sort(key=lambda summary: summary['video_id'])
+    return video_summaries, days, overall
+
+
+# 出力
+
+def write_summaries(video_summaries: List[Dict[str, Any]], days: Dict[str, CommentStats], overall: CommentStats,
+                    output_dir: Optional[str] = None, s3_client: Any = None, bucket: Optional[str] = None,
+                    prefix: str = '') -> List[str]:
+    """動画ごと（videos/{動画ID}.json）・日ごと（days/{日付}.json）・全体（summary.json）のサマリーを保存
+
+    output_dirを指定した場合はローカル、それ以外はS3のbucket・prefix配下に保存する。保存したパスを返す。
+    """
+    generated_at = datetime.now(timezone.utc).isoformat()
+    files = [(f'videos/{summary["video_id"]}.json', summary) for summary in video_summaries]
+    files += [(f'days/{day}.json', summarize_day(day, stats)) for day, stats in sorted(days.items())]
+    overall_summary = overall.summary()
+    overall_summary['videos'] = len(video_summaries)
+    files.append(('summary.json', {**overall_summary, 'generated_at': generated_at}))
+
+    written = []
+    for name, body in files:
+        data = json.dumps(body, ensure_ascii=False, separators=(',', ':'))
+        if output_dir:
+            path = os.path.join(output_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(data)
+        else:
+            path = f"{prefix.rstrip('/')}/{name}" if prefix else name
+            s3_client.put_object(Bucket=bucket, Key=path, Body=data.encode('utf-8'), ContentType='application/json')
+        written.append(path)
+    return written
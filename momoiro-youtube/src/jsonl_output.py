@@ -0,0 +1,154 @@
+import importlib.util
+import json
+import os
+import zlib
+from datetime import timezone
+from typing import Any, Dict, Optional, Union
+
+from metrics import metrics
+from s3_stream import S3MultipartWriter
+from video_analysis import VideoAnalysisBatch
+
+# zstandardは任意の依存関係（zstd圧縮を選択した実行でのみimportする）
+
+# JSON Linesの圧縮形式（gzip: 標準ライブラリ、zstd: zstandardが必要）
+JSONL_COMPRESSIONS = {
+    'gzip': ('.gz', 'application/gzip'),
+    'zstd': ('.zst', 'application/zstd'),
+}
+JSONL_COMPRESSION = os.environ.get('JSONL_COMPRESSION', 'gzip')
+
+# 圧縮レベル
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# メタデータの合計を計算する列（メタデータのキー, 分析結果の列）
+AGGREGATE_COLUMNS = [
+    ('views', 'view_count'),
+    ('likes', 'like_count'),
+    ('comments', 'comment_count'),
+]
+
+
+def require_compression(compression: str) -> None:
+    """圧縮形式が利用できることを確認（未知の形式はValueError、zstandardが未インストールの場合はImportError）"""
+    if compression not in JSONL_COMPRESSIONS:
+        raise ValueError(f"Unknown JSONL compression: {compression} (choose from {', '.join(JSONL_COMPRESSIONS)})")
+    # 利用可否の確認のみのためimportせずに探す（圧縮時にcreate_compressorでimportする）
+    if compression == 'zstd' and importlib.util.find_spec('zstandard') is None:
+        raise ImportError('zstd compression requires zstandard (pip install zstandard)')
+
+
+def create_compressor(compression: str) -> Any:
+    """compress・flushで逐次圧縮するオブジェクトを作成"""
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    # wbits=31でgzip形式（ヘッダー・CRC付き）
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def get_jsonl_key(json_key: str, compression: str) -> str:
+    """年ごとのJSONのキーから圧縮したJSON Linesのキーを生成"""
+    return json_key[:-len('.json')] + '.jsonl' + JSONL_COMPRESSIONS[compression][0]
+
+
+def get_metadata_key(json_key: str) -> str:
+    """年ごとのJSONのキーからJSON Linesのメタデータ（サイドカー）のキーを生成"""
+    return json_key[:-len('.json')] + '.meta.json'
+
+
+class CompressedJsonLinesWriter:
+    """レコードを1行ずつ圧縮してS3MultipartWriterに書き込む
+
+    圧縮後のデータもパートサイズに達するごとにアップロードされるため、
+    出力全体を文字列として組み立てない。
+    """
+
+    def __init__(self, output: S3MultipartWriter, compression: str):
+        self.output = output
+        self.records = 0
+        self.bytes_uncompressed = 0
+        self._compressor = create_compressor(compression)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """1レコードを1行のJSONとして書き込む"""
+        data = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        self.records += 1
+        self.bytes_uncompressed += len(data)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self.output.write(compressed)
+
+    def close(self) -> None:
+        """圧縮の残りを書き込む（S3MultipartWriterは呼び出し元で閉じる）"""
+        self.output.write(self._compressor.flush())
+
+
+class YearAggregates:
+    """年ごとのメタデータの合計・平均を動画を書き込みながら計算する"""
+
+    def __init__(self, year: int, channel_id: str):
+        self.year = year
+        self.channel_id = channel_id
+        self.total_videos = 0
+        self.totals = {key: 0 for key, _ in AGGREGATE_COLUMNS}
+
+    def add(self, values: Dict[str, Optional[int]]) -> None:
+        """1本の動画の値を加算（分析できなかった動画は件数のみ数える）"""
+        self.total_videos += 1
+        for key, value in values.items():
+            if value is not None:
+                self.totals[key] += value
+
+    def metadata(self, fetched_at: str) -> Dict[str, Any]:
+        """save_year_jsonと同じ形式のメタデータ"""
+        count = self.total_videos
+        return {
+            'year': self.year,
+            'channel_id': self.channel_id,
+            'total_videos': count,
+            **{f'total_{key}': total for key, total in self.totals.items()},
+            **{f'average_{key}': total / count if count else 0 for key, total in self.totals.items()},
+            'fetched_at': fetched_at
+        }
+
+
+def save_year_jsonl(batch: VideoAnalysisBatch, year: int, channel_id: str, s3_client: Any, bucket: str,
+                    json_key: str, compression: str = JSONL_COMPRESSION) -> Dict[str, Union[str, int]]:
+    """1年分の分析済み動画データを圧縮したJSON Lines（1行に1動画）としてS3に逐次保存
+
+    メタデータは書き込みと同じ走査で合計を計算し、サイドカーのJSON（.meta.json）として保存する。
+    保存したキーとサイズを返す。
+    """
+    jsonl_key = get_jsonl_key(json_key, compression)
+    metadata_key = get_metadata_key(json_key)
+    aggregates = YearAggregates(year, channel_id)
+    columns = [(key, batch.columns[column]) for key, column in AGGREGATE_COLUMNS]
+
+    with metrics.stage('serialize'), \
+            S3MultipartWriter(s3_client, bucket, jsonl_key, content_type=JSONL_COMPRESSIONS[compression][1]) as output:
+        writer = CompressedJsonLinesWriter(output, compression)
+        for index, video in enumerate(batch.videos):
+            writer.write(video)
+            aggregates.add({key: values[index] for key, values in columns})
+        writer.close()
+
+    metadata = aggregates.metadata(batch.reference_time.astimezone(timezone.utc).isoformat())
+    metadata.update({
+        'videos_key': jsonl_key,
+        'format': 'jsonl',
+        'compression': compression,
+        'records': writer.records,
+        'bytes_uncompressed': writer.bytes_uncompressed,
+        'bytes_compressed': output.bytes_written
+    })
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=metadata_key,
+        Body=json.dumps(metadata, ensure_ascii=False, indent=2),
+        ContentType='application/json'
+    )
+    print(f"Saved {writer.records} videos for {year} to S3: {jsonl_key} "
+          f"({writer.bytes_uncompressed} -> {output.bytes_written} bytes)")
+    return {'key': jsonl_key, 'metadata_key': metadata_key, 'bytes': output.bytes_written}
@@ -0,0 +1,121 @@
+import json
+import re
+import unicodedata
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 動画タイトルの分類に使用するカテゴリとキーワード
+TITLE_KEYWORDS = {
+    'ライブ': ['ライブ', 'LIVE', 'live'],
+    'メンバー': ['百田', '玉井', '佐々木', '高城', '有安', '早見'],
+    'イベント': ['イベント', '配信', 'フェス', 'ツアー'],
+    'MV': ['MV', 'Music Video', 'ミュージックビデオ'],
+    'ダイジェスト': ['ダイジェスト', 'digest', 'DIGEST'],
+}
+
+# コメント内のメンバー言及の判定に使用するキーワード
+MEMBER_KEYWORDS = {
+    '百田夏菜子': ['百田', '夏菜子'],
+    '玉井詩織': ['玉井', '詩織', 'しおりん'],
+    '佐々木彩夏': ['佐々木', '彩夏', 'あーりん'],
+    '高城れに': ['高城', 'れにちゃん'],
+    '有安杏果': ['有安', '杏果'],
+    '早見あかり': ['早見', 'あかりん'],
+}
+
+# バッチ処理でテキストを連結する際の区切り文字（キーワードに含まれない文字）
+_SEPARATOR = '\x00'
+_SEPARATOR_PATTERN = re.compile(_SEPARATOR)
+
+
+def normalize_text(text: str) -> str:
+    """全角・半角と大文字・小文字の違いを吸収（NFKC正規化 + casefold）
+
+    例: 'ＬＩＶＥ' -> 'live'、半角カナ -> 全角カナ
+    """
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+class KeywordEngine:
+    """カテゴリごとのキーワードを1つの正規表現にまとめて判定するエンジン
+
+    キーワードは正規化したうえで長い順に並べた選択パターンを先読みにした正規表現にコンパイルし、
+    テキストの各位置から始まる最長のキーワードを求める。同じ位置から始まる短いキーワードは
+    接頭辞の対応表から求めるため、テキスト1件につき1回の走査で、他のカテゴリのキーワードに
+    含まれるキーワード（'ももクロChan'中の'ももクロ'など）も含めて全カテゴリの出現回数を数えられる。
+    """
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.categories = list(categories)
+        self._keyword_categories = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                normalized = normalize_text(keyword)
+                if normalized:
+                    self._keyword_categories.setdefault(normalized, []).append(category)
+        # 各キーワードの位置から始まる、カテゴリごとの最長のキーワードの長さ（接頭辞となるキーワードから求める）
+        self._prefix_categories = {}
+        for keyword in self._keyword_categories:
+            lengths = self._prefix_categories[keyword] = {}
+            for prefix, prefix_categories in self._keyword_categories.items():
+                if keyword.startswith(prefix):
+                    for category in prefix_categories:
+                        lengths[category] = max(lengths.get(category, 0), len(prefix))
+        # 各位置から始まる最長のキーワード（先読みのため重なり合う出現も全て見つかる）
+        keywords = sorted(self._keyword_categories, key=len, reverse=True)
+        self._pattern = re.compile('(?=(' + '|'.join(map(re.escape, keywords)) + '))') if keywords else None
+
+    @classmethod
+    def from_file(cls, path: str) -> 'KeywordEngine':
+        """{カテゴリ: [キーワード, ...]}形式のJSONファイルから作成"""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _empty_counts(self) -> Dict[str, int]:
+        return dict.fromkeys(self.categories, 0)
+
+    def _iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """正規化したテキスト中のキーワードの出現位置とカテゴリ
+
+        カテゴリごとに重ならない出現を先頭から数える（同じ位置からは長いキーワードを優先）。
+        """
+        # カテゴリごとの直前の出現の終了位置
+        ends = {}
+        for match in self._pattern.finditer(text):
+            start = match.start()
+            for category, length in self._prefix_categories[match.group(1)].items():
+                if start >= ends.get(category, 0):
+                    ends[category] = start + length
+                    yield start, category
+
+    def count(self, text: str) -> Dict[str, int]:
+        """テキスト中のカテゴリごとのキーワード出現回数"""
+        counts = self._empty_counts()
+        if self._pattern is None or not text:
+            return counts
+        for _, category in self._iter_matches(normalize_text(text)):
+            counts[category] += 1
+        return counts
+
+    def classify(self, text: str) -> Dict[str, bool]:
+        """テキストが各カテゴリのキーワードを含むかどうか"""
+        return {category: count > 0 for category, count in self.count(text).items()}
+
+    def count_batch(self, texts: Iterable[Optional[str]]) -> List[Dict[str, int]]:
+        """複数テキストのカテゴリごとの出現回数を1回の走査でまとめて数える"""
+        texts = [(text or '').replace(_SEPARATOR, ' ') for text in texts]
+        results = [self._empty_counts() for _ in texts]
+        if self._pattern is None or not texts:
+            return results
+
+        # 連結したテキストをまとめて正規化し、区切り文字の位置から各テキストの開始位置を求める
+        joined = normalize_text(_SEPARATOR.join(texts))
+        starts = [0] + [match.end() for match in _SEPARATOR_PATTERN.finditer(joined)]
+        for start, category in self._iter_matches(joined):
+            results[bisect_right(starts, start) - 1][category] += 1
+        return results
+
+    def matched_categories_batch(self, texts: Iterable[Optional[str]]) -> List[List[str]]:
+        """複数テキストのそれぞれについて、キーワードを含むカテゴリの一覧"""
+        return [[category for category, count in counts.items() if count]
+                for counts in self.count_batch(texts)]
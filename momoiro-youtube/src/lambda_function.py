@@ -1,111 +1,300 @@
+from __future__ import annotations
+
 import json
 import os
-from datetime import datetime, timedelta
-import pytz
-from typing import Dict, List, Any
-import boto3
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Dict, List, Any, Iterator, Optional, Tuple
 import re
-from dateutil.parser import parse
-import isodate
-import csv
-import io
+import uuid
+from contextlib import nullcontext
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from jsonl_output import JSONL_COMPRESSION, require_compression, save_year_jsonl
+from keyword_engine import KeywordEngine, TITLE_KEYWORDS
+from metrics import debug, is_debug_enabled, metrics
+from refresh_scheduler import plan_refresh
+from parquet_output import require_pyarrow, save_to_parquet
+from quota_ledger import get_daily_quota_used, get_quota_date, record_quota_usage
+from time_budget import TimeBudget, TimeBudgetExceeded
+from snapshot_store import SnapshotStore, download_snapshot_store, upload_snapshot_store
+from s3_stream import S3MultipartWriter, get_s3_client, iter_object_chunks, list_object_keys
+from video_analysis import JST, VideoAnalysisBatch, analyze_videos, parse_duration_seconds, parse_timestamp
+from youtube_api import QUOTA_BUDGET, call, get_response_cache, rate_limiter, QuotaBudgetExceeded
+
+# boto3・googleapiclient・dateutil・isodate・csvはコールドスタートを短くするため使用時にimportする
+if TYPE_CHECKING:
+    import boto3
 
-# S3クライアントの初期化
-s3 = boto3.client('s3', region_name='ap-northeast-1')
+# S3・YouTube APIクライアントは初回利用時に作成する（s3_stream.get_s3_client / youtube_api.call）
 BUCKET_NAME = os.environ['S3_BUCKET_NAME']
 
-# YouTube APIクライアントの初期化
-YOUTUBE_API_KEY = os.environ['YOUTUBE_API_KEY']
-youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
+# タイトル分類のキーワードエンジン（TITLE_KEYWORDS_PATHで{カテゴリ: [キーワード]}形式のJSONを指定可能）
+TITLE_ENGINE = (KeywordEngine.from_file(os.environ['TITLE_KEYWORDS_PATH'])
+                if os.environ.get('TITLE_KEYWORDS_PATH') else KeywordEngine(TITLE_KEYWORDS))
+
+# 出力形式（json: 年ごとのJSON、jsonl: 年ごとの圧縮したJSON Lines、csv: CSVパートファイル、
+# parquet: Parquetファイル。pyarrowが必要）
+OUTPUT_FORMATS = ('json', 'jsonl', 'csv', 'parquet')
+DEFAULT_OUTPUT_FORMATS = os.environ.get('OUTPUT_FORMATS', 'json,csv')
+
+# 並列実行のワーカー数（1の場合は逐次実行）
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '1'))
 
 # ももクロの公式チャンネルID
 CHANNEL_ID = 'UC6YNWTm6zuMFsjqd0PO3G-Q'  # ももいろクローバーZ Official Channel
 
+# 取得対象のチャンネルID（CHANNEL_IDSでカンマ区切りで指定可能、イベントのchannel_idsで実行ごとに指定可能）
+DEFAULT_CHANNEL_IDS = os.environ.get('CHANNEL_IDS', CHANNEL_ID)
+
+# 作業単位を処理するLambda関数の名前（fan_outで各作業単位を非同期に呼び出す。未設定の場合は作業単位を返すのみ）
+WORKER_FUNCTION_NAME = os.environ.get('WORKER_FUNCTION_NAME')
+
+# 差分取得の状態（ウォーターマーク）を保存するS3プレフィックス
+STATE_PREFIX = 'state'
+
+# 統計情報の時系列（スナップショット）を記録するかどうか（イベントのsnapshotsで実行ごとに指定可能）
+ENABLE_SNAPSHOTS = os.environ.get('ENABLE_SNAPSHOTS', '').lower() in ('1', 'true', 'yes')
+# スナップショットのデータベースのS3キーと実行中のローカルの保存先
+SNAPSHOT_STORE_KEY = f'{STATE_PREFIX}/video_snapshots.sqlite'
+SNAPSHOT_DB_PATH = os.environ.get('SNAPSHOT_DB_PATH', '/tmp/video_snapshots.sqlite')
+# 増加速度を計算する期間（日数、カンマ区切り）
+VELOCITY_WINDOWS = [int(days) for days in os.environ.get('VELOCITY_WINDOWS', '1,7,30').split(',') if days.strip()]
+
+# scheduledモードで1回の実行の統計情報の更新に使用するクォータ（未設定の場合はYOUTUBE_QUOTA_BUDGETの残り）
+REFRESH_QUOTA_BUDGET = os.environ.get('REFRESH_QUOTA_BUDGET')
+
+# uploads・scheduledモードで残り時間を確認しながら統計情報を更新する動画数の単位
+REFRESH_CHUNK_SIZE = 500
+
+# Lambdaの実行時間の上限に近づいた場合に、同じ関数を非同期に呼び出して続きを処理するかどうか
+AUTO_CONTINUE = os.environ.get('AUTO_CONTINUE', '').lower() in ('1', 'true', 'yes')
+# ローカル実行などcontextがない場合の実行時間の上限（秒、未設定の場合は上限なし）
+TIME_BUDGET_SECONDS = os.environ.get('TIME_BUDGET_SECONDS')
+
+# 実行ごとのCSVパートファイルを保存する日付フォルダ配下のディレクトリ
+CSV_PARTS_DIR = 'video_stats_parts'
+
+# CSVの列（エラー行も含めて常にこの順序で出力する）
+CSV_FIELDNAMES = [
+    'video_id', 'title', 'status', 'recorded_at',
+    'published_at', 'year', 'month', 'day', 'hour', 'weekday', 'time_of_day',
+    'duration_seconds', 'view_count', 'like_count', 'comment_count',
+    'daily_avg_views', 'daily_avg_likes', 'daily_avg_comments', 'total_engagement',
+    'is_live', 'is_mv', 'is_digest', 'is_event', 'has_member_name',
+    'error_message', 'channel_id'
+]
+
 def format_rfc3339(dt: datetime) -> str:
     """datetime オブジェクトをRFC3339形式の文字列に変換"""
-    utc_dt = dt.astimezone(pytz.UTC)
+    utc_dt = dt.astimezone(timezone.utc)
     return utc_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
 
+def parse_datetime(value: str) -> datetime:
+    """RFC3339形式の日時文字列をdatetimeに変換"""
+    return parse_timestamp(value)
+
 def parse_duration(duration: str) -> int:
     """ISO 8601形式の動画時間を秒数に変換"""
-    return int(isodate.parse_duration(duration).total_seconds())
+    return parse_duration_seconds(duration)
 
 def analyze_title(title: str) -> Dict[str, Any]:
-    """動画タイトルを分析"""
-    keywords = {
-        'ライブ': ['ライブ', 'LIVE', 'live'],
-        'メンバー': ['百田', '玉井', '佐々木', '高城', '有安', '早見'],
-        'イベント': ['イベント', '配信', 'フェス', 'ツアー'],
-        'MV': ['MV', 'Music Video', 'ミュージックビデオ'],
-        'ダイジェスト': ['ダイジェスト', 'digest', 'DIGEST'],
-    }
+    """動画タイトルを分析（全角・半角、大文字・小文字を区別せずにカテゴリを判定）"""
+    return TITLE_ENGINE.classify(title)
+
+def analyze_video_data(video_data: Dict[str, Any], reference_time: Optional[datetime] = None) -> Dict[str, Any]:
+    """動画データを分析して追加情報を付与（1件のみ。まとめて分析する場合はanalyze_videosを使用）"""
+    analyze_videos([video_data], reference_time or datetime.now(timezone.utc), TITLE_ENGINE)
+    return video_data
+
+# videos.listで一度に指定できる動画IDの上限
+VIDEO_BATCH_SIZE = 50
+
+def chunked(items: List[Any], size: int) -> List[List[Any]]:
+    """リストを指定サイズごとに分割"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def get_video_details(video_ids: List[str], part: str = 'statistics,contentDetails') -> Dict[str, Dict[str, Any]]:
+    """動画IDをまとめてvideos.listで取得し、動画IDをキーにした辞書で返す
+
+    1回のAPI呼び出しで最大VIDEO_BATCH_SIZE件まで取得する。
+    存在しない・非公開の動画IDは結果の辞書に含まれない。
+    """
+    details = {}
+    for batch in chunked(video_ids, VIDEO_BATCH_SIZE):
+        video_response = call(
+            'videos.list',
+            part=part,
+            id=','.join(batch),
+            maxResults=VIDEO_BATCH_SIZE
+        )
+        for video in video_response.get('items', []):
+            details[video['id']] = video
+    return details
+
+def build_video_data(video_id: str, snippet: Dict[str, Any], video_stats: Dict[str, Any], channel_id: str) -> Dict[str, Any]:
+    """検索結果のsnippetとvideos.listの結果から動画データを組み立てる"""
+    # 各フィールドの存在チェックとデフォルト値設定
+    content_details = video_stats.get('contentDetails', {})
+    statistics = video_stats.get('statistics', {})
     
-    result = {category: any(kw.lower() in title.lower() for kw in words)
-              for category, words in keywords.items()}
+    # durationのデフォルト値設定
+    duration = content_details.get('duration', 'PT0S')
     
-    return result
-
-def analyze_video_data(video_data: Dict[str, Any]) -> Dict[str, Any]:
-    """動画データを分析して追加情報を付与"""
-    # 投稿日時をパース
-    published_at = parse(video_data['published_at'])
-    jst = pytz.timezone('Asia/Tokyo')
-    published_at_jst = published_at.astimezone(jst)
-    
-    # 現在時刻との差分を計算
-    current_time = datetime.now(pytz.UTC)
-    days_since_published = (current_time - published_at).days or 1  # 0除算を防ぐ
-    
-    # 統計情報を数値に変換
-    stats = {k: int(v) for k, v in video_data['statistics'].items() if v.isdigit()}
-    
-    # 分析データを追加
-    analysis = {
-        'published_info': {
-            'year': published_at_jst.year,
-            'month': published_at_jst.month,
-            'day': published_at_jst.day,
-            'hour': published_at_jst.hour,
-            'weekday': published_at_jst.strftime('%A'),
-            'time_of_day': 'morning' if 5 <= published_at_jst.hour < 12 else
-                          'afternoon' if 12 <= published_at_jst.hour < 17 else
-                          'evening' if 17 <= published_at_jst.hour < 22 else 'night'
-        },
-        'duration_seconds': parse_duration(video_data['duration']),
-        'title_analysis': analyze_title(video_data['title']),
-        'daily_average': {
-            'views': int(stats.get('viewCount', 0)) / days_since_published,
-            'likes': int(stats.get('likeCount', 0)) / days_since_published,
-            'comments': int(stats.get('commentCount', 0)) / days_since_published
+    # 統計情報のデフォルト値設定
+    view_count = statistics.get('viewCount', '0')
+    like_count = statistics.get('likeCount', '0')
+    comment_count = statistics.get('commentCount', '0')
+    
+    return {
+        'video_id': video_id,
+        'title': snippet.get('title', ''),
+        'description': snippet.get('description', ''),
+        'published_at': snippet.get('publishedAt', ''),
+        'thumbnail_url': snippet.get('thumbnails', {}).get('high', {}).get('url', ''),
+        'channel_id': channel_id,
+        'channel_title': snippet.get('channelTitle', ''),
+        'statistics': {
+            'viewCount': view_count,
+            'likeCount': like_count,
+            'commentCount': comment_count
         },
-        'total_engagement': int(stats.get('viewCount', 0)) + 
-                          int(stats.get('likeCount', 0)) + 
-                          int(stats.get('commentCount', 0))
+        'duration': duration,
+        'fetched_at': datetime.now(timezone.utc).isoformat(),
+        'status': 'SUCCESS'  # 取得成功
     }
+
+def build_error_data(video_id: str, title: str, error_message: str, channel_id: str = '') -> Dict[str, Any]:
+    """取得に失敗した動画のエラー情報を含む最小限のデータを作成"""
+    return {
+        'video_id': video_id,
+        'title': title,
+        'channel_id': channel_id,
+        'status': 'FETCH_ERROR',  # 取得失敗
+        'error_message': error_message,
+        'fetched_at': datetime.now(timezone.utc).isoformat()
+    }
+
+def resolve_video_batch(video_ids: List[str], snippets: Dict[str, Dict[str, Any]], channel_id: str,
+                        part: str = 'statistics,contentDetails') -> List[Dict[str, Any]]:
+    """最大VIDEO_BATCH_SIZE件の動画IDの詳細情報を1回で取得し、動画データに変換
+
+    snippetsに含まれない動画はvideos.listの結果のsnippetを使用する。
+    分析は実行の最後にanalyze_videosでまとめて行う。
+    """
+    debug(f"Fetching details for {len(video_ids)} videos")
     
-    video_data['analysis'] = analysis
-    return video_data
+    try:
+        # 動画の詳細情報をまとめて取得
+        details = get_video_details(video_ids, part=part)
+        batch_error = None
+    except QuotaBudgetExceeded:
+        # クォータの上限は動画ごとのエラーにせず、実行を中断して続きから再開する
+        raise
+    except Exception as e:
+        print(f"Warning: Failed to fetch video details: {str(e)}")
+        details = {}
+        batch_error = str(e)
+    
+    videos = []
+    for video_id in video_ids:
+        video_stats = details.get(video_id)
+        snippet = snippets.get(video_id) or (video_stats or {}).get('snippet', {})
+        debug(f"Processing video ID: {video_id}")
+        
+        if batch_error is not None:
+            videos.append(build_error_data(video_id, snippet.get('title', ''), batch_error, channel_id))
+            continue
+        
+        if video_stats is None:
+            print(f"Warning: No video details found for {video_id}")
+            videos.append(build_error_data(video_id, snippet.get('title', ''), 'No video details found', channel_id))
+            continue
+        
+        if is_debug_enabled():
+            debug(f"Video stats: {json.dumps(video_stats, ensure_ascii=False)}")
+        
+        try:
+            video_data = build_video_data(video_id, snippet, video_stats, channel_id)
+        except Exception as e:
+            print(f"Warning: Failed to process video {video_id}: {str(e)}")
+            videos.append(build_error_data(video_id, snippet.get('title', ''), str(e), channel_id))
+            continue
+        
+        videos.append(video_data)
+    
+    return videos
 
-def get_channel_videos_for_year(channel_id: str, year: int) -> List[Dict[str, Any]]:
-    """指定した年のチャンネルの動画情報を取得"""
+def resolve_videos(video_ids: List[str], snippets: Dict[str, Dict[str, Any]], channel_id: str,
+                   part: str = 'statistics,contentDetails',
+                   executor: Optional[Executor] = None) -> List[Dict[str, Any]]:
+    """動画IDをVIDEO_BATCH_SIZE件ずつに分けて詳細情報を取得
+
+    executorを指定した場合は各バッチを並列に取得する（結果の順序は維持される）。
+    クォータの上限に達した場合は、それまでに取得できたバッチの動画データをvideosとして
+    QuotaBudgetExceededに付けて送出する。
+    """
+    batches = chunked(video_ids, VIDEO_BATCH_SIZE)
+    if executor is None:
+        results = (resolve_video_batch(batch, snippets, channel_id, part) for batch in batches)
+    else:
+        results = executor.map(lambda batch: resolve_video_batch(batch, snippets, channel_id, part), batches)
+    videos = []
     try:
-        # 東京タイムゾーン
-        tz = pytz.timezone('Asia/Tokyo')
-        # 年の開始と終了時刻を設定
-        start_date = datetime(year, 1, 1, tzinfo=tz)
-        end_date = datetime(year + 1, 1, 1, tzinfo=tz)
+        for batch_videos in results:
+            videos.extend(batch_videos)
+    except QuotaBudgetExceeded as e:
+        e.videos = videos
+        raise
+    return videos
+
+def process_search_items(items: List[Dict[str, Any]], channel_id: str) -> List[Dict[str, Any]]:
+    """検索結果1ページ分の動画について詳細情報をまとめて取得し、動画データに変換"""
+    snippets = {item['id']['videoId']: item['snippet']
+                for item in items if item['id']['kind'] == 'youtube#video'}
+    return resolve_videos(list(snippets), snippets, channel_id)
+
+def get_channel_videos_for_year(channel_id: str, year: int, executor: Optional[Executor] = None,
+                                resume: Optional[Dict[str, Any]] = None,
+                                should_stop: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+    """指定した年のチャンネルの動画情報を取得
+
+    executorを指定した場合は、次の検索ページの取得と並行して各ページの詳細情報を取得する。
+    should_stopがTrueを返した場合は次の検索ページを取得せずにTimeBudgetExceededを送出する
+    （resumeに次のページトークンとそれまでに見つかった動画IDを含める）。
+    クォータの上限に達した場合は同じ形式のresumeを付けてQuotaBudgetExceededを送出する。
+    resumeを指定した場合は、見つかっていた動画の詳細情報を取得し直してから続きのページを取得する。
+    """
+    from googleapiclient.errors import HttpError
+    
+    try:
+        # 年の開始と終了時刻を日本時間で設定
+        start_date = datetime(year, 1, 1, tzinfo=JST)
+        end_date = datetime(year + 1, 1, 1, tzinfo=JST)
         
         # UTC時刻に変換
-        start_date_utc = start_date.astimezone(pytz.UTC)
-        end_date_utc = end_date.astimezone(pytz.UTC)
+        start_date_utc = start_date.astimezone(timezone.utc)
+        end_date_utc = end_date.astimezone(timezone.utc)
         
-        videos = []
+        pending = []
         page_token = None
-        total_videos = 0
+        # この年で見つかった動画ID（中断時の再開用）
+        found_ids = []
+        # 検索ページをすべて取得済みかどうか（詳細情報の取得中に中断した場合の再開用）
+        search_done = False
+        
+        if resume:
+            # 中断前に見つかっていた動画は検索し直さず、詳細情報のみをまとめて取得する
+            page_token = resume['page_token']
+            found_ids = list(resume.get('pending_ids', []))
+            search_done = resume.get('search_done', False)
+            part = 'snippet,statistics,contentDetails'
+            print(f"Resuming {year} with {len(found_ids)} pending videos")
+            if executor is None:
+                pending.append(resolve_videos(found_ids, {}, channel_id, part))
+            else:
+                pending.append(executor.submit(resolve_videos, found_ids, {}, channel_id, part))
         
-        while True:
+        while not search_done:
             # 検索リクエストを実行
             search_params = {
                 'channelId': channel_id,
@@ -119,278 +308,842 @@ def get_channel_videos_for_year(channel_id: str, year: int) -> List[Dict[str, An
             if page_token:
                 search_params['pageToken'] = page_token
                 
-            search_response = youtube.search().list(**search_params).execute()
-
-            for item in search_response.get('items', []):
-                if item['id']['kind'] == 'youtube#video':
-                    video_id = item['id']['videoId']
-                    print(f"Processing video ID: {video_id}")
-                    
-                    try:
-                        # 動画の詳細情報を取得
-                        video_response = youtube.videos().list(
-                            part='statistics,contentDetails',
-                            id=video_id
-                        ).execute()
-
-                        if not video_response['items']:
-                            print(f"Warning: No video details found for {video_id}")
-                            continue
-
-                        video_stats = video_response['items'][0]
-                        print(f"Video stats: {json.dumps(video_stats, ensure_ascii=False)}")
-                        
-                        # 各フィールドの存在チェックとデフォルト値設定
-                        content_details = video_stats.get('contentDetails', {})
-                        statistics = video_stats.get('statistics', {})
-                        
-                        # durationのデフォルト値設定
-                        duration = content_details.get('duration', 'PT0S')
-                        
-                        # 統計情報のデフォルト値設定
-                        view_count = statistics.get('viewCount', '0')
-                        like_count = statistics.get('likeCount', '0')
-                        comment_count = statistics.get('commentCount', '0')
-                        
-                        video_data = {
-                            'video_id': video_id,
-                            'title': item['snippet'].get('title', ''),
-                            'description': item['snippet'].get('description', ''),
-                            'published_at': item['snippet'].get('publishedAt', ''),
-                            'thumbnail_url': item['snippet'].get('thumbnails', {}).get('high', {}).get('url', ''),
-                            'channel_id': channel_id,
-                            'channel_title': item['snippet'].get('channelTitle', ''),
-                            'statistics': {
-                                'viewCount': view_count,
-                                'likeCount': like_count,
-                                'commentCount': comment_count
-                            },
-                            'duration': duration,
-                            'fetched_at': datetime.now(pytz.UTC).isoformat(),
-                            'status': 'SUCCESS'  # 取得成功
-                        }
-                        
-                        # 分析データを追加
-                        try:
-                            video_data = analyze_video_data(video_data)
-                            videos.append(video_data)
-                            total_videos += 1
-                            print(f"Processed video {total_videos}: {video_data['title']}")
-                        except Exception as e:
-                            print(f"Warning: Analysis failed for video {video_id}: {str(e)}")
-                            video_data['status'] = 'ANALYSIS_ERROR'  # 分析失敗
-                            videos.append(video_data)
-                            total_videos += 1
-                            
-                    except Exception as e:
-                        print(f"Warning: Failed to process video {video_id}: {str(e)}")
-                        # エラー情報を含む最小限のデータを保存
-                        error_data = {
-                            'video_id': video_id,
-                            'title': item['snippet'].get('title', ''),
-                            'status': 'FETCH_ERROR',  # 取得失敗
-                            'error_message': str(e),
-                            'fetched_at': datetime.now(pytz.UTC).isoformat()
-                        }
-                        videos.append(error_data)
-                        total_videos += 1
+            search_response = call('search.list', **search_params)
 
-            # 次のページがあれば続行
+            # ページ内の動画IDをまとめて詳細情報を取得
+            items = search_response.get('items', [])
+            found_ids.extend(item['id']['videoId'] for item in items if item['id']['kind'] == 'youtube#video')
+            # 次のページ（詳細情報の取得中に中断した場合はこのページまでの動画を再開時に取得し直す）
             page_token = search_response.get('nextPageToken')
+            search_done = not page_token
+            if executor is None:
+                pending.append(process_search_items(items, channel_id))
+            else:
+                pending.append(executor.submit(process_search_items, items, channel_id))
+
+            # 次のページがあれば続行
             if not page_token:
                 break
+            if should_stop and should_stop():
+                raise TimeBudgetExceeded({'year': year, 'page_token': page_token, 'pending_ids': found_ids})
+
+        videos = []
+        for page_videos in pending:
+            videos.extend(page_videos if executor is None else page_videos.result())
 
-        print(f"Total videos fetched for {year}: {total_videos}")
+        print(f"Total videos fetched for {year}: {len(videos)}")
         return videos
 
     except HttpError as e:
         print(f'An HTTP error {e.resp.status} occurred: {e.content}')
         return []
+    except QuotaBudgetExceeded as e:
+        print(f'Quota budget exceeded while fetching {year}: {str(e)}')
+        e.resume = {'year': year, 'page_token': page_token, 'pending_ids': found_ids, 'search_done': search_done}
+        raise
 
-def convert_to_csv_row(video_data: Dict[str, Any]) -> Dict[str, Any]:
-    """動画データをCSV行用のフラット形式に変換"""
-    # 現在の日本時間を取得
-    jst = pytz.timezone('Asia/Tokyo')
-    current_time_jst = datetime.now(jst).strftime('%Y-%m-%d %H:%M:%S')
-    
-    # 基本情報
-    row = {
-        'video_id': video_data.get('video_id', ''),
-        'title': video_data.get('title', ''),
-        'status': video_data.get('status', 'UNKNOWN'),
-        'recorded_at': current_time_jst
-    }
-    
-    # エラーが発生した場合は、エラーメッセージを追加
-    if video_data.get('status') == 'FETCH_ERROR':
-        row['error_message'] = video_data.get('error_message', '')
-        return row
-    
-    # 正常に取得できた場合の追加情報
-    stats = video_data.get('statistics', {})
-    analysis = video_data.get('analysis', {})
-    
-    # 分析情報が存在する場合のみ追加
-    if analysis:
-        published_info = analysis.get('published_info', {})
-        row.update({
-            'published_at': video_data.get('published_at', ''),
-            'year': published_info.get('year', ''),
-            'month': published_info.get('month', ''),
-            'day': published_info.get('day', ''),
-            'hour': published_info.get('hour', ''),
-            'weekday': published_info.get('weekday', ''),
-            'time_of_day': published_info.get('time_of_day', ''),
-            'duration_seconds': analysis.get('duration_seconds', 0),
-            'view_count': stats.get('viewCount', '0'),
-            'like_count': stats.get('likeCount', '0'),
-            'comment_count': stats.get('commentCount', '0'),
-            'daily_avg_views': round(analysis.get('daily_average', {}).get('views', 0), 2),
-            'daily_avg_likes': round(analysis.get('daily_average', {}).get('likes', 0), 2),
-            'daily_avg_comments': round(analysis.get('daily_average', {}).get('comments', 0), 2),
-            'total_engagement': analysis.get('total_engagement', 0),
-            'is_live': analysis.get('title_analysis', {}).get('ライブ', False),
-            'is_mv': analysis.get('title_analysis', {}).get('MV', False),
-            'is_digest': analysis.get('title_analysis', {}).get('ダイジェスト', False),
-            'is_event': analysis.get('title_analysis', {}).get('イベント', False),
-            'has_member_name': analysis.get('title_analysis', {}).get('メンバー', False)
-        })
-    
-    return row
+def fetch_years(channel_id: str, years: List[int], max_workers: int = 1,
+                resume: Optional[Dict[str, Any]] = None,
+                should_stop: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """複数年の動画情報を取得し、年の順に(年, 動画データ)を返す
 
-def save_to_csv(videos: List[Dict[str, Any]], s3_client: boto3.client, bucket: str, csv_key: str) -> None:
-    """動画データをCSVとしてS3に保存"""
-    if not videos:
-        print("No videos provided to save_to_csv")
+    max_workersが2以上の場合は各年と各ページの詳細取得を並列に実行するため、
+    全体の処理時間は最も時間のかかる年に依存する。
+    resumeは最初の年の再開情報。should_stopがTrueを返した場合は中断した年の位置で
+    TimeBudgetExceededを送出する（並列取得では後続の年も再開時に取得し直す）。
+    """
+    if max_workers <= 1:
+        for index, year in enumerate(years):
+            year_resume = resume if index == 0 else None
+            if not year_resume and should_stop and should_stop():
+                raise TimeBudgetExceeded({'year': year, 'page_token': None, 'pending_ids': []})
+            print(f"\nFetching videos for year {year}")
+            yield year, get_channel_videos_for_year(channel_id, year, resume=year_resume, should_stop=should_stop)
         return
-        
-    print(f"Preparing to save {len(videos)} videos to CSV")
     
-    # CSVヘッダーの準備
-    csv_row = convert_to_csv_row(videos[0])
-    fieldnames = list(csv_row.keys())
+    print(f"Fetching {len(years)} years with {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max_workers) as year_pool, \
+            ThreadPoolExecutor(max_workers=max_workers) as detail_pool:
+        futures = [year_pool.submit(get_channel_videos_for_year, channel_id, year, detail_pool,
+                                    resume if index == 0 else None, should_stop)
+                   for index, year in enumerate(years)]
+        for year, future in zip(years, futures):
+            yield year, future.result()
+
+def get_uploads_playlist_id(channel_id: str) -> str:
+    """チャンネルのアップロード動画再生リストIDを取得"""
+    response = call('channels.list', part='contentDetails', id=channel_id)
+    items = response.get('items', [])
+    if not items:
+        raise ValueError(f'Channel not found: {channel_id}')
+    return items[0]['contentDetails']['relatedPlaylists']['uploads']
+
+def get_new_uploads(playlist_id: str, watermark: Optional[str] = None,
+                    resume: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """アップロード再生リストを新しい順にたどり、watermarkより新しい動画を取得
+
+    戻り値は動画IDをキー、公開日時（RFC3339）を値とする辞書。
+    watermark以前の動画を含むページに到達した時点で打ち切る。
+    クォータの上限に達した場合は、次のページトークンとそれまでに見つかった動画をresumeとして
+    QuotaBudgetExceededに付けて送出する（resumeを指定すると続きのページから再開する）。
+    """
+    new_videos = dict(resume['videos']) if resume else {}
+    page_token = resume['page_token'] if resume else None
     
-    # メモリ上でCSVを作成
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    while True:
+        playlist_params = {
+            'playlistId': playlist_id,
+            'part': 'contentDetails',
+            'maxResults': 50
+        }
+        if page_token:
+            playlist_params['pageToken'] = page_token
+        
+        try:
+            playlist_response = call('playlistItems.list', **playlist_params)
+        except QuotaBudgetExceeded as e:
+            e.resume = {'playlist_id': playlist_id, 'page_token': page_token, 'videos': new_videos}
+            raise
+        
+        reached_watermark = False
+        for item in playlist_response.get('items', []):
+            content_details = item.get('contentDetails', {})
+            published_at = content_details.get('videoPublishedAt')
+            # 非公開・削除済みの動画は公開日時を持たない
+            if not published_at:
+                continue
+            if watermark and parse_datetime(published_at) <= parse_datetime(watermark):
+                reached_watermark = True
+                continue
+            new_videos[content_details['videoId']] = published_at
+        
+        page_token = playlist_response.get('nextPageToken')
+        if reached_watermark or not page_token:
+            break
     
+    return new_videos
+
+def get_crawl_state_key(channel_id: str) -> str:
+    """差分取得の状態を保存するS3キーを生成"""
+    return f'{STATE_PREFIX}/uploads_{channel_id}.json'
+
+def load_crawl_state(s3_client: boto3.client, bucket: str, channel_id: str) -> Dict[str, Any]:
+    """前回までの取得状態（ウォーターマークと既知の動画一覧）をS3から読み込む"""
     try:
-        print("Checking for existing CSV file...")
-        existing_content = s3_client.get_object(Bucket=bucket, Key=csv_key)['Body'].read().decode('utf-8')
-        print("Found existing CSV file, appending data...")
-        # 既存のデータを保持
-        output.write(existing_content.rstrip())
-        if not existing_content.endswith('\n'):
-            output.write('\n')
+        body = s3_client.get_object(Bucket=bucket, Key=get_crawl_state_key(channel_id))['Body'].read()
+        return json.loads(body.decode('utf-8'))
     except s3_client.exceptions.NoSuchKey:
-        print("No existing CSV file found, creating new one...")
-        # ファイルが存在しない場合はヘッダーを書き込む
-        writer.writeheader()
+        print("No crawl state found, starting full crawl...")
+        return {'channel_id': channel_id, 'watermark': None, 'videos': {}}
+
+def save_crawl_state(state: Dict[str, Any], s3_client: boto3.client, bucket: str) -> None:
+    """取得状態をS3に保存"""
+    state['updated_at'] = datetime.now(timezone.utc).isoformat()
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=get_crawl_state_key(state['channel_id']),
+        Body=json.dumps(state, ensure_ascii=False),
+        ContentType='application/json'
+    )
+
+def discover_uploads(channel_id: str, state: Dict[str, Any],
+                     resume: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """アップロード再生リストから新着動画を検出し、既知の全動画を含む新しい取得状態を返す
+
+    resumeはクォータの上限で中断した検出の再開位置（get_new_uploadsのresume）。
+    """
+    playlist_id = (resume or {}).get('playlist_id') or state.get('uploads_playlist_id') \
+        or get_uploads_playlist_id(channel_id)
+    watermark = state.get('watermark')
+    print(f"Crawling uploads playlist {playlist_id} (watermark: {watermark})"
+          + (f", resuming with {len(resume['videos'])} found" if resume else ''))
+    
+    new_videos = get_new_uploads(playlist_id, watermark, resume)
+    print(f"Found {len(new_videos)} new uploads")
     
-    # 新しいデータを追記
-    print("Writing video data to CSV...")
+    known_videos = dict(state.get('videos', {}))
+    known_videos.update(new_videos)
+    
+    return {
+        'channel_id': channel_id,
+        'uploads_playlist_id': playlist_id,
+        'watermark': max(known_videos.values(), key=parse_datetime) if known_videos else watermark,
+        'videos': known_videos,
+        'refreshed_at': dict(state.get('refreshed_at', {}))
+    }
+
+def refresh_uploads(channel_id: str, video_ids: List[str], published: Dict[str, str],
+                    executor: Optional[Executor] = None) -> List[Dict[str, Any]]:
+    """指定した動画の統計情報を新しい順にまとめて取得"""
+    video_ids = sorted(video_ids, key=lambda video_id: published[video_id], reverse=True)
+    return resolve_videos(video_ids, {}, channel_id, part='snippet,statistics,contentDetails', executor=executor)
+
+def get_channel_videos_from_uploads(channel_id: str, state: Dict[str, Any],
+                                    executor: Optional[Executor] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """アップロード再生リストから新着動画を検出し、既知の全動画の統計情報を更新
+
+    search.list（1ページ100ユニット）の代わりにplaylistItems.list（1ページ1ユニット）と
+    videos.list（50件ごとに1ユニット）のみを使用する。
+    """
+    new_state = discover_uploads(channel_id, state)
+    videos = refresh_uploads(channel_id, list(new_state['videos']), new_state['videos'], executor)
+    return videos, new_state
+
+def get_refresh_quota_budget(run: Dict[str, Any]) -> Optional[int]:
+    """scheduledモードで統計情報の更新に使用するクォータ（Noneは無制限）"""
+    budget = run.get('refresh_quota_budget')
+    if budget in (None, ''):
+        budget = REFRESH_QUOTA_BUDGET
+    if budget not in (None, ''):
+        return int(budget)
+    if rate_limiter.quota_budget is None:
+        return None
+    return rate_limiter.quota_budget - rate_limiter.quota_used
+
+def record_snapshots(store: SnapshotStore, batch: VideoAnalysisBatch) -> Dict[str, int]:
+    """分析済みの動画の統計情報をスナップショットとして記録し、増加速度（velocity）を分析データに追加"""
+    columns = batch.columns
+    counters = {
+        video['video_id']: {'views': views, 'likes': likes, 'comments': comments}
+        for video, views, likes, comments in zip(batch.videos, columns['view_count'],
+                                                 columns['like_count'], columns['comment_count'])
+        if views is not None
+    }
+    result = store.record(batch.reference_time, counters)
+    velocities = store.velocities(counters, VELOCITY_WINDOWS)
+    for video in batch.videos:
+        if video['video_id'] in velocities:
+            video['analysis']['velocity'] = velocities[video['video_id']]
+    return result
+
+def get_published_year(published_at: str) -> int:
+    """公開日時（RFC3339）から日本時間での公開年を取得"""
+    return parse_datetime(published_at).astimezone(JST).year
+
+def group_videos_by_year(videos: List[Dict[str, Any]], published: Dict[str, str]) -> Dict[int, List[Dict[str, Any]]]:
+    """動画データを日本時間での公開年ごとに分類"""
+    videos_by_year = {}
     for video in videos:
-        writer.writerow(convert_to_csv_row(video))
+        published_at = video.get('published_at') or published[video['video_id']]
+        videos_by_year.setdefault(get_published_year(published_at), []).append(video)
+    return videos_by_year
+
+def parse_output_formats(value: Any) -> List[str]:
+    """出力形式の指定（カンマ区切りの文字列またはリスト）を検証して返す"""
+    formats = value.split(',') if isinstance(value, str) else list(value)
+    formats = [output_format.strip().lower() for output_format in formats if output_format.strip()]
+    unknown = [output_format for output_format in formats if output_format not in OUTPUT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown output formats: {', '.join(unknown)} (choose from {', '.join(OUTPUT_FORMATS)})")
+    if 'parquet' in formats:
+        # データ取得の前に確認し、クォータを消費してから失敗しないようにする
+        require_pyarrow()
+    if 'jsonl' in formats:
+        require_compression(JSONL_COMPRESSION)
+    return formats
+
+def generate_run_id(current_time: datetime) -> str:
+    """実行ごとに一意な実行IDを生成"""
+    return f"{current_time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+def get_csv_parts_prefix(date_folder: str) -> str:
+    """日付フォルダ配下のCSVパートファイルのプレフィックスを生成"""
+    return f'{date_folder}/{CSV_PARTS_DIR}/'
+
+def save_to_csv(batch: VideoAnalysisBatch, s3_client: boto3.client, bucket: str, date_folder: str, run_id: str) -> Optional[str]:
+    """分析済みの動画データを実行ごとのCSVパートファイルとしてS3に保存
+
+    既存のファイルは読み込まず、実行IDごとに新しいオブジェクトを作成するため、
+    同時に実行された場合もお互いの行を上書きしない。
+    全行のrecorded_atはバッチの基準時刻になる。保存したパートファイルのキーを返す。
+    """
+    import csv
     
-    # S3にアップロード
-    print("Uploading CSV to S3...")
-    s3_client.put_object(
-        Bucket=bucket,
-        Key=csv_key,
-        Body=output.getvalue().encode('utf-8'),
-        ContentType='text/csv'
+    if not len(batch):
+        print("No videos provided to save_to_csv")
+        return None
+        
+    part_key = f'{get_csv_parts_prefix(date_folder)}part-{run_id}.csv'
+    print(f"Saving {len(batch)} videos to CSV part {part_key}")
+    
+    with metrics.stage('serialize'), \
+            S3MultipartWriter(s3_client, bucket, part_key, content_type='text/csv') as output:
+        # ヘッダーは固定の列定義から作成（先頭の動画がエラー行でも列がずれない）
+        writer = csv.DictWriter(output, fieldnames=CSV_FIELDNAMES, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(batch.iter_csv_rows())
+    
+    debug("CSV upload completed")
+    return part_key
+
+def compact_csv_parts(s3_client: boto3.client, bucket: str, date_folder: str) -> Optional[str]:
+    """日付フォルダ配下のCSVパートファイルを1つのvideo_stats.csvに結合
+
+    各パートをチャンク単位で読み込みながらマルチパートアップロードで書き出すため、
+    ファイル全体をメモリに保持しない。ヘッダーは先頭に1回だけ出力する。
+    """
+    part_keys = [key for key in list_object_keys(s3_client, bucket, get_csv_parts_prefix(date_folder))
+                 if key.endswith('.csv')]
+    if not part_keys:
+        print(f"No CSV parts found in {date_folder}")
+        return None
+    
+    csv_key = f'{date_folder}/video_stats.csv'
+    print(f"Compacting {len(part_keys)} CSV parts into {csv_key}")
+    
+    with S3MultipartWriter(s3_client, bucket, csv_key, content_type='text/csv') as output:
+        for index, part_key in enumerate(part_keys):
+            header_pending = True
+            header_buffer = b''
+            for chunk in iter_object_chunks(s3_client, bucket, part_key):
+                if header_pending:
+                    # ヘッダー行を読み飛ばす（先頭のパートのみ出力）
+                    header_buffer += chunk
+                    newline = header_buffer.find(b'\n')
+                    if newline < 0:
+                        continue
+                    header_pending = False
+                    chunk = header_buffer if index == 0 else header_buffer[newline + 1:]
+                    header_buffer = b''
+                output.write(chunk)
+    
+    print("CSV compaction completed")
+    return csv_key
+
+def get_year_json_key(date_folder: str, year: int, channel_id: str = CHANNEL_ID, suffix: str = '') -> str:
+    """年ごとのJSONのキーを生成（CHANNEL_ID以外のチャンネルはファイル名にチャンネルIDを含める）"""
+    channel_suffix = '' if channel_id == CHANNEL_ID else f'_{channel_id}'
+    return f'{date_folder}/video_stats_{year}{channel_suffix}{suffix}.json'
+
+def save_year_json(batch: VideoAnalysisBatch, year: int, date_folder: str, suffix: str = '',
+                   channel_id: str = CHANNEL_ID) -> None:
+    """1年分の分析済み動画データをメタデータ付きのJSONとしてS3に保存
+
+    suffixを指定した場合はファイル名の末尾に追加する（一部の動画のみを更新する実行で使用）。
+    """
+    videos = batch.videos
+    # 取得時刻はバッチの基準時刻（UTC）
+    fetched_at = batch.reference_time.astimezone(timezone.utc)
+    
+    # 基本的な統計情報を分析結果の列から計算
+    total_views = batch.total('view_count')
+    total_likes = batch.total('like_count')
+    total_comments = batch.total('comment_count')
+    
+    # メタデータを追加
+    metadata = {
+        'year': year,
+        'channel_id': channel_id,
+        'total_videos': len(videos),
+        'total_views': total_views,
+        'total_likes': total_likes,
+        'total_comments': total_comments,
+        'average_views': total_views / len(videos) if videos else 0,
+        'average_likes': total_likes / len(videos) if videos else 0,
+        'average_comments': total_comments / len(videos) if videos else 0,
+        'fetched_at': fetched_at.isoformat()
+    }
+    
+    # JSONファイルとして保存（日付フォルダ配下に配置）
+    json_key = get_year_json_key(date_folder, year, channel_id, suffix)
+    with metrics.stage('serialize'):
+        body = json.dumps({
+            'metadata': metadata,
+            'videos': videos
+        }, ensure_ascii=False, indent=2)
+    get_s3_client().put_object(
+        Bucket=BUCKET_NAME,
+        Key=json_key,
+        Body=body,
+        ContentType='application/json'
     )
-    output.close()
-    print("CSV upload completed")
+    
+    print(f"Saved JSON data for {year} to S3: {json_key}")
+
+def save_year_outputs(batch: VideoAnalysisBatch, year: int, date_folder: str, output_formats: List[str],
+                      suffix: str = '', channel_id: str = CHANNEL_ID) -> None:
+    """1年分の分析済み動画データを選択された年ごとの形式（json・jsonl）で保存"""
+    if 'json' in output_formats:
+        save_year_json(batch, year, date_folder, suffix, channel_id)
+    if 'jsonl' in output_formats:
+        save_year_jsonl(batch, year, channel_id, get_s3_client(), BUCKET_NAME,
+                        get_year_json_key(date_folder, year, channel_id, suffix))
+
+def get_snapshot_store_location(channel_id: str) -> Tuple[str, str]:
+    """チャンネルのスナップショットのデータベースのS3キーとローカルの保存先"""
+    if channel_id == CHANNEL_ID:
+        return SNAPSHOT_STORE_KEY, SNAPSHOT_DB_PATH
+    root, ext = os.path.splitext(SNAPSHOT_DB_PATH)
+    return f'{STATE_PREFIX}/video_snapshots_{channel_id}.sqlite', f'{root}_{channel_id}{ext}'
+
+def parse_channel_ids(value: Any) -> List[str]:
+    """チャンネルIDの指定（カンマ区切りの文字列またはリスト）を重複を除いて返す"""
+    channel_ids = value.split(',') if isinstance(value, str) else list(value)
+    return list(dict.fromkeys(channel_id.strip() for channel_id in channel_ids if channel_id.strip()))
+
+def build_run_config(event: Dict[str, Any], current_time: datetime) -> Dict[str, Any]:
+    """イベントから実行全体の設定を作成
+
+    各作業単位にそのまま引き継ぐため、JSONに変換できる値のみを含める。
+    全作業単位で同じ実行IDと基準時刻を使用する。
+    """
+    return {
+        'run_id': event.get('run_id') or generate_run_id(current_time),
+        'reference_time': current_time.isoformat(),
+        # 実行日付のフォルダ名（yyyy=YYYY/mm=MM/dd=DD形式）
+        'date_folder': f"yyyy={current_time.year}/mm={current_time.month:02d}/dd={current_time.day:02d}",
+        # 取得方式（search: 年ごとのsearch.list、uploads: アップロード再生リストの差分取得、
+        # scheduled: uploadsのうち更新頻度の階層に応じて更新時期を迎えた動画のみを更新）
+        'mode': event.get('mode', 'search'),
+        # 取得対象の年（開始年のデフォルトは現在の年）
+        'start_year': int(event.get('start_year', current_time.year)),
+        'end_year': current_time.year,
+        # 並列実行のワーカー数
+        'max_workers': int(event.get('max_workers', MAX_WORKERS)),
+        # 出力形式
+        'output_formats': parse_output_formats(event.get('output_formats', DEFAULT_OUTPUT_FORMATS)),
+        'snapshots': bool(event.get('snapshots', ENABLE_SNAPSHOTS)),
+        'refresh_quota_budget': event.get('refresh_quota_budget'),
+        # 実行全体（継続実行を含む）で使用するクォータの上限（省略時はYOUTUBE_QUOTA_BUDGETの1日の残り）
+        'quota_budget': int(event['quota_budget']) if event.get('quota_budget') not in (None, '') else None
+    }
+
+def build_work_units(run: Dict[str, Any], channel_ids: List[str], shard: bool = False) -> List[Dict[str, Any]]:
+    """チャンネル（searchモードでshardを指定した場合はチャンネル×年）ごとの作業単位を作成"""
+    if run['mode'] != 'search':
+        return [{'unit_id': channel_id, 'channel_id': channel_id} for channel_id in channel_ids]
+    years = list(range(run['start_year'], run['end_year'] + 1))
+    if not shard:
+        return [{'unit_id': channel_id, 'channel_id': channel_id, 'years': years} for channel_id in channel_ids]
+    return [{'unit_id': f'{channel_id}-{year}', 'channel_id': channel_id, 'years': [year]}
+            for channel_id in channel_ids for year in years]
+
+def process_work_unit(run: Dict[str, Any], unit: Dict[str, Any],
+                      budget: Optional[TimeBudget] = None) -> Dict[str, Any]:
+    """1つの作業単位（チャンネル、またはチャンネル×年）の動画を取得して保存
+
+    CSV・Parquetは作業単位ごとのパートファイルとして実行共通のパーティション配下に保存する。
+    budgetの残り時間が少なくなった場合やクォータの上限に達した場合は、完了した年（uploadsモードでは
+    更新済みの動画）の出力を保存して中断し、処理結果のcontinuationに再開用の作業単位を含める
+    （クォータの場合はquota_exceededも含める）。
+    処理結果の概要を返す。
+    """
+    channel_id = unit['channel_id']
+    mode = run['mode']
+    current_time = datetime.fromisoformat(run['reference_time'])
+    date_folder = run['date_folder']
+    output_formats = run['output_formats']
+    max_workers = run['max_workers']
+    should_stop = budget.expired if budget else None
+    resume = unit.get('resume')
+    # 継続実行ではパートファイル名に継続回数を付けて前回の出力を上書きしない
+    continuation_index = run.get('continuation', 0)
+    part_id = f"{run['run_id']}-{unit['unit_id']}" + (f'-c{continuation_index}' if continuation_index else '')
+    continuation = None
+    # クォータの上限に達して中断したかどうか（continuationは自動で継続しない）
+    quota_exceeded = False
+    
+    # 統計情報のスナップショット（有効な場合はS3から前回までのデータベースを取得）
+    snapshot_store = None
+    snapshot_counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+    if run['snapshots']:
+        snapshot_key, snapshot_path = get_snapshot_store_location(channel_id)
+        snapshot_store = download_snapshot_store(get_s3_client(), BUCKET_NAME, snapshot_key, snapshot_path)
+    
+    all_videos = []
+    # 年ごとの分析結果（全行で基準時刻current_timeを共有する）
+    batches = []
+    
+    refresh_report = None
+    
+    if mode in ('uploads', 'scheduled'):
+        print(f"Fetching videos from uploads playlist of {channel_id}")
+        state = load_crawl_state(get_s3_client(), BUCKET_NAME, channel_id)
+        
+        if resume and 'pending_ids' in resume:
+            # 中断前に選んだ動画のうち未処理のものを更新する
+            state.setdefault('refreshed_at', {})
+            refresh_ids = resume['pending_ids']
+            print(f"Resuming refresh of {len(refresh_ids)} pending videos")
+        else:
+            try:
+                with metrics.stage('fetch'):
+                    state = discover_uploads(channel_id, state, resume.get('discovery') if resume else None)
+            except QuotaBudgetExceeded as e:
+                # 検出済みの動画と次のページから検出を再開する（再生リストIDの取得前ならはじめから）
+                print(f"Quota budget exceeded while discovering uploads: {str(e)}")
+                quota_exceeded = True
+                discovery = getattr(e, 'resume', None)
+                continuation = {**unit, 'resume': {'discovery': discovery}} if discovery else \
+                    {key: value for key, value in unit.items() if key != 'resume'}
+            if quota_exceeded:
+                refresh_ids = []
+            elif mode == 'scheduled':
+                # 公開からの日数と増加速度に応じて更新時期を迎えた動画のみを選ぶ
+                velocities = snapshot_store.velocities(state['videos'], VELOCITY_WINDOWS) if snapshot_store else None
+                refresh_ids, refresh_report = plan_refresh(state['videos'], state['refreshed_at'], current_time,
+                                                           velocities, get_refresh_quota_budget(run))
+                print(f"Refreshing {len(refresh_ids)} of {len(state['videos'])} videos "
+                      f"(skipped over budget: {refresh_report['skipped']})")
+            else:
+                refresh_ids = list(state['videos'])
+        
+        # REFRESH_CHUNK_SIZE件ごとに残り時間を確認しながら更新
+        with metrics.stage('fetch'), \
+                (ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else nullcontext()) as detail_pool:
+            for start in range(0, len(refresh_ids), REFRESH_CHUNK_SIZE):
+                if start and should_stop and should_stop():
+                    continuation = {**unit, 'resume': {'pending_ids': refresh_ids[start:]}}
+                    print(f"Time budget exceeded, {len(refresh_ids) - start} videos left")
+                    break
+                try:
+                    all_videos.extend(refresh_uploads(channel_id, refresh_ids[start:start + REFRESH_CHUNK_SIZE],
+                                                      state['videos'], detail_pool))
+                except QuotaBudgetExceeded as e:
+                    # 取得できたバッチの動画は保存し、残りを再開時に更新する
+                    quota_exceeded = True
+                    all_videos.extend(getattr(e, 'videos', []))
+                    resolved = {video['video_id'] for video in getattr(e, 'videos', [])}
+                    pending_ids = [video_id for video_id in refresh_ids[start:] if video_id not in resolved]
+                    continuation = {**unit, 'resume': {'pending_ids': pending_ids}}
+                    print(f"Quota budget exceeded, {len(pending_ids)} videos left: {str(e)}")
+                    break
+        
+        # 統計情報を取得できた動画の更新日時を記録
+        refreshed_at = format_rfc3339(current_time)
+        for video in all_videos:
+            if video.get('status') == 'SUCCESS':
+                state['refreshed_at'][video['video_id']] = refreshed_at
+        
+        # 一部の動画のみを更新した出力は実行IDを付けたファイル名で保存する
+        partial = mode == 'scheduled' or resume is not None or continuation is not None
+        json_suffix = f"_{run['run_id']}" + (f'_c{continuation_index}' if continuation_index else '') if partial else ''
+        videos_by_year = group_videos_by_year(all_videos, state['videos'])
+        years_processed = sorted(videos_by_year)
+        for year in years_processed:
+            with metrics.stage('analyze'):
+                batch = analyze_videos(videos_by_year[year], current_time, TITLE_ENGINE)
+            batches.append(batch)
+            if snapshot_store:
+                for key, count in record_snapshots(snapshot_store, batch).items():
+                    snapshot_counts[key] += count
+            save_year_outputs(batch, year, date_folder, output_formats, json_suffix, channel_id)
+    else:
+        years = unit['years']
+        years_processed = []
+        print(f"Fetching videos of {channel_id} from {years[0]} to {years[-1]}")
+        
+        # 完了した年から順に分析して保存する（中断した場合は中断した年から再開する）
+        try:
+            for year, videos in metrics.iterate('fetch', fetch_years(channel_id, years, max_workers, resume, should_stop)):
+                years_processed.append(year)
+                all_videos.extend(videos)
+                print(f"Added {len(videos)} videos for year {year}")
+                
+                if videos:
+                    with metrics.stage('analyze'):
+                        batch = analyze_videos(videos, current_time, TITLE_ENGINE)
+                    batches.append(batch)
+                    if snapshot_store:
+                        for key, count in record_snapshots(snapshot_store, batch).items():
+                            snapshot_counts[key] += count
+                    save_year_outputs(batch, year, date_folder, output_formats, channel_id=channel_id)
+        except TimeBudgetExceeded as e:
+            print(f"Time budget exceeded while fetching {e.resume['year']}, saving continuation")
+            continuation = {**unit, 'years': years[len(years_processed):], 'resume': e.resume}
+        except QuotaBudgetExceeded as e:
+            resume = getattr(e, 'resume', None)
+            print(f"Quota budget exceeded while fetching {years[len(years_processed)]}, saving continuation")
+            quota_exceeded = True
+            continuation = {**unit, 'years': years[len(years_processed):], 'resume': resume}
+    
+    print(f"\nTotal videos collected for {unit['unit_id']}: {len(all_videos)}")
+    metrics.increment('Videos', len(all_videos))
+    
+    # 完了した分のデータをCSVパートファイル・Parquetファイルとして保存（日付フォルダ配下に配置）
+    output_keys = {}
+    if all_videos:
+        unit_batch = VideoAnalysisBatch.concat(batches, current_time)
+        if 'csv' in output_formats:
+            output_keys['csv'] = save_to_csv(unit_batch, get_s3_client(), BUCKET_NAME, date_folder, part_id)
+        if 'parquet' in output_formats:
+            output_keys['parquet'] = save_to_parquet(unit_batch, get_s3_client(), BUCKET_NAME, date_folder,
+                                                     part_id, channel_id)
+    else:
+        print("No videos to save")
+    
+    summary = {
+        'unit_id': unit['unit_id'],
+        'channel_id': channel_id,
+        'years_processed': years_processed,
+        'total_videos': len(all_videos),
+        'output_keys': output_keys
+    }
+    
+    if snapshot_store:
+        upload_snapshot_store(snapshot_store, get_s3_client(), BUCKET_NAME, get_snapshot_store_location(channel_id)[0])
+        print(f"Recorded snapshots: {snapshot_counts}")
+        summary['snapshots'] = snapshot_counts
+    
+    # 出力の保存後にウォーターマークを更新
+    if mode in ('uploads', 'scheduled'):
+        save_crawl_state(state, get_s3_client(), BUCKET_NAME)
+        print(f"Saved crawl state (watermark: {state['watermark']})")
+    
+    if refresh_report:
+        summary['refresh'] = refresh_report
+    if continuation:
+        summary['continuation'] = continuation
+    if quota_exceeded:
+        summary['quota_exceeded'] = True
+    return summary
+
+def get_quota_remaining(quota_date: str) -> Optional[int]:
+    """YOUTUBE_QUOTA_BUDGETから同じ日（太平洋時間）の全呼び出しの使用量を引いた残り（Noneは無制限）"""
+    if QUOTA_BUDGET is None:
+        return None
+    return max(0, QUOTA_BUDGET - get_daily_quota_used(get_s3_client(), BUCKET_NAME, quota_date))
+
+def start_quota(run: Dict[str, Any], quota_date: str) -> Optional[int]:
+    """この呼び出しで使用できるクォータを設定して返す（Noneは無制限）
+
+    1日の残りと、実行に割り当てられたクォータ（quota_budget）から継続実行で使用済みの分（quota_spent）を
+    引いた残りの小さい方を上限にする。
+    """
+    budget = get_quota_remaining(quota_date)
+    if run.get('quota_budget') is not None:
+        allotted = max(0, run['quota_budget'] - run.get('quota_spent', 0))
+        budget = allotted if budget is None else min(budget, allotted)
+    rate_limiter.reset_quota(budget)
+    return budget
+
+def get_continuation_key(run_id: str, unit_id: Optional[str] = None) -> str:
+    """継続実行の情報を保存するS3キーを生成（作業単位ごとに呼び出した実行は作業単位ごとのキー）"""
+    if unit_id:
+        return f'{STATE_PREFIX}/continuations/{run_id}/{unit_id}.json'
+    return f'{STATE_PREFIX}/continuations/{run_id}.json'
+
+def process_work_units(run: Dict[str, Any], units: List[Dict[str, Any]],
+                       budget: TimeBudget) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """作業単位を順に処理し、時間内に終わらなかった場合は継続実行のイベントも返す
+
+    継続実行のイベントはS3（state/continuations/{実行ID}.json）にも保存し、
+    すべての作業単位が完了した時点で削除する。
+    """
+    summaries = []
+    remaining = list(units)
+    while remaining:
+        if summaries and budget.expired():
+            break
+        summary = process_work_unit(run, remaining[0], budget)
+        summaries.append(summary)
+        remaining = remaining[1:]
+        if 'continuation' in summary:
+            remaining.insert(0, summary['continuation'])
+            break
+    
+    continuation_key = get_continuation_key(run['run_id'], run.get('unit_id'))
+    if not remaining:
+        if run.get('continuation'):
+            get_s3_client().delete_object(Bucket=BUCKET_NAME, Key=continuation_key)
+        return summaries, None
+    
+    continuation_event = {
+        'action': 'continue',
+        # 継続実行はこの呼び出しまでのクォータ使用量を引き継ぐ（実行に割り当てられたクォータの残りの計算に使用）
+        'run': {**run, 'continuation': run.get('continuation', 0) + 1,
+                'quota_spent': run.get('quota_spent', 0) + rate_limiter.quota_used},
+        'units': remaining
+    }
+    get_s3_client().put_object(
+        Bucket=BUCKET_NAME,
+        Key=continuation_key,
+        Body=json.dumps(continuation_event, ensure_ascii=False),
+        ContentType='application/json'
+    )
+    print(f"Saved continuation with {len(remaining)} remaining units to {continuation_key}")
+    return summaries, continuation_event
+
+def enqueue_continuation(continuation_event: Dict[str, Any], context: Any) -> None:
+    """継続実行のイベントで同じLambda関数を非同期に呼び出す"""
+    import boto3
+    lambda_client = boto3.client('lambda', region_name='ap-northeast-1')
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps(continuation_event).encode('utf-8')
+    )
+    print(f"Enqueued continuation {continuation_event['run']['continuation']} of run {continuation_event['run']['run_id']}")
+
+def merge_unit_summaries(run: Dict[str, Any], summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """作業単位ごとの処理結果を実行全体の結果にまとめる"""
+    output_keys = {}
+    snapshot_counts = {}
+    for summary in summaries:
+        for output_format, key in summary['output_keys'].items():
+            output_keys.setdefault(output_format, []).append(key)
+        for key, count in summary.get('snapshots', {}).items():
+            snapshot_counts[key] = snapshot_counts.get(key, 0) + count
+    
+    body = {
+        'message': 'Successfully processed video data',
+        'mode': run['mode'],
+        'run_id': run['run_id'],
+        'years_processed': sorted({year for summary in summaries for year in summary['years_processed']}),
+        'total_videos': sum(summary['total_videos'] for summary in summaries),
+        'date_folder': run['date_folder'],
+        'output_formats': run['output_formats'],
+        'output_keys': output_keys,
+        'units': summaries
+    }
+    if snapshot_counts:
+        body['snapshots'] = snapshot_counts
+    return body
+
+def dispatch_work_units(events: List[Dict[str, Any]]) -> int:
+    """各作業単位のイベントでWORKER_FUNCTION_NAMEのLambda関数を非同期に呼び出す"""
+    import boto3
+    lambda_client = boto3.client('lambda', region_name='ap-northeast-1')
+    for worker_event in events:
+        lambda_client.invoke(
+            FunctionName=WORKER_FUNCTION_NAME,
+            InvocationType='Event',
+            Payload=json.dumps(worker_event).encode('utf-8')
+        )
+    print(f"Dispatched {len(events)} work units to {WORKER_FUNCTION_NAME}")
+    return len(events)
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    # コンテナを再利用した実行でも前回の集計・クォータ使用量を含めない
+    metrics.reset()
+    rate_limiter.reset_quota(QUOTA_BUDGET)
+    run = None
+    quota_date = None
     try:
-        # 東京タイムゾーン
-        tz = pytz.timezone('Asia/Tokyo')
-        # 実行時の現在時刻
-        current_time = datetime.now(tz)
+        # 実行時の現在時刻（日本時間）
+        current_time = datetime.now(JST)
         
         # 実行日付のフォルダ名を生成（yyyy=YYYY/mm=MM/dd=DD形式）
         date_folder = f"yyyy={current_time.year}/mm={current_time.month:02d}/dd={current_time.day:02d}"
         
-        # 取得対象の年を設定
-        end_year = current_time.year
-        start_year = event.get('start_year', current_time.year)  # イベントから開始年を取得、デフォルトは現在の年
+        action = event.get('action')
         
-        print(f"Fetching videos from {start_year} to {end_year}")
-        print(f"Data will be saved in folder: {date_folder}")
+        # CSVパートファイルの結合のみを行う
+        if action == 'compact_csv':
+            date_folder = event.get('date_folder', date_folder)
+            csv_key = compact_csv_parts(get_s3_client(), BUCKET_NAME, date_folder)
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Successfully compacted CSV parts',
+                    'csv_key': csv_key,
+                    'date_folder': date_folder
+                })
+            }
         
-        all_videos = []
+        # Lambdaの残り時間（ローカル実行ではtime_budget_secondsまたはTIME_BUDGET_SECONDS）
+        budget = TimeBudget.from_context(context, event.get('time_budget_seconds') or TIME_BUDGET_SECONDS)
         
-        # 各年の動画を取得
-        for year in range(start_year, end_year + 1):
-            print(f"\nFetching videos for year {year}")
-            videos = get_channel_videos_for_year(CHANNEL_ID, year)
-            all_videos.extend(videos)
-            print(f"Added {len(videos)} videos for year {year}")
+        if action == 'process_unit':
+            # コーディネーターが作成した1つの作業単位のみを処理する
+            # 同じ実行の他の作業単位と継続実行の情報を上書きし合わないよう作業単位を記録する
+            run = {**event['run'], 'unit_id': event['unit']['unit_id']}
+            units = [event['unit']]
+            print(f"Processing work unit {event['unit']['unit_id']} of run {run['run_id']}")
+        elif action == 'continue':
+            # 時間内に終わらなかった実行の残りの作業単位を処理する
+            run = event['run']
+            units = event['units']
+            print(f"Continuing run {run['run_id']} ({run['continuation']}) with {len(units)} units")
+        else:
+            # 実行全体の設定（実行ID・基準時刻・出力形式など）
+            run = build_run_config(event, current_time)
+            channel_ids = parse_channel_ids(event.get('channel_ids', DEFAULT_CHANNEL_IDS))
             
-            if videos:
-                # 取得時刻をUTCで取得
-                fetched_at = datetime.now(pytz.UTC)
-                
-                # 基本的な統計情報を計算
-                total_views = sum(int(v['statistics'].get('viewCount', 0)) for v in videos)
-                total_likes = sum(int(v['statistics'].get('likeCount', 0)) for v in videos)
-                total_comments = sum(int(v['statistics'].get('commentCount', 0)) for v in videos)
-                
-                # メタデータを追加
-                metadata = {
-                    'year': year,
-                    'total_videos': len(videos),
-                    'total_views': total_views,
-                    'total_likes': total_likes,
-                    'total_comments': total_comments,
-                    'average_views': total_views / len(videos) if videos else 0,
-                    'average_likes': total_likes / len(videos) if videos else 0,
-                    'average_comments': total_comments / len(videos) if videos else 0,
-                    'fetched_at': fetched_at.isoformat()
+            # チャンネル×年の作業単位に分割し、各作業単位のイベントを作成する
+            if action == 'fan_out':
+                if run['snapshots'] and run['mode'] == 'search':
+                    # 同じチャンネルの複数の年を並列に処理するとスナップショットのデータベースを上書きし合う
+                    raise ValueError('Snapshots are not supported for sharded search runs; use uploads or scheduled mode')
+                units = build_work_units(run, channel_ids, shard=True)
+                # 並列に処理される作業単位に1日の残りのクォータを等分して割り当てる
+                quota_remaining = get_quota_remaining(get_quota_date())
+                if run['quota_budget'] is not None:
+                    quota_remaining = run['quota_budget'] if quota_remaining is None \
+                        else min(run['quota_budget'], quota_remaining)
+                if quota_remaining is not None and units:
+                    run = {**run, 'quota_budget': quota_remaining // len(units)}
+                events = [{'action': 'process_unit', 'run': run, 'unit': unit} for unit in units]
+                dispatched = dispatch_work_units(events) if WORKER_FUNCTION_NAME else 0
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({
+                        'message': f'Planned {len(units)} work units',
+                        'run_id': run['run_id'],
+                        'date_folder': run['date_folder'],
+                        'dispatched': dispatched,
+                        'quota_remaining': quota_remaining,
+                        'events': events
+                    })
                 }
-                
-                # JSONファイルとして保存（日付フォルダ配下に配置）
-                json_key = f'{date_folder}/video_stats_{year}.json'
-                s3.put_object(
-                    Bucket=BUCKET_NAME,
-                    Key=json_key,
-                    Body=json.dumps({
-                        'metadata': metadata,
-                        'videos': videos
-                    }, ensure_ascii=False, indent=2),
-                    ContentType='application/json'
-                )
-                
-                print(f"Saved JSON data for {year} to S3: {json_key}")
+            
+            print(f"Data will be saved in folder: {run['date_folder']} "
+                  f"(formats: {', '.join(run['output_formats'])}, channels: {', '.join(channel_ids)})")
+            units = build_work_units(run, channel_ids)
         
-        print(f"\nTotal videos collected: {len(all_videos)}")
+        quota_date = get_quota_date()
+        quota_budget = start_quota(run, quota_date)
+        print(f"Quota budget for this invocation: {quota_budget if quota_budget is not None else 'unlimited'}")
+        summaries, continuation_event = process_work_units(run, units, budget)
+        body = merge_unit_summaries(run, summaries)
+        body['quota_used'] = rate_limiter.quota_used
+        body['quota_budget'] = quota_budget
+        quota_exceeded = any(summary.get('quota_exceeded') for summary in summaries)
+        if continuation_event:
+            # 続きはcontinuationのイベントで再度呼び出す（AUTO_CONTINUEの場合は自動で呼び出す）
+            # クォータの上限による中断はすぐに呼び出してもクォータを使い切るだけのため自動では呼び出さない
+            body['continuation'] = continuation_event
+            body['auto_continued'] = bool(AUTO_CONTINUE and not quota_exceeded
+                                          and getattr(context, 'invoked_function_arn', None))
+            if body['auto_continued']:
+                enqueue_continuation(continuation_event, context)
+        if quota_exceeded:
+            metrics.increment('QuotaBudgetExceeded')
+            body['message'] = 'Quota budget exceeded; remaining work saved as continuation'
+            body['error'] = 'Quota budget exceeded'
         
-        # 全年のデータをCSVとして保存（日付フォルダ配下に配置）
-        if all_videos:
-            print("Attempting to save CSV file...")
-            csv_key = f'{date_folder}/video_stats.csv'
-            save_to_csv(all_videos, s3, BUCKET_NAME, csv_key)
-            print("CSV file saved successfully")
-        else:
-            print("No videos to save to CSV")
+        # レスポンスキャッシュが有効な場合はヒット率を返す
+        cache = get_response_cache()
+        if cache:
+            body['response_cache'] = cache.stats()
         
         return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Successfully processed video data',
-                'years_processed': list(range(start_year, end_year + 1)),
-                'total_videos': len(all_videos),
-                'date_folder': date_folder
-            })
+            # クォータの上限で中断した実行は成功として扱わない（残りはcontinuationで再開する）
+            'statusCode': 429 if quota_exceeded else 200,
+            'body': json.dumps(body)
         }
         
     except Exception as e:
         print(f'Error: {str(e)}')
+        metrics.increment('Failures')
         return {
             'statusCode': 500,
             'body': json.dumps({
-                'error': str(e)
+                'error': str(e),
+                'quota_used': rate_limiter.quota_used
             })
-        } 
\ No newline at end of file
+        }
+    finally:
+        # 1日のクォータの集計のため、この呼び出しの使用量をS3に記録
+        if quota_date and QUOTA_BUDGET is not None and rate_limiter.quota_used:
+            label = f"{run['run_id']}-{run.get('unit_id') or 'run'}-c{run.get('continuation', 0)}"
+            try:
+                record_quota_usage(get_s3_client(), BUCKET_NAME, quota_date, rate_limiter.quota_used, label)
+            except Exception as e:
+                print(f"Warning: Failed to record quota usage: {str(e)}")
+        # 実行のメトリクス（API呼び出し・クォータ・S3の送受信量・処理段階ごとの時間）を出力
+        metrics.emit('lambda_function', {
+            'action': event.get('action') or 'collect',
+            'mode': run['mode'] if run else event.get('mode'),
+            'run_id': run['run_id'] if run else None
+        })
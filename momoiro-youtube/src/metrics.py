@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# ログレベル（DEBUGで動画ごと・ページごとの詳細なログも出力する）
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+LOG_LEVEL = LOG_LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), LOG_LEVELS['INFO'])
+
+# 実行ごとのメトリクスを出力するログレベル（CloudWatch Embedded Metric Format）
+METRICS_LOG_LEVEL = LOG_LEVELS.get(os.environ.get('METRICS_LOG_LEVEL', 'INFO').upper(), LOG_LEVELS['INFO'])
+
+# CloudWatchメトリクスの名前空間
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'MomoiroYouTube')
+
+# APIリクエストのレイテンシのヒストグラムの上限値（ミリ秒、最後は上限なし）
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+def is_debug_enabled() -> bool:
+    """LOG_LEVELがDEBUGかどうか（詳細なログの組み立てを省くために使用する）"""
+    return LOG_LEVEL <= LOG_LEVELS['DEBUG']
+
+
+def debug(message: str) -> None:
+    """LOG_LEVELがDEBUGの場合のみ出力"""
+    if LOG_LEVEL <= LOG_LEVELS['DEBUG']:
+        print(message)
+
+
+class Metrics:
+    """1回の実行のメトリクスを集計する（複数スレッドから共有して使用する）
+
+    APIメソッドごとの呼び出し数・レイテンシのヒストグラム・クォータ・リトライ・エラー、
+    S3の操作ごとのリクエスト数と送受信バイト数、処理段階（fetch・analyze・serialize・uploadなど）
+    ごとの処理時間を記録する。処理段階は入れ子にでき、内側の段階の時間は外側に含めない。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        """集計をすべて破棄（Lambdaのコンテナを再利用した実行ごとに呼び出す）"""
+        with self._lock:
+            self.started_at = time.time()
+            self.api = {}
+            self.s3 = {}
+            self.stages = {}
+            self.counters = {}
+
+    def record_api_call(self, method: str, seconds: float, quota: int, error: Optional[str] = None,
+                        retried: bool = False) -> None:
+        """APIリクエスト1回（リトライは1回ごと）の結果を記録"""
+        latency_ms = seconds * 1000
+        bucket = next((index for index, limit in enumerate(LATENCY_BUCKETS_MS) if latency_ms <= limit),
+                      len(LATENCY_BUCKETS_MS))
+        with self._lock:
+            stats = self.api.get(method)
+            if stats is None:
+                stats = self.api[method] = {
+                    'calls': 0, 'quota_units': 0, 'retries': 0, 'errors': 0,
+                    'latency_ms_total': 0.0, 'latency_ms_max': 0.0,
+                    'latency_histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)
+                }
+            stats['calls'] += 1
+            stats['quota_units'] += quota
+            stats['latency_ms_total'] += latency_ms
+            stats['latency_ms_max'] = max(stats['latency_ms_max'], latency_ms)
+            stats['latency_histogram'][bucket] += 1
+            if retried:
+                stats['retries'] += 1
+            elif error:
+                stats['errors'] += 1
+
+    def record_s3(self, operation: str, seconds: float, bytes_out: int = 0, bytes_in: int = 0) -> None:
+        """S3の操作1回を記録"""
+        with self._lock:
+            stats = self.s3.get(operation)
+            if stats is None:
+                stats = self.s3[operation] = {'requests': 0, 'bytes_out': 0, 'bytes_in': 0, 'seconds': 0.0}
+            stats['requests'] += 1
+            stats['bytes_out'] += bytes_out
+            stats['bytes_in'] += bytes_in
+            stats['seconds'] += seconds
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """任意のカウンター（取得した動画数・コメント数など）を加算"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _add_stage_time(self, name: str, seconds: float, count: int = 0) -> None:
+        with self._lock:
+            stats = self.stages.setdefault(name, {'seconds': 0.0, 'count': 0})
+            stats['seconds'] += seconds
+            stats['count'] += count
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """処理段階の時間を計測（スレッドごとに入れ子を管理し、内側の段階の間は外側の計測を止める）"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        now = time.perf_counter()
+        if stack:
+            outer, outer_started = stack[-1]
+            self._add_stage_time(outer, now - outer_started)
+        stack.append((name, now))
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, started = stack.pop()
+            self._add_stage_time(name, now - started, 1)
+            if stack:
+                stack[-1] = (stack[-1][0], now)
+
+    def iterate(self, name: str, iterable: Iterable[Any]) -> Iterator[Any]:
+        """イテレータ（ページを順に取得するジェネレータなど）から要素を取り出す時間を処理段階として計測"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def latency_percentile(self, method: str, percentile: float) -> Optional[float]:
+        """ヒストグラムから求めたレイテンシの分位点（該当するバケットの上限値、最大値を超えない。ミリ秒）"""
+        with self._lock:
+            stats = self.api.get(method)
+            histogram = list(stats['latency_histogram']) if stats else []
+            latency_max = stats['latency_ms_max'] if stats else None
+        total = sum(histogram)
+        if not total:
+            return None
+        threshold = total * percentile
+        cumulative = 0
+        for index, count in enumerate(histogram):
+            cumulative += count
+            if cumulative >= threshold:
+                return min(float(LATENCY_BUCKETS_MS[index]), latency_max) if index < len(LATENCY_BUCKETS_MS) else latency_max
+        return latency_max
+
+    def summary(self) -> Dict[str, Any]:
+        """集計結果を辞書で返す"""
+        with self._lock:
+            api = {method: {**stats, 'latency_histogram': list(stats['latency_histogram'])}
+                   for method, stats in self.api.items()}
+            s3 = {operation: dict(stats) for operation, stats in self.s3.items()}
+            stages = {name: {'seconds': round(stats['seconds'], 3), 'count': stats['count']}
+                      for name, stats in self.stages.items()}
+            counters = dict(self.counters)
+            started_at = self.started_at
+        for method, stats in api.items():
+            stats['latency_ms_total'] = round(stats['latency_ms_total'], 1)
+            stats['latency_ms_max'] = round(stats['latency_ms_max'], 1)
+            stats['latency_ms_p50'] = self.latency_percentile(method, 0.5)
+            stats['latency_ms_p95'] = self.latency_percentile(method, 0.95)
+        for stats in s3.values():
+            stats['seconds'] = round(stats['seconds'], 3)
+        return {
+            'duration_seconds': round(time.time() - started_at, 3),
+            'api_calls': sum(stats['calls'] for stats in api.values()),
+            'quota_units': sum(stats['quota_units'] for stats in api.values()),
+            'api_retries': sum(stats['retries'] for stats in api.values()),
+            'api_errors': sum(stats['errors'] for stats in api.values()),
+            's3_requests': sum(stats['requests'] for stats in s3.values()),
+            's3_bytes_out': sum(stats['bytes_out'] for stats in s3.values()),
+            's3_bytes_in': sum(stats['bytes_in'] for stats in s3.values()),
+            'api': api,
+            's3': s3,
+            'stages': stages,
+            'counters': counters,
+            'latency_buckets_ms': LATENCY_BUCKETS_MS
+        }
+
+    def build_emf_records(self, collector: str, properties: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """CloudWatch Embedded Metric Format（EMF）のレコードを作成
+
+        実行全体のレコード（ディメンション: Collector）と、APIメソッドごとのレコード
+        （ディメンション: Collector, Method）を返す。詳細な集計（ヒストグラムなど）は
+        メトリクスではないプロパティとして実行全体のレコードに含める。
+        """
+        summary = self.summary()
+        timestamp = int(time.time() * 1000)
+
+        def record(dimensions: List[str], values: Dict[str, Any], units: Dict[str, str],
+                   extra: Dict[str, Any]) -> Dict[str, Any]:
+            return {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': METRICS_NAMESPACE,
+                        'Dimensions': [dimensions],
+                        'Metrics': [{'Name': name, 'Unit': units[name]} for name in values]
+                    }]
+                },
+                **extra,
+                **values
+            }
+
+        totals = {
+            'DurationSeconds': summary['duration_seconds'],
+            'ApiCalls': summary['api_calls'],
+            'QuotaUnits': summary['quota_units'],
+            'ApiRetries': summary['api_retries'],
+            'ApiErrors': summary['api_errors'],
+            'S3Requests': summary['s3_requests'],
+            'S3BytesOut': summary['s3_bytes_out'],
+            'S3BytesIn': summary['s3_bytes_in'],
+        }
+        units = {'DurationSeconds': 'Seconds', 'S3BytesOut': 'Bytes', 'S3BytesIn': 'Bytes'}
+        for name, stats in summary['stages'].items():
+            metric = f"Stage{name.capitalize()}Seconds"
+            totals[metric] = stats['seconds']
+            units[metric] = 'Seconds'
+        for name, value in summary['counters'].items():
+            totals[name] = value
+        units = {name: units.get(name, 'Count') for name in totals}
+
+        records = [record(['Collector'], totals, units, {
+            'Collector': collector,
+            **(properties or {}),
+            'api': summary['api'],
+            's3': summary['s3'],
+            'stages': summary['stages'],
+            'latency_buckets_ms': summary['latency_buckets_ms']
+        })]
+        for method, stats in summary['api'].items():
+            values = {
+                'Calls': stats['calls'],
+                'QuotaUnits': stats['quota_units'],
+                'Retries': stats['retries'],
+                'Errors': stats['errors'],
+                'LatencyP50': stats['latency_ms_p50'],
+                'LatencyP95': stats['latency_ms_p95'],
+                'LatencyMax': stats['latency_ms_max'],
+            }
+            method_units = {name: 'Milliseconds' if name.startswith('Latency') else 'Count' for name in values}
+            records.append(record(['Collector', 'Method'], values, method_units,
+                                  {'Collector': collector, 'Method': method}))
+        return records
+
+    def emit(self, collector: str, properties: Optional[Dict[str, Any]] = None) -> None:
+        """実行のメトリクスをEMFのJSON（1行に1レコード）として出力（METRICS_LOG_LEVELがLOG_LEVEL以上の場合）"""
+        if METRICS_LOG_LEVEL < LOG_LEVEL:
+            return
+        for record in self.build_emf_records(collector, properties):
+            print(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+
+
+# プロセス内で共有するメトリクス
+metrics = Metrics()
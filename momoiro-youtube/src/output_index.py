@@ -0,0 +1,426 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from s3_stream import iter_object_chunks, list_objects
+from video_analysis import TITLE_FLAG_COLUMNS
+
+# zstandardは任意の依存関係（.jsonl.zstのファイルを取り込む場合のみimportする）
+
+# 取り込むファイルのキーの形式（日付フォルダ yyyy=YYYY/mm=MM/dd=DD 配下）
+_DATE_FOLDER = r'(?:^|/)yyyy=(?P<yyyy>\d{4})/mm=(?P<mm>\d{2})/dd=(?P<dd>\d{2})/'
+# 年ごとの動画データ（video_stats_{年}[_{チャンネルID}][_{実行ID}].json、圧縮したJSON Lines）
+VIDEO_JSON_PATTERN = re.compile(_DATE_FOLDER + r'video_stats_\d{4}[^/]*?(?<!\.meta)\.json$')
+VIDEO_JSONL_PATTERN = re.compile(_DATE_FOLDER + r'video_stats_\d{4}[^/]*\.jsonl(?P<ext>\.gz|\.zst)$')
+# コメント（comments_{動画ID}_{時刻}.jsonl）
+COMMENTS_PATTERN = re.compile(_DATE_FOLDER + r'comments_(?P<video_id>[^/]+)_\d{8}_\d{6}\.jsonl$')
+
+# 上位の動画の並べ替えに使用できる列
+VIDEO_ORDER_COLUMNS = (
+    'view_count', 'like_count', 'comment_count', 'daily_avg_views', 'daily_avg_likes',
+    'daily_avg_comments', 'total_engagement', 'duration_seconds', 'published_at'
+)
+
+# コメントの全文検索（trigram）で検索できる最小の文字数（短い語句はLIKEで検索する）
+TRIGRAM_MIN_LENGTH = 3
+
+# 1回のexecutemanyで書き込む行数
+INSERT_BATCH_SIZE = 1000
+
+# 読み込みのチャンクサイズ（ローカルファイル）
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def to_int(value: Any) -> Optional[int]:
+    """統計情報の値（文字列の場合あり）を整数に変換（変換できない場合はNone）"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def to_flag(value: Any) -> Optional[int]:
+    """タイトル分類の結果をSQLiteの値（1・0・NULL）に変換"""
+    return None if value is None else int(bool(value))
+
+
+def iter_decompressed(chunks: Iterable[bytes], ext: str) -> Iterator[bytes]:
+    """圧縮したデータのチャンクを逐次展開（.gz: gzip、.zst: zstd）"""
+    if ext == '.zst':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError('reading .zst files requires zstandard (pip install zstandard)') from e
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = zlib.decompressobj(31)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    if ext != '.zst':
+        rest = decompressor.flush()
+        if rest:
+            yield rest
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """チャンクを行ごとに分割（空行は除く）"""
+    pending = b''
+    for chunk in chunks:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+def iter_local_files(root: str) -> Iterator[Tuple[str, str, Callable[[], Iterator[bytes]]]]:
+    """ローカルディレクトリ配下のファイル（rootからの相対キー、更新の判定に使う版、読み込み関数）を列挙"""
+    def reader(path: str) -> Callable[[], Iterator[bytes]]:
+        def read() -> Iterator[bytes]:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+        return read
+
+    for directory, _, filenames in sorted(os.walk(root)):
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            key = os.path.relpath(path, root).replace(os.sep, '/')
+            yield key, f'{stat.st_size}:{stat.st_mtime_ns}', reader(path)
+
+
+def iter_s3_files(s3_client: Any, bucket: str, prefix: str = '') -> Iterator[Tuple[str, str, Callable[[], Iterator[bytes]]]]:
+    """S3のプレフィックス配下のオブジェクト（キー、ETagとサイズによる版、読み込み関数）を列挙"""
+    for obj in list_objects(s3_client, bucket, prefix):
+        key = obj['Key']
+        yield key, f"{obj.get('ETag', '')}:{obj.get('Size', 0)}", \
+            lambda key=key: iter_object_chunks(s3_client, bucket, key)
+
+
+class OutputIndex:
+    """収集結果（年ごとの動画データ・コメント）を検索用に取り込むローカルのインデックス（SQLite）
+
+    videosテーブルは(video_id, snapshot_date)ごとに1行で、同じ日付フォルダの複数の実行のうち
+    取得時刻（fetched_at）が最も新しい値を保持する。commentsテーブルはコメントごとに1行で、
+    本文の全文検索（FTS5のtrigram）をcomments_ftsに同期する。取り込んだファイルは版
+    （サイズ・更新時刻またはETag）とともにingested_filesに記録し、変更のないファイルは再度読み込まない。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        flag_columns = ''.join(f'{column} INTEGER,\n' for column in TITLE_FLAG_COLUMNS)
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS ingested_files (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                version TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                records INTEGER NOT NULL,
+                ingested_at TEXT NOT NULL,
+                PRIMARY KEY (source, key)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT NOT NULL,
+                snapshot_date TEXT NOT NULL,
+                channel_id TEXT,
+                title TEXT,
+                status TEXT,
+                published_at TEXT,
+                published_year INTEGER,
+                published_month INTEGER,
+                duration_seconds INTEGER,
+                view_count INTEGER,
+                like_count INTEGER,
+                comment_count INTEGER,
+                daily_avg_views REAL,
+                daily_avg_likes REAL,
+                daily_avg_comments REAL,
+                total_engagement INTEGER,
+                {flag_columns}fetched_at TEXT,
+                source_key TEXT,
+                PRIMARY KEY (video_id, snapshot_date)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_videos_snapshot_date ON videos (snapshot_date);
+            CREATE INDEX IF NOT EXISTS idx_videos_published_year ON videos (published_year, snapshot_date);
+            CREATE TABLE IF NOT EXISTS comments (
+                id INTEGER PRIMARY KEY,
+                comment_key TEXT NOT NULL UNIQUE,
+                video_id TEXT NOT NULL,
+                parent_id TEXT,
+                author TEXT,
+                published_at TEXT,
+                like_count INTEGER,
+                text TEXT,
+                members TEXT,
+                snapshot_date TEXT NOT NULL,
+                source_key TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_comments_video ON comments (video_id, published_at);
+            CREATE INDEX IF NOT EXISTS idx_comments_published_at ON comments (published_at);
+        """)
+        # 返信先のIDの列がない以前のインデックスには列を追加する
+        if 'parent_id' not in {row['name'] for row in self._conn.execute('PRAGMA table_info(comments)')}:
+            self._conn.execute('ALTER TABLE comments ADD COLUMN parent_id TEXT')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_comments_parent_id ON comments (parent_id)')
+        for column in TITLE_FLAG_COLUMNS:
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS idx_videos_{column} ON videos ({column}, published_year)')
+        self.full_text = self._create_full_text_index()
+        self._conn.commit()
+
+    def _create_full_text_index(self) -> bool:
+        """コメント本文の全文検索テーブルと同期用のトリガーを作成（trigramに対応していないSQLiteではFalse）"""
+        try:
+            self._conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+                    text, content='comments', content_rowid='id', tokenize='trigram'
+                );
+                CREATE TRIGGER IF NOT EXISTS comments_ai AFTER INSERT ON comments BEGIN
+                    INSERT INTO comments_fts (rowid, text) VALUES (new.id, new.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS comments_ad AFTER DELETE ON comments BEGIN
+                    INSERT INTO comments_fts (comments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS comments_au AFTER UPDATE OF text ON comments
+                WHEN old.text IS NOT new.text BEGIN
+                    INSERT INTO comments_fts (comments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                    INSERT INTO comments_fts (rowid, text) VALUES (new.id, new.text);
+                END;
+            """)
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"Warning: FTS5 trigram is not available (SQLite {sqlite3.sqlite_version}), "
+                  f"comment search falls back to LIKE: {e}")
+            return False
+
+    # 取り込み
+
+    def ingest(self, source: str, files: Iterable[Tuple[str, str, Callable[[], Iterator[bytes]]]],
+               force: bool = False) -> Dict[str, int]:
+        """ファイルの一覧（iter_local_files・iter_s3_files）から未取り込みまたは変更されたファイルを取り込む
+
+        ファイルごとにコミットするため、中断しても取り込み済みのファイルは再実行時に読み込まない。
+        種類ごとの取り込んだファイル数・レコード数と、変更がなく読み込まなかったファイル数を返す。
+        """
+        versions = {row['key']: row['version'] for row in self._conn.execute(
+            'SELECT key, version FROM ingested_files WHERE source = ?', (source,))}
+        result = {'video_files': 0, 'videos': 0, 'comment_files': 0, 'comments': 0, 'unchanged_files': 0}
+        for key, version, read in files:
+            kind, match = self._classify(key)
+            if kind is None:
+                continue
+            if not force and versions.get(key) == version:
+                result['unchanged_files'] += 1
+                continue
+            snapshot_date = f"{match['yyyy']}-{match['mm']}-{match['dd']}"
+            if kind == 'videos':
+                if match.groupdict().get('ext'):
+                    records = (json.loads(line) for line in iter_lines(iter_decompressed(read(), match['ext'])))
+                else:
+                    records = json.loads(b''.join(read())).get('videos', [])
+                count = self._insert_videos(records, snapshot_date, key)
+            else:
+                records = (json.loads(line) for line in iter_lines(read()))
+                count = self._insert_comments(records, match['video_id'], snapshot_date, key)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ingested_files (source, key, version, kind, records, ingested_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (source, key, version, kind, count, datetime.now(timezone.utc).isoformat())
+            )
+            self._conn.commit()
+            result['video_files' if kind == 'videos' else 'comment_files'] += 1
+            result[kind] += count
+            print(f"Indexed {count} {kind} from {source}/{key}")
+        return result
+
+    @staticmethod
+    def _classify(key: str) -> Tuple[Optional[str], Optional[re.Match]]:
+        """キーから取り込むファイルの種類（videos・comments）を判定（対象外はNone）"""
+        for kind, pattern in (('videos', VIDEO_JSON_PATTERN), ('videos', VIDEO_JSONL_PATTERN),
+                              ('comments', COMMENTS_PATTERN)):
+            match = pattern.search(key)
+            if match:
+                return kind, match
+        return None, None
+
+    def _insert_videos(self, videos: Iterable[Dict[str, Any]], snapshot_date: str, source_key: str) -> int:
+        """年ごとの動画データを取り込む（同じ日付の行は取得時刻が新しい場合のみ更新）"""
+        columns = [
+            'video_id', 'snapshot_date', 'channel_id', 'title', 'status', 'published_at',
+            'published_year', 'published_month', 'duration_seconds', 'view_count', 'like_count', 'comment_count',
+            'daily_avg_views', 'daily_avg_likes', 'daily_avg_comments', 'total_engagement',
+            *TITLE_FLAG_COLUMNS, 'fetched_at', 'source_key'
+        ]
+        updates = ', '.join(f'{column} = excluded.{column}' for column in columns[2:])
+        sql = (f"INSERT INTO videos ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+               f"ON CONFLICT (video_id, snapshot_date) DO UPDATE SET {updates} "
+               f"WHERE excluded.fetched_at >= videos.fetched_at OR videos.fetched_at IS NULL")
+
+        def rows() -> Iterator[Tuple[Any, ...]]:
+            for video in videos:
+                statistics = video.get('statistics') or {}
+                analysis = video.get('analysis') or {}
+                published_info = analysis.get('published_info') or {}
+                daily_average = analysis.get('daily_average') or {}
+                title_analysis = analysis.get('title_analysis') or {}
+                published_at = video.get('published_at') or None
+                yield (
+                    video.get('video_id'), snapshot_date, video.get('channel_id'), video.get('title'),
+                    video.get('status'), published_at,
+                    # 分析できなかった動画は公開日時（UTC）の年
+                    published_info.get('year') or to_int(published_at[:4] if published_at else None),
+                    published_info.get('month'), analysis.get('duration_seconds'),
+                    to_int(statistics.get('viewCount')), to_int(statistics.get('likeCount')),
+                    to_int(statistics.get('commentCount')),
+                    daily_average.get('views'), daily_average.get('likes'), daily_average.get('comments'),
+                    analysis.get('total_engagement'),
+                    *(to_flag(title_analysis.get(category)) for category in TITLE_FLAG_COLUMNS.values()),
+                    video.get('fetched_at'), source_key
+                )
+
+        return self._insert_batches(sql, rows())
+
+    def _insert_comments(self, comments: Iterable[Dict[str, Any]], video_id: str, snapshot_date: str,
+                         source_key: str) -> int:
+        """コメントを取り込む（取得済みのコメントは高評価数などを新しい取得の値に更新。返信はparent_idで返信先と対応付ける）"""
+        sql = ('INSERT INTO comments (comment_key, video_id, parent_id, author, published_at, like_count, text, '
+               'members, snapshot_date, source_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+               'ON CONFLICT (comment_key) DO UPDATE SET like_count = excluded.like_count, text = excluded.text, '
+               'members = excluded.members, snapshot_date = excluded.snapshot_date, source_key = excluded.source_key '
+               'WHERE excluded.snapshot_date >= comments.snapshot_date')
+
+        def rows() -> Iterator[Tuple[Any, ...]]:
+            for comment in comments:
+                members = comment.get('members')
+                yield (
+                    get_comment_key(video_id, comment), video_id, comment.get('parentId'), comment.get('author'),
+                    comment.get('publishedAt'), to_int(comment.get('likeCount')), comment.get('text'),
+                    ','.join(members) if members is not None else None, snapshot_date, source_key
+                )
+
+        return self._insert_batches(sql, rows())
+
+    def _insert_batches(self, sql: str, rows: Iterator[Tuple[Any, ...]]) -> int:
+        """行をINSERT_BATCH_SIZEごとにまとめて書き込み、書き込んだ行数を返す"""
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= INSERT_BATCH_SIZE:
+                self._conn.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._conn.executemany(sql, batch)
+            count += len(batch)
+        return count
+
+    # 検索
+
+    def top_videos(self, order_by: str = 'daily_avg_views', year: Optional[int] = None,
+                   snapshot_date: Optional[str] = None, flags: Iterable[str] = (), channel_id: Optional[str] = None,
+                   limit: int = 20) -> List[Dict[str, Any]]:
+        """列の値が大きい順の動画（snapshot_dateを省略した場合は動画ごとの最新の日付の値）"""
+        if order_by not in VIDEO_ORDER_COLUMNS:
+            raise ValueError(f"Unknown column: {order_by} (choose from {', '.join(VIDEO_ORDER_COLUMNS)})")
+        conditions, params = [], []
+        if snapshot_date:
+            conditions.append('v.snapshot_date = ?')
+            params.append(snapshot_date)
+        else:
+            conditions.append('v.snapshot_date = (SELECT MAX(snapshot_date) FROM videos WHERE video_id = v.video_id)')
+        if year is not None:
+            conditions.append('v.published_year = ?')
+            params.append(year)
+        if channel_id:
+            conditions.append('v.channel_id = ?')
+            params.append(channel_id)
+        for flag in flags:
+            if flag not in TITLE_FLAG_COLUMNS:
+                raise ValueError(f"Unknown flag: {flag} (choose from {', '.join(TITLE_FLAG_COLUMNS)})")
+            conditions.append(f'v.{flag} = 1')
+        rows = self._conn.execute(
+            f"SELECT v.* FROM videos v WHERE {' AND '.join(conditions)} "
+            f"AND v.{order_by} IS NOT NULL ORDER BY v.{order_by} DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search_comments(self, query: str, since: Optional[str] = None, until: Optional[str] = None,
+                        video_id: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """本文に語句を含むコメントを新しい順に検索（since・untilは投稿日時の範囲、untilは含まない）
+
+        3文字以上の語句は全文検索（trigram）、それより短い語句はLIKEで検索する。
+        """
+        conditions, params = [], []
+        if self.full_text and len(query) >= TRIGRAM_MIN_LENGTH:
+            conditions.append('c.id IN (SELECT rowid FROM comments_fts WHERE comments_fts MATCH ?)')
+            params.append('"' + query.replace('"', '""') + '"')
+        else:
+            conditions.append("c.text LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([\\%_])', r'\\\1', query) + '%')
+        if since:
+            conditions.append('c.published_at >= ?')
+            params.append(since)
+        if until:
+            conditions.append('c.published_at < ?')
+            params.append(until)
+        if video_id:
+            conditions.append('c.video_id = ?')
+            params.append(video_id)
+        rows = self._conn.execute(
+            f"SELECT c.video_id, c.parent_id, c.author, c.published_at, c.like_count, c.text, c.members "
+            f"FROM comments c WHERE {' AND '.join(conditions)} ORDER BY c.published_at DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        """任意のSQLを実行して結果を返す"""
+        return [dict(row) for row in self._conn.execute(sql, tuple(params)).fetchall()]
+
+    def stats(self) -> Dict[str, Any]:
+        """取り込み済みのファイル・動画・コメントの件数と日付の範囲"""
+        row = self._conn.execute(
+            'SELECT (SELECT COUNT(*) FROM ingested_files) AS files, '
+            '(SELECT COUNT(DISTINCT video_id) FROM videos) AS videos, '
+            '(SELECT COUNT(*) FROM videos) AS video_snapshots, '
+            '(SELECT MIN(snapshot_date) FROM videos) AS first_snapshot_date, '
+            '(SELECT MAX(snapshot_date) FROM videos) AS last_snapshot_date, '
+            '(SELECT COUNT(*) FROM comments) AS comments'
+        ).fetchone()
+        return {**dict(row), 'full_text': self.full_text}
+
+    def close(self) -> None:
+        """データベース接続を閉じる"""
+        self._conn.close()
+
+
+def get_comment_key(video_id: str, comment: Dict[str, Any]) -> str:
+    """コメントを識別するキー（コメントIDがない場合は動画ID・投稿者・投稿日時・本文のハッシュ）"""
+    if comment.get('id'):
+        return comment['id']
+    digest = hashlib.sha1('\0'.join(
+        str(comment.get(field, '')) for field in ('author', 'publishedAt', 'text')
+    ).encode('utf-8') + b'\0' + video_id.encode('utf-8')).hexdigest()
+    return f'{video_id}:{digest}'
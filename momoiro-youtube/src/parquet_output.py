@@ -0,0 +1,134 @@
+import importlib.util
+from datetime import timezone
+from typing import Any, Dict, List, Optional
+
+from metrics import metrics
+from s3_stream import S3MultipartWriter
+from video_analysis import ANALYSIS_COLUMNS, TITLE_FLAG_COLUMNS, VideoAnalysisBatch, parse_timestamp
+
+# pyarrowは任意の依存関係（Parquet出力を選択した実行でのみimportする）
+
+# Parquetファイルを保存するデータセットのプレフィックス
+# （配下にyyyy=YYYY/mm=MM/dd=DDのパーティションを作成する）
+PARQUET_DATASET_PREFIX = 'video_stats_parquet'
+
+# 圧縮形式
+PARQUET_COMPRESSION = 'zstd'
+
+# 列名と型（CSVの列に実行のメタデータを加えたもの）
+# 型はpyarrowのimport後にget_schemaで解決する
+PARQUET_COLUMN_TYPES = [
+    ('snapshot_date', 'date32'),
+    ('run_id', 'string'),
+    ('channel_id', 'string'),
+    ('video_id', 'string'),
+    ('title', 'string'),
+    ('status', 'string'),
+    ('recorded_at', 'timestamp'),
+    ('published_at', 'timestamp'),
+    ('year', 'int16'),
+    ('month', 'int8'),
+    ('day', 'int8'),
+    ('hour', 'int8'),
+    ('weekday', 'string'),
+    ('time_of_day', 'string'),
+    ('duration_seconds', 'int32'),
+    ('view_count', 'int64'),
+    ('like_count', 'int64'),
+    ('comment_count', 'int64'),
+    ('daily_avg_views', 'float64'),
+    ('daily_avg_likes', 'float64'),
+    ('daily_avg_comments', 'float64'),
+    ('total_engagement', 'int64'),
+    ('is_live', 'bool'),
+    ('is_mv', 'bool'),
+    ('is_digest', 'bool'),
+    ('is_event', 'bool'),
+    ('has_member_name', 'bool'),
+    ('error_message', 'string'),
+]
+
+
+def require_pyarrow() -> None:
+    """pyarrowが利用できることを確認（未インストールの場合はImportError）"""
+    # 利用可否の確認のみのためimportせずに探す（書き出し時にimportする）
+    if importlib.util.find_spec('pyarrow') is None:
+        raise ImportError('Parquet output requires pyarrow (pip install pyarrow)')
+
+
+def get_schema() -> Any:
+    """Parquetファイルのスキーマ（pyarrow.Schema）"""
+    import pyarrow as pa
+
+    types = {
+        'date32': pa.date32(),
+        'string': pa.string(),
+        'timestamp': pa.timestamp('ms', tz='UTC'),
+        'int8': pa.int8(),
+        'int16': pa.int16(),
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'bool': pa.bool_(),
+    }
+    return pa.schema([(name, types[type_name]) for name, type_name in PARQUET_COLUMN_TYPES])
+
+
+def get_parquet_key(date_folder: str, run_id: str) -> str:
+    """実行ごとのParquetファイルのキーを生成"""
+    return f'{PARQUET_DATASET_PREFIX}/{date_folder}/part-{run_id}.parquet'
+
+
+def build_columns(batch: VideoAnalysisBatch, run_id: str, channel_id: str) -> Dict[str, List[Any]]:
+    """分析結果のバッチからParquetの列ごとの値を作成"""
+    videos = batch.videos
+    analyzed = batch.columns['year']
+    recorded_at = batch.reference_time.astimezone(timezone.utc).replace(microsecond=0)
+    snapshot_date = batch.reference_time.date()
+
+    columns = {
+        'snapshot_date': [snapshot_date] * len(videos),
+        'run_id': [run_id] * len(videos),
+        'channel_id': [video.get('channel_id', channel_id) for video in videos],
+        'video_id': [video.get('video_id', '') for video in videos],
+        'title': [video.get('title', '') for video in videos],
+        'status': [video.get('status', 'UNKNOWN') for video in videos],
+        'recorded_at': [recorded_at] * len(videos),
+        'published_at': [parse_timestamp(video['published_at']).replace(microsecond=0) if year is not None else None
+                         for video, year in zip(videos, analyzed)],
+        'error_message': [video.get('error_message') for video in videos],
+    }
+    for column in ANALYSIS_COLUMNS:
+        columns[column] = batch.columns[column]
+    for column, category in TITLE_FLAG_COLUMNS.items():
+        columns[column] = batch.title_flags.get(category, [None] * len(videos))
+    return columns
+
+
+def save_to_parquet(batch: VideoAnalysisBatch, s3_client: Any, bucket: str, date_folder: str,
+                    run_id: str, channel_id: str) -> Optional[str]:
+    """分析済みの動画データを実行ごとのParquetファイルとしてS3に保存
+
+    列の型はスキーマで固定し、zstdで圧縮する。保存したファイルのキーを返す。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if not len(batch):
+        print("No videos provided to save_to_parquet")
+        return None
+
+    with metrics.stage('serialize'):
+        schema = get_schema()
+        columns = build_columns(batch, run_id, channel_id)
+        table = pa.Table.from_pydict({field.name: columns[field.name] for field in schema}, schema=schema)
+
+        buffer = pa.BufferOutputStream()
+        pq.write_table(table, buffer, compression=PARQUET_COMPRESSION)
+
+    parquet_key = get_parquet_key(date_folder, run_id)
+    with S3MultipartWriter(s3_client, bucket, parquet_key, content_type='application/vnd.apache.parquet') as output:
+        output.write(buffer.getvalue().to_pybytes())
+
+    print(f"Saved {len(batch)} videos to Parquet: {parquet_key}")
+    return parquet_key
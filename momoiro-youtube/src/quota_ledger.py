@@ -0,0 +1,53 @@
+import json
+import re
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from s3_stream import list_object_keys
+
+# pytzはコールドスタートを短くするため使用時にimportする
+
+# 呼び出しごとのクォータ使用量を記録するプレフィックス（{プレフィックス}/{太平洋時間の日付}/...）
+QUOTA_LEDGER_PREFIX = 'state/quota'
+
+# YouTube Data APIのクォータがリセットされるタイムゾーン（太平洋時間の0時）
+QUOTA_TIMEZONE = 'America/Los_Angeles'
+
+# 記録のキーの末尾の使用量（-u{ユニット}.json）
+_UNITS_PATTERN = re.compile(r'-u(\d+)\.json$')
+
+
+def get_quota_date(now: Optional[datetime] = None) -> str:
+    """クォータを集計する日付（太平洋時間、YYYY-MM-DD）"""
+    import pytz
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(pytz.timezone(QUOTA_TIMEZONE)).strftime('%Y-%m-%d')
+
+
+def get_daily_quota_used(s3_client: Any, bucket: str, date: str) -> int:
+    """同じ日に記録された全呼び出しのクォータ使用量の合計
+
+    使用量はキー名に含めているため、一覧の取得のみで集計できる。
+    """
+    total = 0
+    for key in list_object_keys(s3_client, bucket, f'{QUOTA_LEDGER_PREFIX}/{date}/'):
+        match = _UNITS_PATTERN.search(key)
+        if match:
+            total += int(match.group(1))
+    return total
+
+
+def record_quota_usage(s3_client: Any, bucket: str, date: str, units: int, label: str) -> str:
+    """1回の呼び出しのクォータ使用量を記録し、記録のキーを返す
+
+    呼び出しごとに別のオブジェクトとして保存するため、並列に実行される呼び出し同士で上書きし合わない。
+    """
+    key = f'{QUOTA_LEDGER_PREFIX}/{date}/{label}-{uuid.uuid4().hex[:8]}-u{units}.json'
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps({'units': units, 'label': label, 'recorded_at': datetime.now(timezone.utc).isoformat()}),
+        ContentType='application/json'
+    )
+    return key
@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from video_analysis import parse_timestamp
+
+# 更新頻度の階層（上から順に判定し、公開からの日数または1日あたりの再生数の増加が条件を満たした階層を使用）
+# (階層名, 更新間隔（時間）, 公開からの日数の上限, 1日あたりの再生数の増加の下限)
+REFRESH_TIERS = [
+    ('hot', 1, 7, 10000),
+    ('warm', 24, 90, 1000),
+    ('cool', 24 * 7, 730, 100),
+    ('cold', 24 * 30, None, None),
+]
+
+# 更新間隔に対する許容誤差の割合（実行の開始時刻の揺らぎで更新が次の実行に遅れないよう、
+# 更新間隔の90%以上経過した動画を対象にする）
+REFRESH_SLACK = 0.1
+
+# videos.listで一度に更新できる動画数（1回1ユニット）
+VIDEOS_PER_UNIT = 50
+
+# レポートに含める更新を見送った動画IDの上限
+MAX_REPORTED_SKIPS = 100
+
+
+def assign_tier(age_days: float, daily_views: Optional[float]) -> str:
+    """公開からの日数と1日あたりの再生数の増加から更新頻度の階層を決める"""
+    for tier, _, max_age_days, min_daily_views in REFRESH_TIERS:
+        if max_age_days is None or age_days <= max_age_days:
+            return tier
+        if daily_views is not None and min_daily_views is not None and daily_views >= min_daily_views:
+            return tier
+    return REFRESH_TIERS[-1][0]
+
+
+def get_daily_views(velocity: Optional[Dict[str, Any]]) -> Optional[float]:
+    """スナップショットの増加速度から1日あたりの再生数の増加を取得（期間の長いものを優先）"""
+    if not velocity:
+        return None
+    for window in sorted(velocity, key=lambda window: int(window.rstrip('d')), reverse=True):
+        if velocity[window] is not None:
+            return velocity[window]['views']
+    return None
+
+
+def plan_refresh(videos: Dict[str, str], refreshed_at: Dict[str, str], now: datetime,
+                 velocities: Optional[Dict[str, Dict[str, Any]]] = None,
+                 quota_budget: Optional[int] = None) -> Tuple[List[str], Dict[str, Any]]:
+    """既知の動画（{動画ID: 公開日時}）のうち今回の実行で更新する動画を選ぶ
+
+    各動画を階層に割り当て、前回の更新から階層の更新間隔（REFRESH_SLACKの割合だけ短くした間隔）が
+    経過した動画を対象にする（未更新の動画は常に対象）。quota_budget（ユニット）で更新できる数を超える場合は
+    上位の階層・更新が遅れている動画を優先し、残りは見送ってレポートに含める。
+    更新する動画IDと階層ごとの件数のレポートを返す。
+    """
+    velocities = velocities or {}
+    intervals = {tier: interval_hours * 3600 for tier, interval_hours, _, _ in REFRESH_TIERS}
+    tier_rank = {tier: rank for rank, (tier, _, _, _) in enumerate(REFRESH_TIERS)}
+    report = {tier: {'known': 0, 'due': 0, 'refreshed': 0, 'skipped': 0} for tier in tier_rank}
+
+    due = []
+    for video_id, published_at in videos.items():
+        age_days = (now - parse_timestamp(published_at)).total_seconds() / 86400
+        tier = assign_tier(age_days, get_daily_views(velocities.get(video_id)))
+        report[tier]['known'] += 1
+        last_refreshed = refreshed_at.get(video_id)
+        if last_refreshed is None:
+            overdue = float('inf')
+        else:
+            overdue = (now - parse_timestamp(last_refreshed)).total_seconds() / intervals[tier]
+            if overdue < 1 - REFRESH_SLACK:
+                continue
+        report[tier]['due'] += 1
+        due.append((tier_rank[tier], -overdue, video_id, tier))
+
+    due.sort()
+    limit = None if quota_budget is None else max(0, quota_budget) * VIDEOS_PER_UNIT
+    selected = due if limit is None else due[:limit]
+    skipped = [] if limit is None else due[limit:]
+    for _, _, _, tier in selected:
+        report[tier]['refreshed'] += 1
+    for _, _, _, tier in skipped:
+        report[tier]['skipped'] += 1
+
+    summary = {
+        'tiers': report,
+        'planned_quota': -(-len(selected) // VIDEOS_PER_UNIT),
+        'quota_budget': quota_budget,
+        'skipped': len(skipped),
+        'skipped_video_ids': [video_id for _, _, video_id, _ in skipped[:MAX_REPORTED_SKIPS]]
+    }
+    return [video_id for _, _, video_id, _ in selected], summary
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# キャッシュの既定値
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+# この回数の保存ごとに古いエントリの削除を行う
+EVICTION_INTERVAL = 100
+
+
+class CachedResponse:
+    """キャッシュされたAPIレスポンス"""
+
+    def __init__(self, key: str, etag: Optional[str], body: Dict[str, Any], stored_at: float, ttl_seconds: float):
+        self.key = key
+        self.etag = etag
+        self.body = body
+        self.stored_at = stored_at
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def is_fresh(self) -> bool:
+        """TTL以内でリクエストせずにそのまま使えるかどうか"""
+        return time.time() - self.stored_at < self.ttl_seconds
+
+
+class ResponseCache:
+    """APIレスポンスをETagとともに保存する永続キャッシュ（SQLite）
+
+    TTL以内のエントリはリクエストせずに返し、TTLを過ぎたエントリは
+    If-None-Matchで再検証する（304の場合はキャッシュを返す）。
+    エントリ数がmax_entriesを超えた場合は最後に使われた日時が古いものから削除する。
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.counters = {'fresh_hits': 0, 'not_modified': 0, 'changed': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._puts_since_eviction = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                etag TEXT,
+                body TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_last_used_at ON responses (last_used_at)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(method: str, params: Dict[str, Any]) -> str:
+        """APIメソッドとリクエストパラメータからキャッシュキーを作成"""
+        canonical = json.dumps([method, sorted(params.items())], ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """キャッシュされたレスポンスを取得（存在しない場合はNone）"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT etag, body, stored_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+            self._conn.execute('UPDATE responses SET last_used_at = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+        etag, body, stored_at = row
+        return CachedResponse(key, etag, json.loads(body), stored_at, self.ttl_seconds)
+
+    def record(self, counter: str) -> None:
+        """キャッシュの使用結果（fresh_hits / changed）を記録"""
+        with self._lock:
+            self.counters[counter] += 1
+
+    def mark_not_modified(self, entry: CachedResponse) -> None:
+        """304で再検証できたエントリの保存日時を更新"""
+        with self._lock:
+            self.counters['not_modified'] += 1
+            self._conn.execute('UPDATE responses SET stored_at = ? WHERE key = ?', (time.time(), entry.key))
+            self._conn.commit()
+
+    def put(self, key: str, method: str, body: Dict[str, Any]) -> None:
+        """レスポンスを保存（ETagはレスポンス本文のetagを使用）"""
+        now = time.time()
+        with self._lock:
+            self.counters['stores'] += 1
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, method, etag, body, stored_at, last_used_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, method, body.get('etag'), json.dumps(body, ensure_ascii=False), now, now)
+            )
+            self._puts_since_eviction += 1
+            if self._puts_since_eviction >= EVICTION_INTERVAL:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """古いエントリと上限を超えたエントリを削除（ロック取得済みで呼び出す）"""
+        self._puts_since_eviction = 0
+        deleted = self._conn.execute(
+            'DELETE FROM responses WHERE stored_at < ?', (now - self.max_age_seconds,)
+        ).rowcount
+        deleted += self._conn.execute(
+            'DELETE FROM responses WHERE key IN ('
+            '  SELECT key FROM responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?'
+            ')', (self.max_entries,)
+        ).rowcount
+        self.counters['evictions'] += deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット・ミスの件数とヒット率"""
+        with self._lock:
+            counters = dict(self.counters)
+            counters['entries'] = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        lookups = counters['fresh_hits'] + counters['not_modified'] + counters['changed'] + counters['misses']
+        counters['hit_rate'] = round((counters['fresh_hits'] + counters['not_modified']) / lookups, 3) if lookups else 0
+        return counters
+
+    def close(self) -> None:
+        """データベース接続を閉じる"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+
+from metrics import metrics
+
+# S3のマルチパートアップロードで最後以外のパートに必要な最小サイズ
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# S3オブジェクトを読み込む際のチャンクサイズ
+READ_CHUNK_SIZE = 1024 * 1024
+
+# 初回利用時に作成するS3クライアント
+_s3_client = None
+_client_lock = threading.Lock()
+
+
+# 送信するデータの引数（Body）のバイト数を記録する操作
+UPLOAD_OPERATIONS = {'put_object', 'upload_part'}
+
+
+class InstrumentedS3Client:
+    """S3クライアントの操作ごとのリクエスト数・送受信バイト数・処理時間をmetricsに記録するラッパー
+
+    書き込み（put_object・upload_part・upload_file・complete_multipart_upload）は処理段階upload、
+    読み込み（get_object・download_file）は処理段階downloadとして計測する。
+    それ以外の属性（exceptionsなど）は元のクライアントのものをそのまま返す。
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.client, name)
+        if name in UPLOAD_OPERATIONS or name in ('complete_multipart_upload', 'upload_file'):
+            return self._wrap(name, attribute, 'upload')
+        if name in ('get_object', 'download_file'):
+            return self._wrap(name, attribute, 'download')
+        return attribute
+
+    def _wrap(self, name: str, operation: Callable[..., Any], stage: str) -> Callable[..., Any]:
+        def call(*args: Any, **kwargs: Any) -> Any:
+            with metrics.stage(stage):
+                started = time.perf_counter()
+                response = operation(*args, **kwargs)
+                seconds = time.perf_counter() - started
+            bytes_out = bytes_in = 0
+            if name in UPLOAD_OPERATIONS:
+                bytes_out = len(kwargs.get('Body') or b'')
+            elif name == 'upload_file':
+                bytes_out = os.path.getsize(kwargs.get('Filename') or args[0])
+            elif name == 'get_object':
+                bytes_in = response.get('ContentLength') or 0
+            elif name == 'download_file':
+                bytes_in = os.path.getsize(kwargs.get('Filename') or args[2])
+            metrics.record_s3(name, seconds, bytes_out, bytes_in)
+            return response
+        return call
+
+
+def get_s3_client() -> Any:
+    """S3クライアントを取得（初回呼び出し時にboto3をimportして作成し、キャッシュ）"""
+    global _s3_client
+    if _s3_client is None:
+        with _client_lock:
+            if _s3_client is None:
+                import boto3
+                _s3_client = InstrumentedS3Client(boto3.client('s3', region_name='ap-northeast-1'))
+    return _s3_client
+
+
+def set_s3_client(client: Any) -> None:
+    """S3クライアントを差し替える（ローカル検証用。metricsへの記録は差し替えたクライアントにも適用する）"""
+    global _s3_client
+    _s3_client = InstrumentedS3Client(client)
+
+
+class S3MultipartWriter:
+    """S3のマルチパートアップロードで逐次書き込むファイルライクオブジェクト
+
+    バッファがpart_sizeに達するごとにパートをアップロードするため、
+    書き込むデータ全体をメモリに保持しない。
+    part_size未満で閉じた場合は通常のput_objectで1回だけアップロードする。
+    """
+
+    def __init__(self, s3_client: Any, bucket: str, key: str, part_size: int = MIN_PART_SIZE,
+                 content_type: Optional[str] = None):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f'part_size must be at least {MIN_PART_SIZE} bytes')
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.content_type = content_type
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._closed = False
+
+    def write(self, data: Union[bytes, str]) -> int:
+        """データをバッファに追加し、1パート分たまったらアップロード"""
+        if self._closed:
+            raise ValueError('write to closed S3MultipartWriter')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def _upload_part(self, body: bytes) -> None:
+        """1パート分のデータをアップロード"""
+        if self._upload_id is None:
+            params = {'Bucket': self.bucket, 'Key': self.key}
+            if self.content_type:
+                params['ContentType'] = self.content_type
+            self._upload_id = self.s3_client.create_multipart_upload(**params)['UploadId']
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+    def close(self) -> None:
+        """残りのデータをアップロードしてオブジェクトを確定"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._upload_id is None:
+            params = {'Bucket': self.bucket, 'Key': self.key, 'Body': bytes(self._buffer)}
+            if self.content_type:
+                params['ContentType'] = self.content_type
+            self.s3_client.put_object(**params)
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts}
+            )
+            # 確定したアップロードはabortの対象にしない
+            self._upload_id = None
+        self._buffer = bytearray()
+
+    def abort(self) -> None:
+        """アップロードを中止し、アップロード済みのパートを破棄"""
+        self._closed = True
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+
+    def __enter__(self) -> 'S3MultipartWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_object_chunks(s3_client: Any, bucket: str, key: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """S3オブジェクトの内容をチャンクごとに読み込む"""
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+    try:
+        for chunk in body.iter_chunks(chunk_size=chunk_size):
+            yield chunk
+    finally:
+        body.close()
+
+
+def list_objects(s3_client: Any, bucket: str, prefix: str) -> Iterator[Dict[str, Any]]:
+    """プレフィックス配下のオブジェクト（Key・Size・ETagなどの辞書）をキーの昇順に列挙"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        yield from page.get('Contents', [])
+
+
+def list_object_keys(s3_client: Any, bucket: str, prefix: str) -> Iterator[str]:
+    """プレフィックス配下のオブジェクトキーを昇順に列挙"""
+    for obj in list_objects(s3_client, bucket, prefix):
+        yield obj['Key']
@@ -0,0 +1,260 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from s3_stream import iter_object_chunks
+
+# 記録するカウンター（snapshotsテーブルの差分列とlatestテーブルの値の列）
+COUNTERS = ('views', 'likes', 'comments')
+
+# 再生数などの増加速度を計算する期間（日数）の既定値
+DEFAULT_VELOCITY_WINDOWS = (1, 7, 30)
+
+# SQLiteの1つのクエリで指定する動画IDの上限（変数の上限より小さくする）
+QUERY_BATCH_SIZE = 500
+
+SECONDS_PER_DAY = 86400
+
+
+def to_epoch(value: datetime) -> int:
+    """datetimeをUNIX時間（秒）に変換"""
+    return int(value.timestamp())
+
+
+def from_epoch(value: int) -> str:
+    """UNIX時間（秒）をISO 8601形式（UTC）の文字列に変換"""
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+class SnapshotStore:
+    """動画の統計情報の時系列を保存するストア（SQLite）
+
+    snapshotsテーブルには前回から変化したカウンターのみを差分として保存し
+    （変化のないカウンターはNULL、変化のない取得では行を追加しない）、
+    latestテーブルに動画ごとの最新値と最後に確認した日時を保持する。
+    snapshotsの主キーは(video_id, fetched_at)のため、動画ごとの系列の取得はインデックスで行う。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                video_id TEXT NOT NULL,
+                fetched_at INTEGER NOT NULL,
+                views INTEGER,
+                likes INTEGER,
+                comments INTEGER,
+                PRIMARY KEY (video_id, fetched_at)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS latest (
+                video_id TEXT PRIMARY KEY,
+                first_fetched_at INTEGER NOT NULL,
+                changed_at INTEGER NOT NULL,
+                checked_at INTEGER NOT NULL,
+                views INTEGER NOT NULL,
+                likes INTEGER NOT NULL,
+                comments INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def _fetch_latest(self, video_ids: List[str]) -> Dict[str, Tuple[Any, ...]]:
+        """動画IDごとのlatestテーブルの行を取得（ロック取得済みで呼び出す）"""
+        rows = {}
+        for start in range(0, len(video_ids), QUERY_BATCH_SIZE):
+            batch = video_ids[start:start + QUERY_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            for row in self._conn.execute(
+                f'SELECT video_id, first_fetched_at, changed_at, checked_at, views, likes, comments '
+                f'FROM latest WHERE video_id IN ({placeholders})', batch
+            ):
+                rows[row[0]] = row
+        return rows
+
+    def record(self, fetched_at: datetime, counters: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+        """1回の取得で得た動画ごとのカウンター（{動画ID: {'views': ..., 'likes': ..., 'comments': ...}}）を記録
+
+        前回から変化したカウンターのみを差分として保存する。
+        記録した件数（new: 初回、changed: 変化あり、unchanged: 変化なし）を返す。
+        """
+        timestamp = to_epoch(fetched_at)
+        result = {'new': 0, 'changed': 0, 'unchanged': 0}
+        with self._lock:
+            latest = self._fetch_latest(list(counters))
+            snapshot_rows = []
+            latest_rows = []
+            for video_id, values in counters.items():
+                current = [int(values.get(counter, 0)) for counter in COUNTERS]
+                previous = latest.get(video_id)
+                if previous is None:
+                    # 初回は値そのものを0からの差分として保存
+                    result['new'] += 1
+                    snapshot_rows.append((video_id, timestamp, *current))
+                    latest_rows.append((video_id, timestamp, timestamp, timestamp, *current))
+                    continue
+                if timestamp <= previous[3]:
+                    # 同じ時刻またはそれより前の取得は記録済みとして扱う
+                    result['unchanged'] += 1
+                    continue
+                deltas = [value - old if value != old else None for value, old in zip(current, previous[4:])]
+                if any(delta is not None for delta in deltas):
+                    result['changed'] += 1
+                    snapshot_rows.append((video_id, timestamp, *deltas))
+                    changed_at = timestamp
+                else:
+                    result['unchanged'] += 1
+                    changed_at = previous[2]
+                latest_rows.append((video_id, previous[1], changed_at, timestamp, *current))
+
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO snapshots (video_id, fetched_at, views, likes, comments) '
+                'VALUES (?, ?, ?, ?, ?)', snapshot_rows
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO latest '
+                '(video_id, first_fetched_at, changed_at, checked_at, views, likes, comments) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', latest_rows
+            )
+            self._conn.commit()
+        return result
+
+    def latest(self, video_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """動画ごとの最新値（video_idsを省略した場合は全動画）"""
+        with self._lock:
+            if video_ids is None:
+                rows = self._conn.execute(
+                    'SELECT video_id, first_fetched_at, changed_at, checked_at, views, likes, comments FROM latest'
+                ).fetchall()
+            else:
+                rows = list(self._fetch_latest(list(video_ids)).values())
+        return {
+            row[0]: {
+                'first_fetched_at': from_epoch(row[1]),
+                'changed_at': from_epoch(row[2]),
+                'checked_at': from_epoch(row[3]),
+                **dict(zip(COUNTERS, row[4:]))
+            }
+            for row in rows
+        }
+
+    def series(self, video_id: str) -> List[Dict[str, Any]]:
+        """1つの動画の値の系列（差分を累積した各時点の値）を古い順に返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT fetched_at, views, likes, comments FROM snapshots WHERE video_id = ? ORDER BY fetched_at',
+                (video_id,)
+            ).fetchall()
+        values = dict.fromkeys(COUNTERS, 0)
+        series = []
+        for fetched_at, *deltas in rows:
+            for counter, delta in zip(COUNTERS, deltas):
+                if delta is not None:
+                    values[counter] += delta
+            series.append({'fetched_at': from_epoch(fetched_at), **values})
+        return series
+
+    def _values_at(self, video_ids: List[str], timestamp: int) -> Dict[str, List[int]]:
+        """各動画の指定時刻時点の値（差分の累積）を取得（ロック取得済みで呼び出す）"""
+        values = {}
+        for start in range(0, len(video_ids), QUERY_BATCH_SIZE):
+            batch = video_ids[start:start + QUERY_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            for video_id, *sums in self._conn.execute(
+                f'SELECT video_id, TOTAL(views), TOTAL(likes), TOTAL(comments) FROM snapshots '
+                f'WHERE video_id IN ({placeholders}) AND fetched_at <= ? GROUP BY video_id',
+                (*batch, timestamp)
+            ):
+                values[video_id] = [int(value) for value in sums]
+        return values
+
+    def velocities(self, video_ids: Iterable[str],
+                   windows: Iterable[int] = DEFAULT_VELOCITY_WINDOWS) -> Dict[str, Dict[str, Optional[Dict[str, float]]]]:
+        """各動画の直近の期間（日数）ごとの1日あたりの増加数
+
+        期間の開始時点の値は保存された差分から復元し、最後に確認した時点の値との差を
+        経過日数で割る。最初の取得が期間の開始より後の場合は最初の取得からの増加数を使用し、
+        取得が1回のみの動画はNoneを返す。
+        """
+        video_ids = list(video_ids)
+        result = {}
+        with self._lock:
+            latest = self._fetch_latest(video_ids)
+            checked_at = {row[3] for row in latest.values()}
+            # 期間の開始時点の値（最後に確認した時刻ごとにまとめて取得）
+            starts = {}
+            for now in checked_at:
+                ids = [video_id for video_id, row in latest.items() if row[3] == now]
+                for window in windows:
+                    starts[(now, window)] = self._values_at(ids, now - window * SECONDS_PER_DAY)
+
+        for video_id in video_ids:
+            row = latest.get(video_id)
+            if row is None:
+                continue
+            first_fetched_at, now, current = row[1], row[3], row[4:]
+            result[video_id] = {}
+            for window in windows:
+                window_start = now - window * SECONDS_PER_DAY
+                if first_fetched_at <= window_start:
+                    base_time, base = window_start, starts[(now, window)][video_id]
+                else:
+                    base_time, base = first_fetched_at, None
+                elapsed_days = (now - base_time) / SECONDS_PER_DAY
+                if elapsed_days <= 0:
+                    result[video_id][f'{window}d'] = None
+                    continue
+                if base is None:
+                    # 最初の取得時点の値（初回の行は値そのもの）
+                    base = self._first_values(video_id)
+                result[video_id][f'{window}d'] = {
+                    counter: round((value - old) / elapsed_days, 3)
+                    for counter, value, old in zip(COUNTERS, current, base)
+                }
+        return result
+
+    def _first_values(self, video_id: str) -> List[int]:
+        """最初の取得時点の値"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT views, likes, comments FROM snapshots WHERE video_id = ? ORDER BY fetched_at LIMIT 1',
+                (video_id,)
+            ).fetchone()
+        return [value or 0 for value in row] if row else [0] * len(COUNTERS)
+
+    def close(self) -> None:
+        """データベース接続を閉じる"""
+        with self._lock:
+            self._conn.close()
+
+
+def download_snapshot_store(s3_client: Any, bucket: str, key: str, path: str) -> SnapshotStore:
+    """S3に保存されたスナップショットのデータベースをダウンロードして開く（存在しない場合は新規作成）"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        with open(path, 'wb') as f:
+            for chunk in iter_object_chunks(s3_client, bucket, key):
+                f.write(chunk)
+        print(f"Downloaded snapshot store from s3://{bucket}/{key}")
+    except s3_client.exceptions.NoSuchKey:
+        os.remove(path)
+        print(f"No snapshot store found at s3://{bucket}/{key}, creating a new one")
+    return SnapshotStore(path)
+
+
+def upload_snapshot_store(store: SnapshotStore, s3_client: Any, bucket: str, key: str) -> None:
+    """スナップショットのデータベースを閉じてS3にアップロード"""
+    store.close()
+    s3_client.upload_file(store.path, bucket, key)
+    print(f"Uploaded snapshot store to s3://{bucket}/{key}")
@@ -0,0 +1,52 @@
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+# 残り時間がこの秒数を下回ったら新しい処理を始めずに中断する（出力の保存に使う時間）
+DEFAULT_RESERVE_SECONDS = float(os.environ.get('TIME_BUDGET_RESERVE_SECONDS', '60'))
+
+
+class TimeBudgetExceeded(Exception):
+    """実行時間の上限が近づいたため処理を中断した
+
+    resumeに再開に必要な情報（年、次のページトークン、未処理の動画IDなど）を保持する。
+    """
+
+    def __init__(self, resume: Dict[str, Any]):
+        super().__init__('Time budget exceeded')
+        self.resume = resume
+
+
+class TimeBudget:
+    """実行時間の残りを管理する
+
+    Lambdaではcontext.get_remaining_time_in_millis()を、ローカルでは指定した秒数からの経過時間を使用する。
+    残り時間が不明な場合は中断しない。
+    """
+
+    def __init__(self, remaining_ms: Optional[Callable[[], int]] = None,
+                 reserve_seconds: float = DEFAULT_RESERVE_SECONDS):
+        self._remaining_ms = remaining_ms
+        self.reserve_seconds = reserve_seconds
+
+    @classmethod
+    def from_context(cls, context: Any, seconds: Optional[float] = None,
+                     reserve_seconds: float = DEFAULT_RESERVE_SECONDS) -> 'TimeBudget':
+        """Lambdaのcontext、またはローカル実行用の秒数から作成"""
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            return cls(context.get_remaining_time_in_millis, reserve_seconds)
+        if seconds:
+            deadline = time.monotonic() + float(seconds)
+            return cls(lambda: int((deadline - time.monotonic()) * 1000), reserve_seconds)
+        return cls(None, reserve_seconds)
+
+    def remaining_seconds(self) -> Optional[float]:
+        """残り時間（秒）。不明な場合はNone"""
+        if self._remaining_ms is None:
+            return None
+        return self._remaining_ms() / 1000
+
+    def expired(self) -> bool:
+        """残り時間が予備の時間を下回ったかどうか"""
+        remaining = self.remaining_seconds()
+        return remaining is not None and remaining < self.reserve_seconds
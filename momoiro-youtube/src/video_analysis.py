@@ -0,0 +1,208 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from keyword_engine import KeywordEngine
+
+# 日本時間（夏時間がないため固定オフセットで扱う）
+JST = timezone(timedelta(hours=9), 'JST')
+
+# 曜日名（datetime.weekday()の値の順、strftime('%A')と同じ表記）
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# CSVの列名とタイトル分類のカテゴリの対応
+TITLE_FLAG_COLUMNS = {
+    'is_live': 'ライブ',
+    'is_mv': 'MV',
+    'is_digest': 'ダイジェスト',
+    'is_event': 'イベント',
+    'has_member_name': 'メンバー',
+}
+
+# YouTubeの動画時間（例: PT1H2M3S、P1DT2H）の形式
+_DURATION_PATTERN = re.compile(
+    r'^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?'
+    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$'
+)
+_DURATION_UNITS = {'weeks': 604800, 'days': 86400, 'hours': 3600, 'minutes': 60, 'seconds': 1}
+
+# 分析結果の列（動画と同じ順序で並ぶ。分析していない動画の値はNone）
+ANALYSIS_COLUMNS = [
+    'year', 'month', 'day', 'hour', 'weekday', 'time_of_day', 'duration_seconds',
+    'view_count', 'like_count', 'comment_count',
+    'daily_avg_views', 'daily_avg_likes', 'daily_avg_comments', 'total_engagement',
+]
+
+
+def parse_timestamp(value: str) -> datetime:
+    """RFC3339形式の日時文字列をdatetimeに変換（標準ライブラリで解析できない形式のみdateutilを使用）"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        from dateutil.parser import parse
+        return parse(value)
+
+
+def parse_duration_seconds(duration: str) -> int:
+    """ISO 8601形式の動画時間を秒数に変換（YouTubeの形式以外はisodateを使用）"""
+    match = _DURATION_PATTERN.match(duration)
+    if match is None or duration in ('P', 'PT'):
+        import isodate
+        return int(isodate.parse_duration(duration).total_seconds())
+    return int(sum(float(value) * _DURATION_UNITS[unit] for unit, value in match.groupdict().items() if value))
+
+
+def get_time_of_day(hour: int) -> str:
+    """時刻（日本時間）から時間帯を判定"""
+    if 5 <= hour < 12:
+        return 'morning'
+    if 12 <= hour < 17:
+        return 'afternoon'
+    if 17 <= hour < 22:
+        return 'evening'
+    return 'night'
+
+
+class VideoAnalysisBatch:
+    """1回の実行で取得した動画の分析結果を列ごとのリストで保持する
+
+    すべての行で同じ基準時刻（reference_time）を使用するため、
+    recorded_atと公開からの日数の計算が実行中の時刻の進みによってずれない。
+    """
+
+    def __init__(self, videos: List[Dict[str, Any]], reference_time: datetime,
+                 columns: Dict[str, List[Any]], title_flags: Dict[str, List[Optional[bool]]]):
+        self.videos = videos
+        self.reference_time = reference_time
+        self.columns = columns
+        self.title_flags = title_flags
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    @property
+    def recorded_at(self) -> str:
+        """CSVのrecorded_at（基準時刻の日本時間）"""
+        return self.reference_time.astimezone(JST).strftime('%Y-%m-%d %H:%M:%S')
+
+    def total(self, column: str) -> int:
+        """分析済みの動画について列の合計を計算"""
+        return sum(value for value in self.columns[column] if value is not None)
+
+    def iter_csv_rows(self) -> Iterator[Dict[str, Any]]:
+        """CSV行用のフラットな辞書を動画の順に返す"""
+        recorded_at = self.recorded_at
+        columns = self.columns
+        # 分類に存在しないカテゴリの列はFalse
+        missing_flags = [False] * len(self)
+        flag_columns = {column: self.title_flags.get(category, missing_flags)
+                        for column, category in TITLE_FLAG_COLUMNS.items()}
+        for index, video in enumerate(self.videos):
+            row = {
+                'video_id': video.get('video_id', ''),
+                'title': video.get('title', ''),
+                'status': video.get('status', 'UNKNOWN'),
+                'recorded_at': recorded_at,
+                'channel_id': video.get('channel_id', '')
+            }
+            # エラーが発生した場合は、エラーメッセージを追加
+            if video.get('status') == 'FETCH_ERROR':
+                row['error_message'] = video.get('error_message', '')
+                yield row
+                continue
+            # 分析できなかった動画は基本情報のみ
+            if columns['year'][index] is None:
+                yield row
+                continue
+
+            row['published_at'] = video.get('published_at', '')
+            for column in ANALYSIS_COLUMNS:
+                row[column] = columns[column][index]
+            for column in ('daily_avg_views', 'daily_avg_likes', 'daily_avg_comments'):
+                row[column] = round(row[column], 2)
+            for column, flags in flag_columns.items():
+                row[column] = flags[index]
+            yield row
+
+    @classmethod
+    def concat(cls, batches: List['VideoAnalysisBatch'], reference_time: datetime) -> 'VideoAnalysisBatch':
+        """同じ基準時刻で分析した複数のバッチを1つにまとめる"""
+        videos = [video for batch in batches for video in batch.videos]
+        columns = {column: [value for batch in batches for value in batch.columns[column]]
+                   for column in ANALYSIS_COLUMNS}
+        categories = {category for batch in batches for category in batch.title_flags}
+        title_flags = {category: [value for batch in batches
+                                  for value in batch.title_flags.get(category, [None] * len(batch))]
+                       for category in categories}
+        return cls(videos, reference_time, columns, title_flags)
+
+
+def analyze_videos(videos: List[Dict[str, Any]], reference_time: datetime,
+                   title_engine: KeywordEngine) -> VideoAnalysisBatch:
+    """動画データをまとめて分析し、列ごとの分析結果を返す
+
+    取得に成功した動画には従来と同じ形式の分析データ（analysis）も付与する。
+    分析に失敗した動画はstatusをANALYSIS_ERRORにする。
+    """
+    columns = {column: [None] * len(videos) for column in ANALYSIS_COLUMNS}
+    title_flags = {category: [None] * len(videos) for category in title_engine.categories}
+
+    # タイトルはまとめて分類する
+    title_counts = title_engine.count_batch(video.get('title', '') for video in videos)
+
+    for index, video in enumerate(videos):
+        if video.get('status') != 'SUCCESS':
+            continue
+        try:
+            published_at = parse_timestamp(video['published_at'])
+            published_at_jst = published_at.astimezone(JST)
+            duration_seconds = parse_duration_seconds(video['duration'])
+            stats = {k: int(v) for k, v in video['statistics'].items() if v.isdigit()}
+        except Exception as e:
+            print(f"Warning: Analysis failed for video {video.get('video_id')}: {str(e)}")
+            video['status'] = 'ANALYSIS_ERROR'  # 分析失敗
+            continue
+
+        # 基準時刻との差分（0除算を防ぐため最小1日）
+        days_since_published = (reference_time - published_at).days or 1
+        views = stats.get('viewCount', 0)
+        likes = stats.get('likeCount', 0)
+        comments = stats.get('commentCount', 0)
+        hour = published_at_jst.hour
+        values = {
+            'year': published_at_jst.year,
+            'month': published_at_jst.month,
+            'day': published_at_jst.day,
+            'hour': hour,
+            'weekday': WEEKDAY_NAMES[published_at_jst.weekday()],
+            'time_of_day': get_time_of_day(hour),
+            'duration_seconds': duration_seconds,
+            'view_count': views,
+            'like_count': likes,
+            'comment_count': comments,
+            'daily_avg_views': views / days_since_published,
+            'daily_avg_likes': likes / days_since_published,
+            'daily_avg_comments': comments / days_since_published,
+            'total_engagement': views + likes + comments,
+        }
+        for column, value in values.items():
+            columns[column][index] = value
+        title_analysis = {category: count > 0 for category, count in title_counts[index].items()}
+        for category, matched in title_analysis.items():
+            title_flags[category][index] = matched
+
+        # JSON出力用の分析データ
+        video['analysis'] = {
+            'published_info': {column: values[column]
+                               for column in ('year', 'month', 'day', 'hour', 'weekday', 'time_of_day')},
+            'duration_seconds': duration_seconds,
+            'title_analysis': title_analysis,
+            'daily_average': {
+                'views': values['daily_avg_views'],
+                'likes': values['daily_avg_likes'],
+                'comments': values['daily_avg_comments']
+            },
+            'total_engagement': values['total_engagement']
+        }
+
+    return VideoAnalysisBatch(videos, reference_time, columns, title_flags)
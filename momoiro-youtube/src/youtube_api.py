@@ -0,0 +1,334 @@
+import json
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from metrics import metrics
+
+if TYPE_CHECKING:
+    import httplib2
+    from googleapiclient.errors import HttpError
+    from response_cache import ResponseCache
+
+# 同梱の静的ディスカバリドキュメント（使用するメソッドのみに絞ったもの）
+DISCOVERY_DOCUMENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'discovery', 'youtube.v3.json')
+
+# APIメソッドごとのクォータ消費量（記載のないメソッドは1ユニット）
+QUOTA_COSTS = {
+    'search.list': 100,
+    'videos.list': 1,
+    'channels.list': 1,
+    'playlistItems.list': 1,
+    'commentThreads.list': 1,
+    'comments.list': 1,
+}
+
+# APIメソッドごとに取得するフィールド（部分レスポンス）
+# 各収集処理が実際に参照するフィールドのみを指定し、説明文や全サイズのサムネイルなどを受信しない
+RESPONSE_FIELDS = {
+    'search.list': 'nextPageToken,items(id(kind,videoId),'
+                   'snippet(title,description,publishedAt,channelTitle,thumbnails/high/url))',
+    'channels.list': 'items(contentDetails/relatedPlaylists/uploads)',
+    'playlistItems.list': 'nextPageToken,items(contentDetails(videoId,videoPublishedAt))',
+    'commentThreads.list': 'nextPageToken,'
+                           'items(snippet/topLevelComment/snippet(authorDisplayName,textDisplay,likeCount,publishedAt))',
+    'comments.list': 'nextPageToken,items(id,snippet(authorDisplayName,textDisplay,likeCount,publishedAt,parentId))',
+}
+
+# commentThreads.listでrepliesも取得する場合のフィールド（返信を展開するためにスレッドのIDと返信数も取得する）
+COMMENT_THREAD_REPLY_FIELDS = (
+    'nextPageToken,items(id,snippet(totalReplyCount,'
+    'topLevelComment(id,snippet(authorDisplayName,textDisplay,likeCount,publishedAt))),'
+    'replies/comments(id,snippet(authorDisplayName,textDisplay,likeCount,publishedAt,parentId)))'
+)
+
+# videos.listはpartの指定に応じて取得するフィールド
+VIDEO_PART_FIELDS = {
+    'snippet': 'snippet(title,description,publishedAt,channelTitle,thumbnails/high/url)',
+    'statistics': 'statistics(viewCount,likeCount,commentCount)',
+    'contentDetails': 'contentDetails/duration',
+}
+
+# リトライ対象とする403エラーの理由
+RETRYABLE_REASONS = {'quotaExceeded', 'rateLimitExceeded', 'userRateLimitExceeded'}
+
+# リトライ設定
+MAX_RETRIES = int(os.environ.get('YOUTUBE_MAX_RETRIES', '5'))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 32.0
+
+# HTTP接続のタイムアウト（秒）
+HTTP_TIMEOUT_SECONDS = 30
+
+
+def _get_quota_budget() -> Optional[int]:
+    """1日（太平洋時間）に使用するクォータユニットの上限（YOUTUBE_QUOTA_BUDGET、空文字で無制限）"""
+    value = os.environ.get('YOUTUBE_QUOTA_BUDGET', '10000')
+    return int(value) if value else None
+
+
+QUOTA_BUDGET = _get_quota_budget()
+
+
+class QuotaBudgetExceeded(Exception):
+    """1回の実行で使用できるクォータの上限に達した"""
+
+
+class RateLimiter:
+    """トークンバケット方式のリクエスト数制限とクォータ使用量の管理
+
+    複数スレッドから共有して使用する。
+    """
+
+    def __init__(self, requests_per_second: float = 10.0, burst: Optional[int] = None,
+                 quota_budget: Optional[int] = None):
+        self.requests_per_second = requests_per_second
+        self.capacity = burst or max(1, int(requests_per_second))
+        self.quota_budget = quota_budget
+        self.quota_used = 0
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: int = 1) -> None:
+        """リクエスト1回分のトークンを取得し、クォータを消費する
+
+        クォータの上限を超える場合はQuotaBudgetExceededを送出する。
+        """
+        with self._lock:
+            if self.quota_budget is not None and self.quota_used + cost > self.quota_budget:
+                raise QuotaBudgetExceeded(
+                    f'Quota budget exceeded: {self.quota_used} + {cost} > {self.quota_budget}')
+            self.quota_used += cost
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated_at) * self.requests_per_second)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.requests_per_second
+            time.sleep(wait)
+
+    def set_rate(self, requests_per_second: float) -> None:
+        """1秒あたりのリクエスト数の上限を変更（複数のプロセスで全体の上限を分け合う場合に使用）"""
+        with self._lock:
+            self.requests_per_second = requests_per_second
+            self.capacity = max(1, int(requests_per_second))
+            self._tokens = min(self._tokens, float(self.capacity))
+
+    def reset_quota(self, quota_budget: Optional[int]) -> None:
+        """クォータ使用量を0に戻し、この実行で使用できる上限を設定（プロセスを再利用する実行ごとに呼び出す）"""
+        with self._lock:
+            self.quota_used = 0
+            self.quota_budget = quota_budget
+
+
+def _create_default_limiter() -> RateLimiter:
+    """環境変数の設定からレート制限を作成"""
+    return RateLimiter(
+        requests_per_second=float(os.environ.get('YOUTUBE_REQUESTS_PER_SECOND', '10')),
+        quota_budget=QUOTA_BUDGET
+    )
+
+
+# プロセス内で共有するレート制限
+rate_limiter = _create_default_limiter()
+
+# スレッドごとのHTTP接続（httplib2.Httpはスレッドセーフではないため）
+_local = threading.local()
+
+# 初回利用時に作成するYouTube APIクライアント
+_youtube_client = None
+_client_lock = threading.Lock()
+
+# レスポンスキャッシュ（YOUTUBE_CACHE_PATH設定時のみ有効。Falseは未初期化を表す）
+_response_cache = False
+
+
+def get_youtube_client() -> Any:
+    """YouTube APIクライアントを取得（初回呼び出し時に作成してキャッシュ）
+
+    ディスカバリドキュメントは同梱の静的ファイルから読み込むため、
+    クライアント作成時にネットワークアクセスは発生しない。
+    """
+    global _youtube_client
+    if _youtube_client is None:
+        with _client_lock:
+            if _youtube_client is None:
+                from googleapiclient.discovery import build_from_document
+                with open(DISCOVERY_DOCUMENT_PATH, encoding='utf-8') as f:
+                    discovery_document = f.read()
+                _youtube_client = build_from_document(
+                    discovery_document,
+                    developerKey=os.environ['YOUTUBE_API_KEY']
+                )
+    return _youtube_client
+
+
+def set_youtube_client(client: Any) -> None:
+    """YouTube APIクライアントを差し替える（ローカル検証用）"""
+    global _youtube_client
+    _youtube_client = client
+
+
+def get_response_cache() -> Optional['ResponseCache']:
+    """レスポンスキャッシュを取得（環境変数YOUTUBE_CACHE_PATHが未設定の場合はNone）"""
+    global _response_cache
+    if _response_cache is False:
+        with _client_lock:
+            if _response_cache is False:
+                path = os.environ.get('YOUTUBE_CACHE_PATH')
+                if path:
+                    from response_cache import ResponseCache, DEFAULT_TTL_SECONDS, DEFAULT_MAX_ENTRIES
+                    _response_cache = ResponseCache(
+                        path,
+                        ttl_seconds=float(os.environ.get('YOUTUBE_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)),
+                        max_entries=int(os.environ.get('YOUTUBE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+                    )
+                else:
+                    _response_cache = None
+    return _response_cache
+
+
+def set_response_cache(cache: Optional['ResponseCache']) -> None:
+    """レスポンスキャッシュを差し替える（Noneで無効化）"""
+    global _response_cache
+    _response_cache = cache
+
+
+def get_http() -> 'httplib2.Http':
+    """現在のスレッド用のHTTP接続を取得
+
+    httplib2.Httpは接続をホストごとに保持して再利用する（keep-alive）ため、
+    同じスレッドからの2回目以降のリクエストはTCP/TLSの確立を省略できる。
+    """
+    http = getattr(_local, 'http', None)
+    if http is None:
+        import httplib2
+        http = httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)
+        _local.http = http
+    return http
+
+
+def get_error_reason(error: 'HttpError') -> str:
+    """HttpErrorのレスポンスからエラー理由を取得"""
+    try:
+        content = json.loads(error.content.decode('utf-8'))
+        return content['error']['errors'][0]['reason']
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return ''
+
+
+def is_retryable(error: 'HttpError') -> bool:
+    """リトライで回復する可能性のあるエラーかどうかを判定"""
+    status = error.resp.status
+    if status == 429 or 500 <= status < 600:
+        return True
+    return status == 403 and get_error_reason(error) in RETRYABLE_REASONS
+
+
+def execute_request(request: Any, method: str, limiter: Optional[RateLimiter] = None,
+                    max_retries: int = MAX_RETRIES) -> Any:
+    """レート制限を適用してAPIリクエストを実行
+
+    一時的なエラー（403 quotaExceeded/rateLimitExceeded、429、5xx、通信エラー）は
+    指数バックオフでリトライする。
+    """
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    limiter = limiter or rate_limiter
+    cost = QUOTA_COSTS.get(method, 1)
+
+    for attempt in range(max_retries + 1):
+        limiter.acquire(cost)
+        started = time.perf_counter()
+        try:
+            response = request.execute(http=get_http())
+            metrics.record_api_call(method, time.perf_counter() - started, cost)
+            return response
+        except HttpError as e:
+            reason = f'HTTP {e.resp.status} {get_error_reason(e)}'.rstrip()
+            retry = attempt < max_retries and is_retryable(e)
+            # 304（キャッシュの再検証）はエラーとして数えない
+            metrics.record_api_call(method, time.perf_counter() - started, cost,
+                                    error=reason if e.resp.status != 304 else None, retried=retry)
+            if not retry:
+                raise
+        except (ConnectionError, TimeoutError, httplib2.HttpLib2Error) as e:
+            reason = type(e).__name__
+            metrics.record_api_call(method, time.perf_counter() - started, cost, error=reason,
+                                    retried=attempt < max_retries)
+            if attempt >= max_retries:
+                raise
+            # 失敗した接続は破棄して次回作り直す
+            _local.http = None
+
+        delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+        delay *= random.uniform(0.5, 1.0)
+        print(f"Retrying {method} after {reason} (attempt {attempt + 1}/{max_retries}, wait {delay:.1f}s)")
+        time.sleep(delay)
+
+
+def get_response_fields(method: str, params: Dict[str, Any]) -> Optional[str]:
+    """APIメソッドとパラメータから部分レスポンスのfields指定を作成"""
+    if method == 'videos.list':
+        parts = [VIDEO_PART_FIELDS[part] for part in params.get('part', '').split(',') if part in VIDEO_PART_FIELDS]
+        return f"items(id,{','.join(parts)})" if parts else 'items(id)'
+    if method == 'commentThreads.list' and 'replies' in params.get('part', '').split(','):
+        return COMMENT_THREAD_REPLY_FIELDS
+    return RESPONSE_FIELDS.get(method)
+
+
+def call(method: str, limiter: Optional[RateLimiter] = None, **params: Any) -> Any:
+    """YouTube APIのメソッドを呼び出す共通処理（例: call('videos.list', part='statistics', id='...')）
+
+    fieldsを指定しない場合は収集処理が参照するフィールドのみの部分レスポンスを要求し、
+    整形なし（prettyPrint=false）のJSONを受信する。
+    レスポンスのgzip圧縮はgoogleapiclientが要求（accept-encoding）し、httplib2が展開する。
+    レスポンスキャッシュが有効な場合はTTL以内のレスポンスをそのまま返し、
+    TTLを過ぎたものはIf-None-Matchで再検証する。
+    """
+    from googleapiclient.errors import HttpError
+
+    resource_name, method_name = method.split('.')
+    cache = get_response_cache()
+    if 'fields' not in params:
+        fields = get_response_fields(method, params)
+        if fields:
+            # キャッシュの再検証に使うetagも取得する
+            params['fields'] = f'etag,{fields}' if cache else fields
+    params.setdefault('prettyPrint', False)
+
+    entry = None
+    if cache:
+        key = cache.make_key(method, params)
+        entry = cache.get(key)
+        if entry and entry.is_fresh:
+            cache.record('fresh_hits')
+            return entry.body
+
+    resource = getattr(get_youtube_client(), resource_name)()
+    request = getattr(resource, method_name)(**params)
+    if entry and entry.etag:
+        request.headers['If-None-Match'] = entry.etag
+
+    try:
+        response = execute_request(request, method, limiter)
+    except HttpError as e:
+        if entry and e.resp.status == 304:
+            cache.mark_not_modified(entry)
+            return entry.body
+        raise
+
+    if cache:
+        if entry:
+            cache.record('changed')
+        cache.put(key, method, response)
+    return response
@@ -1,132 +1,559 @@
 import os
+import re
 import json
 import sys
 import argparse
-from datetime import datetime
-import boto3
-from googleapiclient.discovery import build
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
 from dotenv import load_dotenv
-import csv
+
+from keyword_engine import KeywordEngine, MEMBER_KEYWORDS
+from metrics import metrics
+from s3_stream import S3MultipartWriter, get_s3_client, list_object_keys
+from youtube_api import call
 
 # 環境変数の読み込み
 load_dotenv()
 
-# YouTube APIの設定
-YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
-youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
+# YouTube API・S3クライアントは初回利用時に作成する（youtube_api.call / s3_stream.get_s3_client）
 
 # S3の設定
-s3 = boto3.client('s3', region_name='ap-northeast-1')
 BUCKET_NAME = os.getenv('S3_BUCKET_NAME_GET_COMMENT')
 
+# 複数動画を処理する際の並列数
+COMMENT_WORKERS = int(os.getenv('COMMENT_WORKERS', '4'))
+
+# 返信を展開する場合にcomments.listで返信を取得する並列数（複数動画の処理では全動画で共有する）
+REPLY_WORKERS = int(os.getenv('REPLY_WORKERS', '8'))
+
+# メンバー言及の判定に使用するキーワード（MEMBER_KEYWORDS_PATHでJSONを指定可能）
+MEMBER_KEYWORDS_PATH = os.getenv('MEMBER_KEYWORDS_PATH')
+
+# 取得状態（チェックポイント）を保存するプレフィックス
+CHECKPOINT_PREFIX = 'checkpoints'
+
+# 1つのファイルに書き出すコメント数の目安（ファイルを確定するごとにチェックポイントを保存する）
+COMMENT_SEGMENT_SIZE = int(os.getenv('COMMENT_SEGMENT_SIZE', '50000'))
+
+# CSVのヘッダー行（返信を展開する場合はコメントIDと返信先のIDの列を追加する）
+CSV_HEADER = "author,publishedAt,likeCount,text\n"
+CSV_REPLY_HEADER = "author,publishedAt,likeCount,id,parentId,text\n"
+
 def get_date_folder():
     """実行日付のフォルダ名を生成（yyyy=YYYY/mm=MM/dd=DD形式）"""
     current_time = datetime.now()
     return f"yyyy={current_time.year}/mm={current_time.month:02d}/dd={current_time.day:02d}"
 
-def get_comments(video_id):
-    """動画のコメントを取得"""
-    comments = []
-    next_page_token = None
-    
+def format_comment(item: Dict[str, Any]) -> Dict[str, Any]:
+    """コメントスレッドのレスポンスから保存用のコメントデータを作成"""
+    comment = item['snippet']['topLevelComment']['snippet']
+    return {
+        'author': comment['authorDisplayName'],
+        'text': comment['textDisplay'],
+        'likeCount': comment['likeCount'],
+        'publishedAt': comment['publishedAt']
+    }
+
+def format_linked_comment(comment: Dict[str, Any]) -> Dict[str, Any]:
+    """コメントのリソース（トップレベルのコメント・返信）からIDと返信先のID（parentId）付きのコメントデータを作成"""
+    snippet = comment['snippet']
+    return {
+        'id': comment['id'],
+        'parentId': snippet.get('parentId'),
+        'author': snippet['authorDisplayName'],
+        'text': snippet['textDisplay'],
+        'likeCount': snippet['likeCount'],
+        'publishedAt': snippet['publishedAt']
+    }
+
+def get_inline_replies(item: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """commentThreads.listのrepliesに含まれる返信（返信の一部しか含まれない場合はNone）"""
+    inline = item.get('replies', {}).get('comments', [])
+    if len(inline) < item['snippet'].get('totalReplyCount', 0):
+        return None
+    # repliesは古い順とは限らないため投稿日時の順に並べる
+    return sorted((format_linked_comment(reply) for reply in inline), key=lambda reply: reply['publishedAt'])
+
+def get_thread_replies(thread_id: str) -> List[Dict[str, Any]]:
+    """コメントスレッドの返信をcomments.listですべて取得"""
+    replies = []
+    page_token = None
     while True:
-        try:
-            # コメントスレッドを取得
-            response = youtube.commentThreads().list(
+        with metrics.stage('fetch'):
+            response = call(
+                'comments.list',
                 part='snippet',
+                parentId=thread_id,
+                maxResults=100,
+                pageToken=page_token
+            )
+        replies.extend(format_linked_comment(item) for item in response['items'])
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return replies
+
+def new_checkpoint(video_id: str) -> Dict[str, Any]:
+    """取得状態を初期化したチェックポイントを作成"""
+    return {
+        'video_id': video_id,
+        'status': 'new',
+        'next_page_token': None,
+        'count': 0,
+        'pages': 0,
+        'since': None,
+        'newest_published_at': None,
+        'last_crawled_published_at': None
+    }
+
+def get_checkpoint_key(video_id: str) -> str:
+    """チェックポイントのファイル名（S3キー）を生成"""
+    return f"{CHECKPOINT_PREFIX}/comments_{video_id}.json"
+
+def load_checkpoint(video_id: str, checkpoint_dir: Optional[str] = None) -> Dict[str, Any]:
+    """チェックポイントを読み込む（checkpoint_dir指定時はローカル、それ以外はS3）"""
+    if checkpoint_dir:
+        try:
+            with open(os.path.join(checkpoint_dir, get_checkpoint_key(video_id)), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return new_checkpoint(video_id)
+    
+    s3 = get_s3_client()
+    try:
+        body = s3.get_object(Bucket=BUCKET_NAME, Key=get_checkpoint_key(video_id))['Body'].read()
+        return json.loads(body.decode('utf-8'))
+    except s3.exceptions.NoSuchKey:
+        return new_checkpoint(video_id)
+
+def save_checkpoint(checkpoint: Dict[str, Any], checkpoint_dir: Optional[str] = None) -> None:
+    """チェックポイントを保存（checkpoint_dir指定時はローカル、それ以外はS3）"""
+    checkpoint['updated_at'] = datetime.now().isoformat()
+    body = json.dumps(checkpoint, ensure_ascii=False)
+    key = get_checkpoint_key(checkpoint['video_id'])
+    if checkpoint_dir:
+        path = os.path.join(checkpoint_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中で中断されても壊れないよう一時ファイルから置き換える
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(body)
+        os.replace(path + '.tmp', path)
+    else:
+        get_s3_client().put_object(Bucket=BUCKET_NAME, Key=key, Body=body, ContentType='application/json')
+
+def start_crawl(checkpoint: Dict[str, Any], delta: bool = False, resume: bool = True) -> Dict[str, Any]:
+    """チェックポイントを今回の取得用に準備
+
+    前回の取得が途中で中断された場合や保存に失敗した場合は（resume=Falseでない限り）
+    保存が確定したページの続きから再開する。
+    deltaを指定した場合は前回の取得で最も新しかったコメントより新しいものだけを取得する。
+    """
+    if resume and checkpoint['status'] in ('in_progress', 'failed') and checkpoint.get('next_page_token'):
+        print(f"前回の続きから取得を再開します（取得済み: {checkpoint['count']}件）")
+        return checkpoint
+    
+    checkpoint.update({
+        'status': 'in_progress',
+        'next_page_token': None,
+        'count': 0,
+        'pages': 0,
+        'since': checkpoint.get('last_crawled_published_at') if delta else None,
+        'newest_published_at': None
+    })
+    if checkpoint['since']:
+        print(f"{checkpoint['since']} より新しいコメントのみを取得します")
+    return checkpoint
+
+def iter_comment_pages(video_id: str, checkpoint: Optional[Dict[str, Any]] = None,
+                       on_page: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       reply_pool: Optional[Executor] = None) -> Iterator[List[Dict[str, Any]]]:
+    """動画のコメントを1ページ（最大100件）ずつ新しい順に取得するジェネレータ
+
+    checkpointのnext_page_tokenから取得を始め、各ページを返した後（次のページを要求された時点）に
+    checkpointを更新してon_pageを呼び出す。checkpointのsinceより古いコメントに到達した時点で終了する。
+    checkpointは返したページまでの取得状態のため、保存先への書き込みが確定してから永続化すること。
+    reply_poolを指定した場合は返信も取得し、各スレッドのトップレベルのコメントの後に続けて返す
+    （返信がrepliesにすべて含まれるスレッドはそのまま使い、それ以外はcomments.listの取得をreply_poolで並列に行う）。
+    返信をcomments.listで取得するページでは、返信の取得と並行して次のページを取得する。
+    返信の取得に失敗した場合はそのページを返さずに終了し、再実行時にページごと取得し直す。
+    """
+    if checkpoint is None:
+        checkpoint = start_crawl(new_checkpoint(video_id))
+    next_page_token = checkpoint.get('next_page_token')
+    since = checkpoint.get('since')
+
+    def fetch_threads(page_token: Optional[str]) -> Dict[str, Any]:
+        # コメントスレッドを取得
+        with metrics.stage('fetch'):
+            return call(
+                'commentThreads.list',
+                part='snippet,replies' if reply_pool else 'snippet',
                 videoId=video_id,
                 maxResults=100,
-                pageToken=next_page_token
-            ).execute()
-            
-            for item in response['items']:
-                comment = item['snippet']['topLevelComment']['snippet']
-                comments.append({
-                    'author': comment['authorDisplayName'],
-                    'text': comment['textDisplay'],
-                    'likeCount': comment['likeCount'],
-                    'publishedAt': comment['publishedAt']
-                })
-            
-            next_page_token = response.get('nextPageToken')
-            if not next_page_token:
-                break
-                
+                order='time',
+                pageToken=page_token
+            )
+
+    # 先に取得を始めた次のページ
+    prefetched: Optional[Future] = None
+    while True:
+        try:
+            response = prefetched.result() if prefetched else fetch_threads(next_page_token)
         except Exception as e:
             print(f"エラーが発生しました: {e}")
+            checkpoint['error'] = str(e)
             break
-    
-    return comments
+        prefetched = None
+        
+        # スレッドごとのコメント（返信の取得中のスレッドはFuture）
+        threads: List[Union[List[Dict[str, Any]], Future]] = []
+        reached_since = False
+        for item in response['items']:
+            comment = format_linked_comment(item['snippet']['topLevelComment']) if reply_pool else format_comment(item)
+            # RFC3339（UTC）の文字列はそのまま比較できる
+            if since and comment['publishedAt'] <= since:
+                reached_since = True
+                break
+            threads.append([comment])
+            if reply_pool and item['snippet'].get('totalReplyCount'):
+                replies = get_inline_replies(item)
+                threads.append(replies if replies is not None else reply_pool.submit(get_thread_replies, item['id']))
+        
+        if (not reached_since and response.get('nextPageToken')
+                and any(isinstance(thread, Future) for thread in threads)):
+            prefetched = reply_pool.submit(fetch_threads, response['nextPageToken'])
+        
+        try:
+            comments = [comment for thread in threads
+                        for comment in (thread.result() if isinstance(thread, Future) else thread)]
+        except Exception as e:
+            print(f"返信の取得中にエラーが発生しました: {e}")
+            checkpoint['error'] = str(e)
+            break
+        
+        yield comments
+        
+        # ページの書き出し後に取得状態を更新
+        checkpoint['count'] += len(comments)
+        checkpoint['pages'] += 1
+        # 差分取得の基準はトップレベルのコメントの投稿日時（古いスレッドへの新しい返信は含めない）
+        newest = max((comment['publishedAt'] for comment in comments if not comment.get('parentId')), default=None)
+        if newest and (checkpoint['newest_published_at'] is None or newest > checkpoint['newest_published_at']):
+            checkpoint['newest_published_at'] = newest
+        
+        next_page_token = response.get('nextPageToken')
+        if reached_since or not next_page_token:
+            checkpoint.update({
+                'status': 'complete',
+                'next_page_token': None,
+                'last_crawled_published_at': max(
+                    filter(None, [checkpoint['newest_published_at'], checkpoint.get('last_crawled_published_at')]),
+                    default=None)
+            })
+            checkpoint.pop('error', None)
+        else:
+            checkpoint['next_page_token'] = next_page_token
+        
+        if on_page:
+            on_page(checkpoint)
+        if checkpoint['status'] == 'complete':
+            break
+
+def iter_comments(video_id: str, checkpoint: Optional[Dict[str, Any]] = None,
+                  on_page: Optional[Callable[[Dict[str, Any]], None]] = None,
+                  reply_pool: Optional[Executor] = None) -> Iterator[Dict[str, Any]]:
+    """動画のコメントを1件ずつ取得するジェネレータ"""
+    for page in iter_comment_pages(video_id, checkpoint, on_page, reply_pool):
+        yield from page
+
+def tag_member_mentions(pages: Iterable[List[Dict[str, Any]]],
+                        engine: KeywordEngine) -> Iterator[List[Dict[str, Any]]]:
+    """各コメントに言及しているメンバーの一覧（members）を追加
+
+    1ページ分のコメントをまとめて1回の走査で判定する。
+    """
+    for page in pages:
+        with metrics.stage('analyze'):
+            mentions = engine.matched_categories_batch(comment['text'] for comment in page)
+            for comment, members in zip(page, mentions):
+                comment['members'] = members
+        yield page
+
+def get_member_engine() -> KeywordEngine:
+    """メンバー言及判定用のキーワードエンジンを作成"""
+    if MEMBER_KEYWORDS_PATH:
+        return KeywordEngine.from_file(MEMBER_KEYWORDS_PATH)
+    return KeywordEngine(MEMBER_KEYWORDS)
 
-def save_json_to_s3(comments, video_id, timestamp):
-    """コメントをJSON形式でS3に保存"""
-    json_filename = f"comments_{video_id}_{timestamp}.json"
+def get_comments(video_id, replies=False):
+    """動画のコメントを取得（repliesを指定した場合は返信も取得）"""
+    if not replies:
+        return list(iter_comments(video_id))
+    with ThreadPoolExecutor(max_workers=REPLY_WORKERS) as reply_pool:
+        return list(iter_comments(video_id, reply_pool=reply_pool))
+
+def quote_csv_field(value: str) -> str:
+    """カンマ・ダブルクォート・改行を含む値をCSVの規則で囲む"""
+    if any(char in value for char in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def format_csv_line(comment: Dict[str, Any], linked: bool = False) -> str:
+    """コメントをCSVの1行に変換（linkedの場合はコメントIDと返信先のIDを含める）"""
+    # テキスト内のカンマと改行をエスケープ（ダブルクォートを含む場合は囲む）
+    text = quote_csv_field(comment['text'].replace(',', '，').replace('\n', ' '))
+    # 投稿者名のカンマは置き換えずに囲む
+    author = quote_csv_field(comment['author'])
+    if linked:
+        return (f"{author},{comment['publishedAt']},{comment['likeCount']},"
+                f"{comment['id']},{comment['parentId'] or ''},{text}\n")
+    return f"{author},{comment['publishedAt']},{comment['likeCount']},{text}\n"
+
+def get_last_segment_time(video_id: str) -> Optional[datetime]:
+    """今日のフォルダに保存済みの同じ動画のファイルの最も新しい時刻（中断後すぐの再開でファイル名が重ならないようにする）"""
+    prefix = f"json/{get_date_folder()}/comments_{video_id}_"
+    pattern = re.compile(re.escape(prefix) + r'(\d{8}_\d{6})\.jsonl$')
+    times = []
+    for key in list_object_keys(get_s3_client(), BUCKET_NAME, prefix):
+        match = pattern.match(key)
+        if match:
+            times.append(datetime.strptime(match.group(1), '%Y%m%d_%H%M%S'))
+    return max(times, default=None)
+
+def open_segment(video_id: str, linked: bool, previous: Optional[datetime] = None) -> Dict[str, Any]:
+    """コメントを書き出すJSON Lines・CSVのファイルを開く（previousより後の時刻のファイル名にする）"""
+    started = datetime.now().replace(microsecond=0)
+    if previous is not None and started <= previous:
+        # 同じ秒に開いた前のファイルと名前が重ならないよう時刻を進める
+        started = previous + timedelta(seconds=1)
+    timestamp = started.strftime('%Y%m%d_%H%M%S')
     date_folder = get_date_folder()
-    
-    # JSON形式で保存
-    data = {
-        'video_id': video_id,
-        'timestamp': timestamp,
-        'comments': comments
+    json_key = f"json/{date_folder}/comments_{video_id}_{timestamp}.jsonl"
+    csv_key = f"csv/{date_folder}/comments_{video_id}_{timestamp}.csv"
+    s3 = get_s3_client()
+    segment = {
+        'started': started,
+        'json_key': json_key,
+        'csv_key': csv_key,
+        'json_output': S3MultipartWriter(s3, BUCKET_NAME, json_key, content_type='application/x-ndjson'),
+        'csv_output': S3MultipartWriter(s3, BUCKET_NAME, csv_key, content_type='text/csv'),
+        'count': 0
     }
+    segment['csv_output'].write(CSV_REPLY_HEADER if linked else CSV_HEADER)
+    return segment
 
+def close_segment(segment: Dict[str, Any]) -> None:
+    """JSON Lines・CSVのファイルを確定"""
+    segment['json_output'].close()
     try:
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=f"json/{date_folder}/{json_filename}",
-            Body=json.dumps(data, ensure_ascii=False, indent=2)
-        )
-        print(f"コメントを json/{date_folder}/{json_filename} としてS3に保存しました")
-    except Exception as e:
-        print(f"JSONのS3への保存中にエラーが発生しました: {e}")
+        segment['csv_output'].close()
+    except BaseException:
+        # JSON Linesだけが残らないよう削除する（再開時に同じページから取得し直すため）
+        get_s3_client().delete_object(Bucket=BUCKET_NAME, Key=segment['json_key'])
+        raise
+    print(f"コメントを {segment['json_key']} としてS3に保存しました")
+    print(f"コメントを {segment['csv_key']} としてS3に保存しました")
 
-def save_csv_to_s3(comments, video_id, timestamp):
-    """コメントをCSV形式でS3に保存"""
-    csv_filename = f"comments_{video_id}_{timestamp}.csv"
-    date_folder = get_date_folder()
-    
+def save_to_s3(pages: Iterable[List[Dict[str, Any]]], video_id: str, linked: bool = False,
+               on_commit: Optional[Callable[[], None]] = None, segment_size: int = COMMENT_SEGMENT_SIZE) -> int:
+    """取得したページのコメントを逐次S3に保存（JSON Lines形式とCSV形式）
+
+    コメントは受け取った順にエンコードし、パートサイズに達するごとに
+    マルチパートアップロードするため、全件をメモリに保持しない。
+    segment_size件を超えるとページの区切りでファイルを確定して次のファイルに書き出し、
+    ファイルを確定するたびにon_commitを呼び出す（確定したページまでのチェックポイントの保存に使用）。
+    アップロードに失敗した場合や中断された場合は確定していないファイルを破棄して例外を送出する。
+    コメントが1件もない場合（新しいコメントのない差分取得など）はファイルを作成しない。
+    linked（返信を展開した取得）の場合はCSVにコメントIDと返信先のIDの列を追加する。
+    保存したコメント数を返す。
+    """
+    count = 0
+    # ファイルは最初のコメントを受け取ってから開く（新しいコメントがない場合はファイルを作成しない）
+    segment = None
+    previous = None
     try:
-        # CSVデータの作成
-        csv_buffer = []
-        csv_buffer.append("author,publishedAt,likeCount,text\n")
-        for comment in comments:
-            # テキスト内のカンマと改行をエスケープ
-            text = comment['text'].replace(',', '，').replace('\n', ' ')
-            csv_buffer.append(f"{comment['author']},{comment['publishedAt']},{comment['likeCount']},{text}\n")
-
-        # S3にアップロード
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=f"csv/{date_folder}/{csv_filename}",
-            Body=''.join(csv_buffer)
-        )
-        print(f"コメントを csv/{date_folder}/{csv_filename} としてS3に保存しました")
-    except Exception as e:
-        print(f"CSVのS3への保存中にエラーが発生しました: {e}")
+        # コメントの取得・分析・アップロードの時間は各処理段階として除かれる
+        with metrics.stage('serialize'):
+            for page in pages:
+                if not page:
+                    continue
+                if segment is not None and segment['count'] >= segment_size:
+                    # 次のページを書き出す前の時点で、チェックポイントは書き出したページまでを指している
+                    close_segment(segment)
+                    if on_commit:
+                        on_commit()
+                    previous = segment['started']
+                    segment = None
+                if segment is None:
+                    if previous is None:
+                        previous = get_last_segment_time(video_id)
+                    segment = open_segment(video_id, linked, previous)
+                json_output = segment['json_output']
+                csv_output = segment['csv_output']
+                for comment in page:
+                    # JSON Lines形式（1行に1コメント）
+                    json_output.write(json.dumps(comment, ensure_ascii=False) + '\n')
+                    csv_output.write(format_csv_line(comment, linked))
+                segment['count'] += len(page)
+                count += len(page)
+            if segment is not None:
+                close_segment(segment)
+    except BaseException:
+        if segment is not None:
+            segment['json_output'].abort()
+            segment['csv_output'].abort()
+        raise
+    if on_commit:
+        on_commit()
+    return count
 
-def save_to_s3(comments, video_id):
-    """コメントをS3に保存（JSONとCSV形式）"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    # JSON形式で保存
-    save_json_to_s3(comments, video_id, timestamp)
-    
-    # CSV形式で保存
-    save_csv_to_s3(comments, video_id, timestamp)
+def collect_comments(video_id: str, delta: bool = False, checkpoint_dir: Optional[str] = None,
+                     restart: bool = False, member_engine: Optional[KeywordEngine] = None,
+                     reply_pool: Optional[Executor] = None) -> Dict[str, Any]:
+    """1本の動画のコメントを取得してS3に保存し、処理結果のサマリーを返す
 
-def main(video_id):
-    # コマンドライン引数の設定
+    チェックポイントはS3へのファイルの確定ごとに保存するため、中断・保存の失敗時は確定したページの続きから再開する。
+    保存に失敗した場合はチェックポイントをfailedにして例外を送出する。
+    reply_poolを指定した場合は返信も取得する（parentIdで返信先のコメントと対応付ける）。
+    """
+    started_at = time.monotonic()
     print(f"動画ID: {video_id} のコメントを取得中...")
 
-    comments = get_comments(video_id)
-    print(f"{len(comments)}件のコメントを取得しました")
+    # 前回の取得状態を読み込む
+    checkpoint = load_checkpoint(video_id, checkpoint_dir)
+    start_crawl(checkpoint, delta, resume=not restart)
+    save_checkpoint(checkpoint, checkpoint_dir)
+    pages_before = checkpoint['pages']
+    # 最後に保存したチェックポイント（確定したファイルに含まれるページまで）
+    committed = dict(checkpoint)
 
-    save_to_s3(comments, video_id)
+    def commit() -> None:
+        save_checkpoint(checkpoint, checkpoint_dir)
+        committed.clear()
+        committed.update(checkpoint)
+
+    # 取得したページを順にS3へ書き出し、ファイルを確定するごとにチェックポイントを保存
+    pages = iter_comment_pages(video_id, checkpoint, reply_pool=reply_pool)
+    if member_engine:
+        # JSON Linesの各コメントに言及メンバーを付与
+        pages = tag_member_mentions(pages, member_engine)
+    try:
+        count = save_to_s3(pages, video_id, linked=reply_pool is not None, on_commit=commit)
+    except Exception as e:
+        print(f"S3への保存中にエラーが発生しました: {e}")
+        committed.update({'status': 'failed', 'error': str(e)})
+        save_checkpoint(committed, checkpoint_dir)
+        raise
+    print(f"動画ID: {video_id} {count}件のコメントを取得しました")
+    metrics.increment('Comments', count)
+
+    if checkpoint['status'] != 'complete':
+        print(f"動画ID: {video_id} 取得が中断されました（累計{checkpoint['count']}件）。再実行すると続きから取得します")
+
+    return {
+        'video_id': video_id,
+        'status': checkpoint['status'],
+        'comments': count,
+        'pages': checkpoint['pages'] - pages_before,
+        'seconds': round(time.monotonic() - started_at, 2),
+        'error': checkpoint.get('error')
+    }
+
+def read_video_ids(path: str) -> List[str]:
+    """動画IDファイルを読み込む（空行と#で始まる行は無視）"""
+    video_ids = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            # 動画IDから余分なパラメータを削除（?以降を削除）
+            video_id = line.strip().split('?')[0]
+            if video_id and not video_id.startswith('#'):
+                video_ids.append(video_id)
+    return video_ids
+
+def collect_many(video_ids: List[str], max_workers: int = COMMENT_WORKERS, delta: bool = False,
+                 checkpoint_dir: Optional[str] = None, restart: bool = False,
+                 member_engine: Optional[KeywordEngine] = None, replies: bool = False) -> List[Dict[str, Any]]:
+    """複数の動画のコメントを1プロセス内で並列に取得
+
+    YouTube APIクライアント、S3クライアント、レート制限は全ワーカーで共有する。
+    repliesを指定した場合は返信も取得し、comments.listの並列数は全動画でREPLY_WORKERSに制限する。
+    動画ごとのサマリーを入力と同じ順序で返す。
+    """
+    reply_pool = ThreadPoolExecutor(max_workers=REPLY_WORKERS) if replies else None
+
+    def collect(video_id: str) -> Dict[str, Any]:
+        try:
+            return collect_comments(video_id, delta=delta, checkpoint_dir=checkpoint_dir, restart=restart,
+                                    member_engine=member_engine, reply_pool=reply_pool)
+        except Exception as e:
+            print(f"エラー: 動画ID {video_id} の処理中にエラーが発生しました: {e}")
+            return {'video_id': video_id, 'status': 'error', 'comments': 0, 'pages': 0,
+                    'seconds': 0, 'error': str(e)}
+
+    print(f"{len(video_ids)}本の動画を{max_workers}並列で処理します")
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(collect, video_ids))
+    finally:
+        if reply_pool:
+            reply_pool.shutdown()
+
+def print_summary(summaries: List[Dict[str, Any]]) -> None:
+    """動画ごとの処理結果を表形式で表示"""
+    print("----------------------------------------")
+    print(f"{'video_id':<14}{'status':<13}{'comments':>10}{'pages':>7}{'seconds':>9}  error")
+    for summary in summaries:
+        print(f"{summary['video_id']:<14}{summary['status']:<13}{summary['comments']:>10}"
+              f"{summary['pages']:>7}{summary['seconds']:>9}  {summary['error'] or ''}")
+    print("----------------------------------------")
+    print(f"合計: {len(summaries)}本 / {sum(s['comments'] for s in summaries)}件のコメント"
+          f" / エラー{sum(1 for s in summaries if s['error'])}件")
+
+def main(video_id, delta=False, checkpoint_dir=None, restart=False, tag_members=False, replies=False):
+    """1本の動画のコメントを取得し、処理結果のサマリーを返す"""
+    member_engine = get_member_engine() if tag_members else None
+    reply_pool = ThreadPoolExecutor(max_workers=REPLY_WORKERS) if replies else None
+    try:
+        summary = collect_comments(video_id, delta=delta, checkpoint_dir=checkpoint_dir, restart=restart,
+                                   member_engine=member_engine, reply_pool=reply_pool)
+    finally:
+        if reply_pool:
+            reply_pool.shutdown()
+    metrics.emit('youtube_comment_collector', {'videos': 1})
+    return summary
 
 if __name__ == "__main__":
     # コマンドライン引数の設定
     parser = argparse.ArgumentParser(description='YouTube動画のコメントを取得してS3に保存します')
-    parser.add_argument('video_id', help='YouTube動画ID')
+    parser.add_argument('video_ids', nargs='*', help='YouTube動画ID（複数指定可）')
+    parser.add_argument('--ids-file', help='動画IDを1行に1つずつ記述したファイル')
+    parser.add_argument('--workers', type=int, default=COMMENT_WORKERS, help='並列に処理する動画数')
+    parser.add_argument('--delta', action='store_true', help='前回の取得以降の新しいコメントのみ取得')
+    parser.add_argument('--checkpoint-dir', help='チェックポイントをS3ではなくローカルのディレクトリに保存')
+    parser.add_argument('--restart', action='store_true', help='中断された取得を再開せず最初から取得')
+    parser.add_argument('--tag-members', action='store_true', help='JSON Linesの各コメントに言及しているメンバーを付与')
+    parser.add_argument('--replies', action='store_true', help='返信も取得（コメントIDと返信先のIDを出力）')
     args = parser.parse_args()
 
-    main(args.video_id) 
\ No newline at end of file
+    video_ids = list(args.video_ids)
+    if args.ids_file:
+        video_ids.extend(read_video_ids(args.ids_file))
+    if not video_ids:
+        parser.error('動画IDまたは--ids-fileを指定してください')
+
+    if len(video_ids) == 1:
+        summary = main(video_ids[0], delta=args.delta, checkpoint_dir=args.checkpoint_dir, restart=args.restart,
+                       tag_members=args.tag_members, replies=args.replies)
+        # 中断（クォータ切れなど）で取得が完了しなかった場合も失敗として終了する
+        if summary['status'] != 'complete':
+            sys.exit(1)
+    else:
+        summaries = collect_many(video_ids, max_workers=args.workers, delta=args.delta,
+                                 checkpoint_dir=args.checkpoint_dir, restart=args.restart,
+                                 member_engine=get_member_engine() if args.tag_members else None,
+                                 replies=args.replies)
+        print_summary(summaries)
+        metrics.emit('youtube_comment_collector', {'videos': len(video_ids)})
+        if any(summary['error'] for summary in summaries):
+            sys.exit(1)
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+# src・scriptsのモジュールを直接importする（scripts/run_local.pyと同じ）
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(PROJECT_ROOT, 'src'), os.path.join(PROJECT_ROOT, 'scripts'), PROJECT_ROOT]
+
+# モジュールのimport時に読み込む設定（実際のYouTube API・S3の代わりに偽のサービスを使用する）
+os.environ.update({
+    'S3_BUCKET_NAME': 'test-bucket',
+    'S3_BUCKET_NAME_GET_COMMENT': 'test-comment-bucket',
+    'YOUTUBE_API_KEY': 'test',
+    'YOUTUBE_QUOTA_BUDGET': '',
+    'YOUTUBE_REQUESTS_PER_SECOND': '1000000',
+    'YOUTUBE_CACHE_PATH': '',
+    'CHANNEL_IDS': 'UCtest',
+    'ENABLE_SNAPSHOTS': '',
+    'AUTO_CONTINUE': '',
+    'TIME_BUDGET_SECONDS': '',
+    'WORKER_FUNCTION_NAME': '',
+    'COMMENT_SEGMENT_SIZE': '250',
+})
+
+from benchmark_fakes import FakeS3  # noqa: E402
+import s3_stream  # noqa: E402
+
+
+@pytest.fixture
+def fake_s3() -> FakeS3:
+    """S3クライアントを偽のS3に差し替える"""
+    s3 = FakeS3()
+    s3_stream.set_s3_client(s3)
+    return s3
+
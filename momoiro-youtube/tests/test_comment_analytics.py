@@ -0,0 +1,72 @@
+import random
+
+from comment_analytics import CommentStats, ParsedComment, TopK, iter_csv_comments
+from youtube_comment_collector import CSV_HEADER, format_csv_line
+
+
+def zipf_items(count: int, seed: int = 0) -> list:
+    """出現回数に偏りのある項目の列（上位の項目がはっきり分かれる）"""
+    rng = random.Random(seed)
+    return [f'item{int(rng.paretovariate(1.2))}' for _ in range(count)]
+
+
+def test_topk_merge_equals_single_pass():
+    items = zipf_items(20000)
+    single = TopK(width=256, depth=4, capacity=10)
+    for item in items:
+        single.add(item)
+
+    shards = [TopK(width=256, depth=4, capacity=10) for _ in range(4)]
+    for index, item in enumerate(items):
+        shards[index % len(shards)].add(item)
+    merged = shards[0]
+    for shard in shards[1:]:
+        merged.merge(shard)
+
+    assert merged.top() == single.top()
+    assert merged.table == single.table
+
+
+def test_topk_merge_keeps_ties_in_the_same_order_as_top():
+    single = TopK(width=64, depth=4, capacity=2)
+    first, second = TopK(width=64, depth=4, capacity=2), TopK(width=64, depth=4, capacity=2)
+    for item in ['a', 'b', 'c']:
+        single.add(item)
+    first.add('a')
+    first.add('b')
+    second.add('c')
+    assert first.merge(second).top() == single.top() == [['a', 1], ['b', 1]]
+
+
+def test_topk_estimate_never_undercounts():
+    items = zipf_items(5000, seed=1)
+    sketch = TopK(width=64, depth=4, capacity=10)
+    for item in items:
+        sketch.add(item)
+    for item in set(items):
+        assert sketch.estimate(item) >= items.count(item)
+
+
+def test_comment_stats_merge_equals_single_pass():
+    # 投稿者・本文（1つの2文字のn-gram）ごとの件数は2k+1件で重ならない
+    comments = []
+    for index in range(400):
+        group = int(index ** 0.5)
+        comments.append({'author': f'@user{group}', 'publishedAt': f'2025-01-01T{index % 24:02d}:00:00Z',
+                         'likeCount': index % 300, 'text': chr(0x4E00 + 2 * group) + chr(0x4E01 + 2 * group)})
+    single = CommentStats(width=512, top_k=5)
+    first, second = CommentStats(width=512, top_k=5), CommentStats(width=512, top_k=5)
+    for index, comment in enumerate(comments):
+        parsed = ParsedComment('video1', comment)
+        single.add(parsed)
+        (first if index % 2 else second).add(parsed)
+    assert first.merge(second).summary() == single.summary()
+
+
+def test_csv_round_trip_keeps_author_with_comma():
+    comment = {'author': '@name, with "quote"', 'publishedAt': '2025-01-01T00:00:00Z', 'likeCount': 3,
+               'text': 'a, b\nc'}
+    data = (CSV_HEADER + format_csv_line(comment)).encode('utf-8')
+    rows = list(iter_csv_comments([data]))
+    assert rows == [{'author': '@name, with "quote"', 'publishedAt': '2025-01-01T00:00:00Z',
+                     'likeCount': '3', 'text': 'a， b c'}]
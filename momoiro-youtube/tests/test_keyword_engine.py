@@ -0,0 +1,28 @@
+from keyword_engine import KeywordEngine, MEMBER_KEYWORDS
+
+
+def test_counts_keyword_nested_in_another_categorys_keyword():
+    engine = KeywordEngine({'a': ['ももクロ'], 'b': ['ももクロChan']})
+    assert engine.count('ももクロChan見た') == {'a': 1, 'b': 1}
+    assert engine.count('ももクロChanとももクロ') == {'a': 2, 'b': 1}
+
+
+def test_counts_keyword_inside_another_categorys_keyword():
+    engine = KeywordEngine({'group': ['ももいろクローバーZ'], 'short': ['クローバー']})
+    assert engine.count('ももいろクローバーZのライブ') == {'group': 1, 'short': 1}
+
+
+def test_does_not_count_overlapping_keywords_of_the_same_category_twice():
+    engine = KeywordEngine({'a': ['ももクロ', 'ももクロChan']})
+    assert engine.count('ももクロChan') == {'a': 1}
+
+
+def test_normalizes_width_and_case():
+    engine = KeywordEngine({'live': ['LIVE']})
+    assert engine.count('ＬＩＶＥとlive') == {'live': 2}
+
+
+def test_count_batch_matches_count():
+    engine = KeywordEngine(MEMBER_KEYWORDS)
+    texts = ['百田夏菜子, 玉井詩織', None, 'しおりんのハモリ', '', 'れにちゃん高城れに']
+    assert engine.count_batch(texts) == [engine.count(text or '') for text in texts]
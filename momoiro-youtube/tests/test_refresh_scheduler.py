@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+from refresh_scheduler import VIDEOS_PER_UNIT, assign_tier, plan_refresh
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def format_time(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def test_assign_tier_by_age_and_views():
+    assert assign_tier(3, None) == 'hot'
+    assert assign_tier(30, None) == 'warm'
+    assert assign_tier(365, None) == 'cool'
+    assert assign_tier(1000, None) == 'cold'
+    assert assign_tier(1000, 20000) == 'hot'
+    assert assign_tier(1000, 500) == 'cool'
+
+
+def test_hot_video_is_refreshed_on_every_hourly_run_despite_jitter():
+    videos = {'hot1': format_time(NOW - timedelta(days=1))}
+    refreshed_at = {}
+    # 1時間ごとの実行の開始時刻が数分前後する
+    jitter_minutes = [0, 2, -1, 2, -2, 1, -2, 2]
+    refreshed = 0
+    for run, jitter in enumerate(jitter_minutes):
+        now = NOW + timedelta(hours=run, minutes=jitter)
+        video_ids, _ = plan_refresh(videos, refreshed_at, now)
+        if video_ids:
+            refreshed += 1
+            refreshed_at['hot1'] = format_time(now)
+    assert refreshed == len(jitter_minutes)
+
+
+def test_skips_video_refreshed_well_within_interval():
+    videos = {'warm1': format_time(NOW - timedelta(days=30))}
+    refreshed_at = {'warm1': format_time(NOW - timedelta(hours=12))}
+    video_ids, report = plan_refresh(videos, refreshed_at, NOW)
+    assert video_ids == []
+    assert report['tiers']['warm'] == {'known': 1, 'due': 0, 'refreshed': 0, 'skipped': 0}
+
+
+def test_quota_budget_prefers_higher_tiers():
+    videos = {f'cold{i}': format_time(NOW - timedelta(days=1000)) for i in range(VIDEOS_PER_UNIT)}
+    videos['hot1'] = format_time(NOW - timedelta(days=1))
+    video_ids, report = plan_refresh(videos, {}, NOW, quota_budget=1)
+    assert len(video_ids) == VIDEOS_PER_UNIT
+    assert 'hot1' in video_ids
+    assert report['tiers']['cold']['skipped'] == 1
+    assert report['planned_quota'] == 1
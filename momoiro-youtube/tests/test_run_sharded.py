@@ -0,0 +1,81 @@
+import csv
+import io
+
+import pytest
+
+import run_sharded
+import youtube_api
+from benchmark_fakes import FakeYouTube
+from time_budget import TimeBudget
+
+
+@pytest.fixture
+def worker_state(monkeypatch):
+    """ワーカーのクォータ・レート制限の設定をテストの終了時に元に戻す"""
+    monkeypatch.setitem(run_sharded.worker_quota, 'budget', None)
+    monkeypatch.setitem(run_sharded.worker_quota, 'spent', 0)
+    limiter = run_sharded.rate_limiter
+    monkeypatch.setattr(limiter, 'requests_per_second', limiter.requests_per_second)
+    monkeypatch.setattr(limiter, 'capacity', limiter.capacity)
+
+
+def expire_after_checks(monkeypatch, checks: int) -> None:
+    """各呼び出しの残り時間が、checks回確認した後に尽きるようにする"""
+    def from_context(cls, context, seconds=None, reserve_seconds=None):
+        left = [checks]
+
+        def remaining_ms() -> int:
+            left[0] -= 1
+            return 10 ** 9 if left[0] >= 0 else 0
+        return cls(remaining_ms, reserve_seconds=1)
+    monkeypatch.setattr(TimeBudget, 'from_context', classmethod(from_context))
+
+
+def read_csv_video_ids(s3) -> list:
+    """CSVのパートファイルに保存された動画IDを全ファイル分まとめて返す"""
+    video_ids = []
+    for key, data in s3.objects.items():
+        if '/video_stats_parts/' in key and key.endswith('.csv'):
+            video_ids.extend(row['video_id'] for row in csv.DictReader(io.StringIO(data.decode('utf-8-sig'))))
+    return video_ids
+
+
+def run_unit(years: list) -> dict:
+    """指定した年をまとめた1つの作業単位を実行"""
+    events, _ = run_sharded.plan_work_units({'mode': 'search', 'start_year': years[0], 'channel_ids': 'UCtest'})
+    event = {**events[0], 'unit': {'unit_id': 'UCtest-all', 'channel_id': 'UCtest', 'years': years}}
+    return run_sharded.run_work_unit(event)
+
+
+def test_continuation_replay_matches_single_pass(fake_s3, monkeypatch, worker_state):
+    years = [2022, 2023, 2024]
+    youtube_api.set_youtube_client(FakeYouTube({'UCtest': 4000}))
+    single = run_unit(years)
+    expected = read_csv_video_ids(fake_s3)
+    assert expected and single['continuations'] == 0
+
+    fake_s3.objects.clear()
+    expire_after_checks(monkeypatch, 8)
+    replayed = run_unit(years)
+    video_ids = read_csv_video_ids(fake_s3)
+    assert replayed['status_code'] == 200
+    assert replayed['continuations'] >= 2
+    assert len(video_ids) == len(set(video_ids))
+    assert sorted(video_ids) == sorted(expected)
+    assert replayed['total_videos'] == single['total_videos'] == len(expected)
+
+
+def test_worker_quota_share_is_spent_across_units(fake_s3, worker_state):
+    youtube_api.set_youtube_client(FakeYouTube({'UCtest': 400}))
+    events, _ = run_sharded.plan_work_units({'mode': 'search', 'start_year': 2020, 'channel_ids': 'UCtest'})
+    run_sharded.init_worker(250)
+    summaries = [run_sharded.run_work_unit(event) for event in events[:3]]
+    assert [summary['status_code'] for summary in summaries] == [200, 200, 429]
+    assert run_sharded.worker_quota['spent'] == sum(summary['quota_used'] for summary in summaries) <= 250
+
+
+def test_init_worker_sets_per_worker_rate(worker_state):
+    run_sharded.init_worker(None, 2.5)
+    assert run_sharded.rate_limiter.requests_per_second == 2.5
+    assert run_sharded.rate_limiter.capacity == 2
+    assert run_sharded.worker_quota == {'budget': None, 'spent': 0}
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import youtube_api
+import youtube_comment_collector as collector
+from benchmark_fakes import FakeYouTube
+
+
+def read_comment_ids(s3) -> list:
+    """保存済みのJSON Linesに含まれるコメントの識別子（合成コメントは公開日時が重ならない）を全ファイル分まとめて返す"""
+    ids = []
+    for key, data in s3.objects.items():
+        if key.startswith('json/') and key.endswith('.jsonl'):
+            ids.extend(json.loads(line)['publishedAt'] for line in data.decode('utf-8').splitlines())
+    return ids
+
+
+def test_resume_after_s3_failure_saves_each_comment_once(fake_s3, tmp_path):
+    youtube_api.set_youtube_client(FakeYouTube({}, comments_per_video=1000))
+    put_object = fake_s3.put_object
+    csv_uploads = []
+
+    def fail_third_csv(**params):
+        # 3つ目のファイルのCSVのアップロードで失敗させる
+        if params['Key'].endswith('.csv'):
+            csv_uploads.append(params['Key'])
+            if len(csv_uploads) == 3:
+                raise RuntimeError('upload failed')
+        return put_object(**params)
+
+    fake_s3.put_object = fail_third_csv
+    with pytest.raises(RuntimeError):
+        collector.collect_comments('video1', checkpoint_dir=str(tmp_path))
+    assert len(read_comment_ids(fake_s3)) == 600
+
+    fake_s3.put_object = put_object
+    summary = collector.collect_comments('video1', checkpoint_dir=str(tmp_path))
+    ids = read_comment_ids(fake_s3)
+    assert summary['status'] == 'complete'
+    assert len(ids) == 1000
+    assert len(set(ids)) == 1000
+
+
+def test_delta_without_new_comments_writes_no_files(fake_s3, tmp_path):
+    youtube_api.set_youtube_client(FakeYouTube({}, comments_per_video=150))
+    collector.collect_comments('video1', checkpoint_dir=str(tmp_path))
+    keys = set(fake_s3.objects)
+
+    summary = collector.collect_comments('video1', delta=True, checkpoint_dir=str(tmp_path))
+    assert summary['status'] == 'complete'
+    assert summary['comments'] == 0
+    assert set(fake_s3.objects) == keys
+
+
+def test_main_returns_interrupted_summary(fake_s3, tmp_path):
+    youtube = FakeYouTube({}, comments_per_video=300)
+    list_threads = youtube._comment_threads_list
+
+    def fail_second_page(**params):
+        if params.get('pageToken'):
+            raise ValueError('commentThreads.list failed')
+        return list_threads(**params)
+
+    youtube._comment_threads_list = fail_second_page
+    youtube_api.set_youtube_client(youtube)
+    summary = collector.main('video1', checkpoint_dir=str(tmp_path))
+    assert summary['status'] == 'in_progress'
+    assert summary['comments'] == 100
+    assert summary['error'] == 'commentThreads.list failed'